@@ -1,11 +1,23 @@
 from .model import EvacuationModel
+from .engine import VectorizedEvacuationModel
+from .events import EventDrivenEvacuationModel
+from .distributed import DistributedEvacuationModel
+from .ensemble import Ensemble
 from .agent import EvacuationAgent
 from .utils import create_movie
 from .generate_agents import generate_agents
+from .cache import OSMCache
+from .network import Network
 
 __all__ = [
     "EvacuationModel",
+    "VectorizedEvacuationModel",
+    "EventDrivenEvacuationModel",
+    "DistributedEvacuationModel",
+    "Ensemble",
     "EvacuationAgent",
     "create_movie",
     "generate_agents",
+    "OSMCache",
+    "Network",
 ]
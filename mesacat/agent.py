@@ -2,6 +2,7 @@ from __future__ import annotations
 from . import model
 from mesa import Agent
 import numpy as np
+from mesacat.routing import Route
 
 
 class EvacuationAgent(Agent):
@@ -12,10 +13,12 @@ class EvacuationAgent(Agent):
         evacuation_model: the parent EvacuationModel
 
     Attributes:
-        pos(int): the ID of the most recent node that has been passed
-        route (typing.List[int]): a list of node IDs that the agent is traversing
+        pos(int): the index of the most recent node that has been passed
+        route (Route): the nodes that the agent is traversing
         route_index (int): the number of nodes that the agent has passed along the route
         distance_along_edge (float): the distance that the agent has travelled from the most recent node
+        blocked (bool): whether the agent was held up by another agent in the last step
+        reroute_count (int): the number of times the agent has changed route because of congestion
         lat: current latitude
         lon: current longitude
     """
@@ -28,7 +31,7 @@ class EvacuationAgent(Agent):
     ):
         super().__init__(unique_id, evacuation_model)
         self.pos: int
-        self.route = []
+        self.route: Route
         self.route_index = 0
         self.distance_along_edge = 0
         self.lat = None
@@ -36,114 +39,127 @@ class EvacuationAgent(Agent):
         self.evacuated = False
         self.stranded = False
         self.highway = None
-        self.reroute_count = -1
+        self.blocked = False
+        self.reroute_count = 0
         self.agent_type = agent["agent_type"]
         self.in_car = agent["in_car"]
         self.speed = 48 if self.in_car else agent["walking_speed"]
         self.delay = self.response_time()
 
     def update_route(self):
-        # indices of target nodes
-        targets = [
-            self.model.nodes.index.get_loc(node)
-            for node in self.model.target_nodes.index
-        ]
-        # index of agent's last visited node
-        source = self.model.nodes.index.get_loc(self.pos)
-        # calculate minimum distance to each evacuation point
-        target_distances = self.model.igraph.shortest_paths_dijkstra(
-            source=[source], target=targets, weights="length"
-        )[0]
-        target = targets[int(np.argmin(target_distances))]
-        path = self.model.igraph.get_shortest_paths(source, target, weights="length")[0]
-        self.route = self.model.nodes.iloc[path].index
+        # follow the model's exit field from the agent's last visited node
+        self.set_route(self.model.exit_field.route(self.pos))
+
+    def set_route(self, route: np.ndarray):
+        self.route = Route(self.model.core, route)
         self.route_index = 0
+        if len(self.route) < 2 and not self.stranded:
+            # no evacuation point can be reached
+            self.stranded = True
+            self.model.summary.strand()
+
+    def reroute(self):
+        # follow the model's exit field from the end of the current edge
+        next_node = self.route[self.route_index + 1]
+        route = self.model.exit_field.route(next_node)
+        if len(route) < 2 or np.array_equal(route, self.route[self.route_index + 1 :]):
+            return
+        self.route = Route(
+            self.model.core,
+            np.concatenate([self.route[: self.route_index + 1], route]),
+        )
+        self.reroute_count += 1
 
     def update_location(self):
-        origin_node = self.model.nodes.loc[self.route[self.route_index]]
-        destination_node = self.model.nodes.loc[self.route[self.route_index + 1]]
-        edge_length = self.distance_along_edge + self.distance_to_next_node()
+        route = self.route
+        i = self.route_index
+        if self.stranded:
+            self.lat = route.y[i]
+            self.lon = route.x[i]
+            return
 
+        edge_length = route.length[i]
         if edge_length == 0:
-            self.lat = origin_node.geometry.y
-            self.lon = origin_node.geometry.x
+            self.lat = route.y[i]
+            self.lon = route.x[i]
         else:
             k = self.distance_along_edge / edge_length
-            self.lat = (
-                k * destination_node.geometry.y + (1 - k) * origin_node.geometry.y
-            )
-            self.lon = (
-                k * destination_node.geometry.x + (1 - k) * origin_node.geometry.x
-            )
+            self.lat = k * route.y[i + 1] + (1 - k) * route.y[i]
+            self.lon = k * route.x[i + 1] + (1 - k) * route.x[i]
+
+    def edge(self) -> tuple[int, bool]:
+        """
+        Returns the arc of the model's core that the agent is on and whether it is in a car
+        """
+        return self.route.arcs[self.route_index], self.in_car
 
     def distance_to_next_node(self):
-        edge = self.model.G.get_edge_data(
-            self.route[self.route_index], self.route[self.route_index + 1]
-        )[0]
-        return edge["length"] - self.distance_along_edge
+        return self.route.length[self.route_index] - self.distance_along_edge
+
+    @property
+    def departure_time(self) -> float:
+        """Seconds after the start of the evacuation at which the agent sets off"""
+        return 0 if self.in_car else self.delay
 
     def response_time(self):
-        t = np.random.normal(300, 120)
+        t = self.model.rng.normal(300, 120)
         return t if t > 0 else 0
 
     def step(self):
-        """Moves the agent towards the target node by 10 seconds"""
+        """Moves the agent towards the target node by one time step"""
 
-        if self.evacuated:
+        if self.evacuated or self.stranded:
             return
 
-        if self.model.seconds_elapsed < self.delay and not self.in_car:
+        if self.model.seconds_elapsed < self.departure_time:
             return
 
         distance_to_travel = (
-            self.speed / 60 / 60 * 10 * 1000
-        )  # metres travelled in ten seconds
+            self.speed / 60 / 60 * self.model.time_step * 1000
+        )  # metres travelled in one time step
+        self.blocked = False
 
         # if agent passes through one or more nodes during the step
+        occupancy = self.model.edge_occupancy
         while distance_to_travel >= self.distance_to_next_node():
-            all_agents = self.model.grid.get_all_cell_contents()
-
-            agents_in_path = [
-                agent
-                for agent in all_agents
-                if agent.unique_id != self.unique_id
-                and agent.route[agent.route_index] == self.route[self.route_index]
-                and agent.in_car == self.in_car
-                and agent.distance_along_edge > self.distance_along_edge
-                and agent.distance_along_edge - self.distance_along_edge
-                < distance_to_travel
-            ]
-
-            if len(agents_in_path) == 0:
+            # the nearest agent ahead on the same road, travelling the same way
+            leader = occupancy.leader(self.unique_id)
+
+            if (
+                leader is None
+                or leader - self.distance_along_edge >= distance_to_travel
+            ):
                 distance_to_travel -= self.distance_to_next_node()
+                occupancy.remove(self.unique_id)
+                self.model.summary.traverse(self.route.arcs[self.route_index])
                 self.route_index += 1
                 self.distance_along_edge = 0
                 self.model.grid.move_agent(self, self.route[self.route_index])
 
                 # if target is reached
                 if self.route_index == len(self.route) - 1:
-                    self.lat = self.model.nodes.loc[self.pos].geometry.y
-                    self.lon = self.model.nodes.loc[self.pos].geometry.x
+                    self.lat = self.route.y[self.route_index]
+                    self.lon = self.route.x[self.route_index]
                     self.evacuated = True
+                    self.model.summary.evacuate(
+                        self.agent_type,
+                        self.pos,
+                        self.model.seconds_elapsed + self.model.time_step,
+                    )
                     return
                 else:
-                    edge = self.model.G.get_edge_data(
-                        self.route[self.route_index], self.route[self.route_index + 1]
-                    )[0]
-                    if "osmid" in edge.keys():
-                        self.highway = edge["osmid"]
+                    occupancy.add(self.unique_id, self.edge())
+                    osmid = self.route.osmid[self.route_index]
+                    if osmid >= 0:
+                        self.highway = int(osmid)
 
             else:
-                nearest_agent_distance = sorted(
-                    [agent.distance_along_edge for agent in agents_in_path]
-                )[0]
-
-                distance_to_travel = (
-                    nearest_agent_distance - self.distance_along_edge - 1
-                )
+                distance_to_travel = leader - self.distance_along_edge - 1
                 if distance_to_travel < 0:
                     distance_to_travel = 0
+                self.blocked = True
                 break
 
         self.distance_along_edge += distance_to_travel
+        occupancy.move(self.unique_id, self.distance_along_edge)
         self.update_location()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import json
+import math
+import os
+import tempfile
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+from mesacat.core import AGENT_START
+
+MAGIC = b"MESACATB"
+# version of the layout of bundle files, checked when one is read
+FORMAT = 1
+# arrays start at multiples of this many bytes, so that every view is aligned
+ALIGN = 64
+
+
+def write(file: str, meta: dict, arrays: dict[str, np.ndarray]) -> None:
+    """
+    Write named arrays to one binary file, after a JSON header giving the type, shape and position of each
+
+    The file is replaced in one step, as for checkpoints.
+
+    Args:
+        file (str): path of the bundle
+        meta (dict): state that is not an array, which must be JSON serialisable
+        arrays (dict): named arrays, which must not hold Python objects
+    """
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, a in arrays.items():
+        entries[name] = {"dtype": a.dtype.str, "shape": a.shape, "offset": offset}
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"format": FORMAT, "meta": meta, "arrays": entries}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(file)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + np.array(len(header), dtype="<u8").tobytes() + header)
+            for name, a in arrays.items():
+                f.seek(start + entries[name]["offset"])
+                f.write(a.data)
+            f.truncate(start + offset)
+        os.replace(tmp, file)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read(file: str) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Returns the state and the arrays of a bundle written by ``write``, with the arrays mapped from the file rather than read into memory
+    """
+    with open(file, "rb") as f:
+        magic = f.read(len(MAGIC))
+        length = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+        header = json.loads(f.read(length)) if magic == MAGIC else {}
+    if header.get("format") != FORMAT:
+        raise ValueError("{0} is not a bundle of this version of mesacat".format(file))
+    start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+
+    data = np.memmap(file, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        first = start + entry["offset"]
+        nbytes = dtype.itemsize * math.prod(shape)
+        arrays[name] = data[first : first + nbytes].view(dtype).reshape(shape)
+    return header["meta"], arrays
+
+
+def column_array(values: pd.Series) -> np.ndarray:
+    """
+    Returns a column of a table as an array that can be stored, with anything that is not a number stored as text
+    """
+    if isinstance(values.values, np.ndarray) and values.dtype != object:
+        return values.values
+    return np.array(
+        [
+            "" if v is None or (isinstance(v, float) and math.isnan(v)) else str(v)
+            for v in values
+        ],
+        dtype=str,
+    )
+
+
+def layer_arrays(name: str, layer: GeoDataFrame) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Returns the description and the arrays of a spatial table, with each geometry stored as WKB
+
+    Args:
+        name (str): name of the layer in the bundle
+        layer (GeoDataFrame): the table
+    """
+    wkb = shapely.to_wkb(layer.geometry.values)
+    lengths = np.array([0 if g is None else len(g) for g in wkb], dtype=np.int64)
+    arrays = {
+        name
+        + "/wkb": np.frombuffer(
+            b"".join(g for g in wkb if g is not None), dtype=np.uint8
+        ),
+        name + "/wkb_offsets": np.concatenate([[0], np.cumsum(lengths)]),
+    }
+    index = layer.index.to_frame(index=False)
+    for level in index.columns:
+        arrays["{0}/index/{1}".format(name, level)] = column_array(index[level])
+    columns = [c for c in layer.columns if c != layer.geometry.name]
+    for column in columns:
+        arrays["{0}/column/{1}".format(name, column)] = column_array(layer[column])
+    description = {
+        "crs": None if layer.crs is None else layer.crs.to_string(),
+        "index": [str(level) for level in index.columns],
+        "columns": [str(column) for column in columns],
+    }
+    return description, arrays
+
+
+def read_layer(name: str, meta: dict, arrays: dict[str, np.ndarray]) -> GeoDataFrame:
+    """
+    Returns a spatial table stored by ``layer_arrays``
+    """
+    description = meta["layers"][name]
+    wkb = arrays[name + "/wkb"]
+    offsets = arrays[name + "/wkb_offsets"]
+    geometry = shapely.from_wkb(
+        [
+            wkb[start:end].tobytes() if end > start else None
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        ]
+    )
+    levels = [
+        np.asarray(arrays["{0}/index/{1}".format(name, level)])
+        for level in description["index"]
+    ]
+    if len(levels) == 1:
+        index = pd.Index(levels[0], name=description["index"][0])
+    else:
+        index = pd.MultiIndex.from_arrays(levels, names=description["index"])
+    columns = {
+        column: np.asarray(arrays["{0}/column/{1}".format(name, column)])
+        for column in description["columns"]
+    }
+    return GeoDataFrame(columns, geometry=geometry, index=index, crs=description["crs"])
+
+
+def write_layers(file: str, layers: dict[str, GeoDataFrame]) -> None:
+    """
+    Write spatial tables to a bundle, in one file
+    """
+    meta = {"layers": {}}
+    arrays = {}
+    for name, layer in layers.items():
+        meta["layers"][name], layer_data = layer_arrays(name, layer)
+        arrays.update(layer_data)
+    write(file, meta, arrays)
+
+
+def read_layers(file: str) -> dict[str, GeoDataFrame]:
+    """
+    Returns the spatial tables of a bundle written by ``write_layers``
+    """
+    meta, arrays = read(file)
+    return {name: read_layer(name, meta, arrays) for name in meta["layers"]}
+
+
+def road_graph(nodes: GeoDataFrame, edges: GeoDataFrame) -> nx.MultiGraph:
+    """
+    Returns the road network of a bundle as a networkx graph, without the agents' start positions
+
+    Args:
+        nodes (GeoDataFrame): node table, with ``x``, ``y`` and ``kind`` columns
+        edges (GeoDataFrame): edge table indexed by (u, v, key)
+    """
+    G = nx.MultiGraph(crs=nodes.crs)
+    roads = nodes[nodes["kind"] != AGENT_START]
+    G.add_nodes_from(
+        (id, {"x": x, "y": y}) for id, x, y in zip(roads.index, roads.x, roads.y)
+    )
+    u = edges.index.get_level_values(0)
+    v = edges.index.get_level_values(1)
+    keep = u.isin(roads.index) & v.isin(roads.index)
+    kept = edges[keep]
+    G.add_edges_from(
+        (u, v, key, {"length": length, "geometry": geometry})
+        for (u, v, key), length, geometry in zip(
+            kept.index, kept["length"], kept.geometry
+        )
+    )
+    return G
@@ -0,0 +1,246 @@
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import networkx as nx
+import osmnx
+from geopandas import GeoDataFrame
+from shapely.geometry import Polygon
+
+
+class OSMCache:
+    """A content-addressed, size-bounded on-disk cache of OpenStreetMap data
+
+    Entries are keyed by a hash of the (normalised) domain polygon, the kind of
+    query and its tags, so the same domain always maps to the same files.
+    Graphs and feature layers are stored as pickles, which load without any
+    network I/O or XML/JSON parsing.  The routing index of each graph is
+    stored next to it as a ``.npz`` file.
+
+    Args:
+        path: directory to store cached entries in.  Defaults to the
+            ``MESACAT_CACHE_DIR`` environment variable or ``~/.cache/mesacat``
+        max_bytes: maximum total size of the cache; the least recently used
+            entries are evicted when it is exceeded.  ``None`` means unbounded
+        offline: if True, a cache miss raises a ``LookupError`` instead of
+            querying OpenStreetMap
+    """
+
+    extension = ".pkl"
+    routes_extension = ".npz"
+
+    def __init__(
+        self,
+        path: str | None = None,
+        max_bytes: int | None = None,
+        offline: bool = False,
+    ):
+        if path is None:
+            path = os.environ.get(
+                "MESACAT_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "mesacat"),
+            )
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(domain: Polygon, kind: str, tags: dict | None = None) -> str:
+        """
+        Returns the cache key for a query
+
+        Args:
+            domain (Polygon): area of interest
+            kind (str): type of query, e.g. "graph" or "features"
+            tags (dict): OSM tags used by the query
+        """
+        h = hashlib.sha256()
+        h.update(domain.normalize().wkb)
+        h.update(json.dumps([kind, tags], sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def graph_from_polygon(self, domain: Polygon, simplify: bool = False) -> nx.Graph:
+        """
+        Cached equivalent of ``osmnx.graph_from_polygon``
+
+        Args:
+            domain (Polygon): area of interest
+            simplify (bool): whether to simplify the graph topology
+        """
+        return self.get_or_create(
+            self.key(domain, "graph", {"simplify": simplify}),
+            lambda: osmnx.graph_from_polygon(domain, simplify=simplify),
+        )
+
+    def features_from_polygon(self, domain: Polygon, tags: dict) -> GeoDataFrame:
+        """
+        Cached equivalent of ``osmnx.features_from_polygon``
+
+        Args:
+            domain (Polygon): area of interest
+            tags (dict): OSM tags to query
+        """
+        return self.get_or_create(
+            self.key(domain, "features", tags),
+            lambda: osmnx.features_from_polygon(domain, tags=tags),
+        )
+
+    def routes_file(self, domain: Polygon) -> str:
+        """
+        Returns the file that the routing index of the road network within the domain is stored in
+        """
+        return self.file(
+            self.key(domain, "routes", {"simplify": False}), self.routes_extension
+        )
+
+    def get_or_create(self, key: str, create):
+        """
+        Returns the cached value for a key, calling ``create`` to build and store it on a miss
+        """
+        file = self.file(key)
+        try:
+            with open(file, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            # a miss, or the entry was evicted by another process since
+            pass
+        else:
+            # record the access time for least recently used eviction
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(file)
+            return value
+
+        if self.offline:
+            raise LookupError(
+                "{0} is not in the cache and offline mode is enabled".format(key)
+            )
+
+        value = create()
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value) -> None:
+        """
+        Write a value to the cache, evicting old entries if the cache is too large
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # atomic so that concurrent runs never read a partially written entry
+            os.replace(tmp, self.file(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def file(self, key: str, extension: str | None = None) -> str:
+        return os.path.join(self.path, key + (extension or self.extension))
+
+    def entries(self) -> list[tuple[str, int, float]]:
+        """
+        Returns (path, size in bytes, last access time) for each entry, least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith((self.extension, self.routes_extension)):
+                continue
+            file = os.path.join(self.path, name)
+            stat = os.stat(file)
+            entries.append((file, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self) -> int:
+        """Total size of the cache in bytes"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache is within ``max_bytes``
+        """
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for file, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(file)
+            total -= size
+
+    def invalidate(self, domain: Polygon | None = None) -> None:
+        """
+        Remove cached entries
+
+        Args:
+            domain (Polygon): if given, only the road network and the feature
+                layers used by mesacat for this domain are removed.  Otherwise
+                the whole cache is cleared
+        """
+        if domain is None:
+            for file, _, _ in self.entries():
+                os.remove(file)
+            # temporary files left behind by interrupted writes
+            for name in os.listdir(self.path):
+                if name.endswith(".tmp"):
+                    os.remove(os.path.join(self.path, name))
+            return
+
+        keys = [self.key(domain, "graph", {"simplify": s}) for s in (False, True)]
+        keys += [self.key(domain, "features", tags) for tags in BUILDING_TAGS]
+        files = [self.file(key) for key in keys] + [self.routes_file(domain)]
+        for file in files:
+            if os.path.exists(file):
+                os.remove(file)
+
+
+def graph_from_polygon(domain: Polygon, cache: OSMCache | None = None) -> nx.Graph:
+    """
+    Download the unsimplified road network within the domain, using the cache if one is given
+    """
+    if cache is None:
+        return osmnx.graph_from_polygon(domain, simplify=False)
+    return cache.graph_from_polygon(domain, simplify=False)
+
+
+def features_from_polygon(
+    domain: Polygon, tags: dict, cache: OSMCache | None = None
+) -> GeoDataFrame:
+    """
+    Download the OSM features within the domain, using the cache if one is given
+    """
+    if cache is None:
+        return osmnx.features_from_polygon(domain, tags=tags)
+    return cache.features_from_polygon(domain, tags)
+
+
+RESIDENTIAL_TAGS = {
+    "building": [
+        "apartments",
+        "bungalow",
+        "detached",
+        "dormitory",
+        "hotel",
+        "house",
+        "residential",
+        "semidetached_house",
+        "terrace",
+    ]
+}
+ALL_BUILDINGS_TAGS = {"building": True}
+SCHOOL_TAGS = {"amenity": ["college", "kindergarten", "school"]}
+SUPERMARKET_TAGS = {"building": "supermarket", "shop": ["convenience"]}
+SHOP_TAGS = {"building": "retail"}
+RECREATION_TAGS = {"leisure": True, "amenity": ["bar", "cafe", "pub", "restaurant"]}
+
+BUILDING_TAGS = [
+    RESIDENTIAL_TAGS,
+    ALL_BUILDINGS_TAGS,
+    SCHOOL_TAGS,
+    SUPERMARKET_TAGS,
+    SHOP_TAGS,
+    RECREATION_TAGS,
+]
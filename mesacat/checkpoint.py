@@ -0,0 +1,105 @@
+import hashlib
+import importlib
+import json
+import os
+import random
+import tempfile
+import numpy as np
+from mesacat.core import NetworkCore
+
+# version of the layout of checkpoint files, checked when one is read
+FORMAT = 2
+
+
+def write(
+    file: str, meta: dict, arrays: dict[str, np.ndarray], compress: bool = False
+) -> None:
+    """
+    Write a checkpoint as a ``.npz`` file of arrays, with the rest of the state stored as JSON
+
+    The file is replaced in one step, so a run that is interrupted while
+    writing leaves the previous checkpoint intact.
+
+    Args:
+        file (str): path of the checkpoint
+        meta (dict): state that is not an array, which must be JSON serialisable
+        arrays (dict): named arrays, which must not hold Python objects
+        compress (bool): whether to compress the arrays
+    """
+    save = np.savez_compressed if compress else np.savez
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(file)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            meta = json.dumps({**meta, "format": FORMAT}, default=python_value)
+            save(f, meta=meta, **arrays)
+        os.replace(tmp, file)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read(file: str) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Returns the state and the arrays of a checkpoint written by ``write``
+    """
+    with np.load(file) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("format") != FORMAT:
+            raise ValueError(
+                "{0} is not a checkpoint of this version of mesacat".format(file)
+            )
+        arrays = {name: data[name] for name in data.files if name != "meta"}
+    return meta, arrays
+
+
+def python_value(value):
+    """
+    Returns a numpy scalar as the equivalent Python value, so that it can be stored as JSON
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("{0} cannot be stored in a checkpoint".format(type(value)))
+
+
+def signature(core: NetworkCore) -> str:
+    """
+    Returns a hash of a network core, used to check that a checkpoint is restored onto the same network
+    """
+    h = hashlib.sha256()
+    for array in (core.kind, core.indptr, core.indices, core.length):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def class_name(cls: type) -> str:
+    return "{0}:{1}".format(cls.__module__, cls.__qualname__)
+
+
+def find_class(name: str) -> type:
+    """
+    Returns the class named by ``class_name``
+    """
+    module, qualname = name.split(":")
+    cls = importlib.import_module(module)
+    for part in qualname.split("."):
+        cls = getattr(cls, part)
+    return cls
+
+
+def generator(state: dict) -> np.random.Generator:
+    """
+    Returns a numpy random number generator in the state given by ``Generator.bit_generator.state``
+    """
+    bit_generator = getattr(np.random, state["bit_generator"])()
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+
+def set_random_state(r: random.Random, state: list) -> None:
+    """
+    Set the state of a Python random number generator from the JSON form of ``Random.getstate``
+    """
+    version, internal, gauss = state
+    r.setstate((version, tuple(internal), gauss))
@@ -0,0 +1,273 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Callable, Iterator
+import numpy as np
+import pandas as pd
+
+# version of the layout of trajectory directories, checked when one is read
+TRAJECTORY_FORMAT = 1
+
+
+def text_if_object(values: np.ndarray) -> np.ndarray:
+    """
+    Returns an array of Python objects as text, so that it can be saved without pickling
+    """
+    return values.astype(str) if values.dtype == object else values
+
+
+class ColumnarDataCollector:
+    """Records the model output in typed, preallocated columns, writing the agent output to disk in chunks
+
+    The model variables are small and kept in lists, as by Mesa's
+    ``DataCollector``.  The agent variables of each step are written into
+    one row of a buffer for each variable, which holds a chunk of about
+    ``chunk_size`` agent records.  When the buffers are full they are
+    appended to one binary file per variable, so the memory held does not
+    grow with the length of the run, and the output is read back from the
+    files one chunk at a time to be written as CSV.
+
+    The model must have ``agent_ids``, returning the unique ID of each
+    agent, and ``agent_output``, returning the value of each agent variable
+    for every agent in the same order.  Positions are recorded as indices of
+    nodes of the model's core, and ``highway`` is -1 where there is none.
+
+    Args:
+        model_reporters: function of the model giving the value of each model variable
+        chunk_size: number of agent records in each chunk
+        directory: directory to write the agent output to.  Defaults to a
+            temporary directory, which is removed with the collector
+
+    Attributes:
+        model_vars (dict): value of each model variable at each collection
+        ids (np.ndarray): unique ID of each agent
+        node_ids (np.ndarray): identifier of each node of the core
+        steps (int): number of times the agent variables have been collected
+        flushed (int): number of those steps that have been written to disk
+    """
+
+    agent_columns = {
+        "position": np.int32,
+        "lat": np.float32,
+        "lon": np.float32,
+        "highway": np.int64,
+        "reroute_count": np.int32,
+        "status": np.bool_,
+        "in_car": np.bool_,
+    }
+
+    def __init__(
+        self,
+        model_reporters: dict[str, Callable],
+        chunk_size: int = 200000,
+        directory: str | None = None,
+    ):
+        self.model_reporters = model_reporters
+        self.model_vars = {name: [] for name in model_reporters}
+        self.chunk_size = chunk_size
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="mesacat-")
+            weakref.finalize(self, shutil.rmtree, directory, ignore_errors=True)
+        self.directory = directory
+        self.ids: np.ndarray | None = None
+        self.node_ids: np.ndarray | None = None
+        self.buffers: dict[str, np.ndarray] | None = None
+        self.steps = 0
+        self.flushed = 0
+
+    def path(self, name: str) -> str:
+        """
+        Returns the path of the file of an agent variable
+        """
+        return os.path.join(self.directory, name + ".bin")
+
+    def allocate(self, ids: np.ndarray, node_ids: np.ndarray) -> None:
+        """
+        Allocate the buffers for a population of agents and start new files
+        """
+        self.ids = np.asarray(ids)
+        self.node_ids = node_ids
+        chunk_steps = max(1, self.chunk_size // max(len(self.ids), 1))
+        self.buffers = {
+            name: np.empty((chunk_steps, len(self.ids)), dtype=dtype)
+            for name, dtype in self.agent_columns.items()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        for name in self.agent_columns:
+            open(self.path(name), "wb").close()
+        self.steps = 0
+        self.flushed = 0
+
+    def collect(self, model) -> None:
+        """
+        Record the model and agent variables of the current step
+        """
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].append(reporter(model))
+        if self.buffers is None:
+            self.allocate(model.agent_ids(), model.core.node_ids)
+        row = self.steps - self.flushed
+        for name, values in model.agent_output().items():
+            self.buffers[name][row] = values
+        self.steps += 1
+        if row + 1 == len(self.buffers["position"]):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append the steps held in memory to the files of the agent variables
+        """
+        rows = self.steps - self.flushed
+        if rows == 0:
+            return
+        for name, buffer in self.buffers.items():
+            with open(self.path(name), "ab") as f:
+                buffer[:rows].tofile(f)
+        self.flushed = self.steps
+
+    def save(self) -> None:
+        """
+        Write the steps held in memory and an index of the files, from which ``Trajectory`` reads the agent output
+        """
+        self.flush()
+        ids = np.zeros(0, dtype=np.int64) if self.ids is None else self.ids
+        node_ids = np.zeros(0, dtype=str) if self.node_ids is None else self.node_ids
+        os.makedirs(self.directory, exist_ok=True)
+        np.save(os.path.join(self.directory, "ids.npy"), text_if_object(ids))
+        np.save(os.path.join(self.directory, "node_ids.npy"), node_ids.astype(str))
+        np.save(
+            os.path.join(self.directory, "time.npy"),
+            np.array(self.model_vars.get("time", []), dtype=np.float64),
+        )
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "format": TRAJECTORY_FORMAT,
+                    "steps": self.flushed,
+                    "agents": len(ids),
+                    "columns": {
+                        name: np.dtype(dtype).str
+                        for name, dtype in self.agent_columns.items()
+                    },
+                },
+                f,
+            )
+
+    def chunks(self) -> Iterator[tuple[int, dict[str, np.ndarray]]]:
+        """
+        Yields the first step and the agent variables of each chunk of steps, reading one chunk at a time from disk
+
+        The variables are arrays of shape (steps in the chunk, number of agents).
+        """
+        if self.buffers is None:
+            return
+        chunk_steps = len(self.buffers["position"])
+        if self.flushed > 0:
+            files = {
+                name: np.memmap(
+                    self.path(name),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(self.flushed, len(self.ids)),
+                )
+                for name, dtype in self.agent_columns.items()
+            }
+            for start in range(0, self.flushed, chunk_steps):
+                yield start, {
+                    name: np.array(f[start : start + chunk_steps])
+                    for name, f in files.items()
+                }
+        held = self.steps - self.flushed
+        if held > 0:
+            yield self.flushed, {
+                name: buffer[:held] for name, buffer in self.buffers.items()
+            }
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns an agent variable at every step, as an array of shape (steps, number of agents)
+        """
+        n = 0 if self.ids is None else len(self.ids)
+        chunks = [columns[name] for _, columns in self.chunks()]
+        if not chunks:
+            return np.empty((0, n), dtype=self.agent_columns[name])
+        return np.concatenate(chunks)
+
+    def frame(self, start: int, columns: dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Returns a table of the agent variables of a chunk of steps, indexed by step and agent ID
+        """
+        steps, n = columns["position"].shape
+        highway = columns["highway"].ravel()
+        data = {
+            "position": self.node_ids[columns["position"].ravel()],
+            "lat": columns["lat"].ravel(),
+            "lon": columns["lon"].ravel(),
+            "highway": pd.array(
+                np.where(highway < 0, 0, highway), dtype=pd.Int64Dtype()
+            ),
+            "reroute_count": columns["reroute_count"].ravel(),
+            "status": columns["status"].ravel().astype(np.int8),
+            "in_car": columns["in_car"].ravel(),
+        }
+        data["highway"][highway < 0] = pd.NA
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(np.arange(start, start + steps), n), np.tile(self.ids, steps)],
+            names=["Step", "AgentID"],
+        )
+        return pd.DataFrame(data, index=index)
+
+    def get_model_vars_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.model_vars)
+
+    def get_agent_vars_dataframe(self) -> pd.DataFrame:
+        """
+        Returns a table of the agent variables at every step, which holds the whole output in memory
+        """
+        frames = [self.frame(start, columns) for start, columns in self.chunks()]
+        if frames:
+            return pd.concat(frames)
+        return self.frame(
+            0,
+            {
+                name: np.empty((0, 0), dtype)
+                for name, dtype in self.agent_columns.items()
+            },
+        )
+
+    def to_csv(self, path: str) -> None:
+        """
+        Write the agent variables to a CSV file, one chunk of steps at a time
+        """
+        with open(path, "w", newline="") as f:
+            first = True
+            for start, columns in self.chunks():
+                self.frame(start, columns).to_csv(f, header=first)
+                first = False
+            if first:
+                self.get_agent_vars_dataframe().to_csv(f)
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """
+        Returns the agent variables collected so far, as arrays of shape (steps, number of agents)
+        """
+        if self.ids is None:
+            return {}
+        return {"record_" + name: self.column(name) for name in self.agent_columns}
+
+    def set_state(
+        self, ids: np.ndarray, node_ids: np.ndarray, state: dict[str, np.ndarray]
+    ) -> None:
+        """
+        Write the agent variables from ``get_state`` to new files, to carry on collecting after them
+        """
+        if "record_position" not in state:
+            return
+        self.allocate(ids, node_ids)
+        for name in self.agent_columns:
+            with open(self.path(name), "ab") as f:
+                state["record_" + name].astype(self.agent_columns[name]).tofile(f)
+        self.steps = self.flushed = len(state["record_position"])
@@ -0,0 +1,151 @@
+import igraph
+import networkx as nx
+import numpy as np
+
+# kinds of node in the network
+ROAD = 0
+TARGET = 1
+AGENT_START = 2
+
+
+class NetworkCore:
+    """A compact, integer-indexed representation of the road network
+
+    Nodes are numbered contiguously from zero in the same order as the
+    networkx graph and node table.  Each undirected edge of the graph is
+    stored once in the edge arrays, and the adjacency is stored as a
+    compressed sparse row (CSR) matrix of directed arcs, keeping the shortest
+    of any parallel edges.
+
+    Args:
+        node_ids: original identifier of each node
+        x: longitude of each node
+        y: latitude of each node
+        kind: ``ROAD``, ``TARGET`` or ``AGENT_START`` for each node
+        edge_u: index of the first node of each edge
+        edge_v: index of the second node of each edge
+        edge_length: length of each edge in metres
+        edge_osmid: OSM way ID of each edge, or -1 if it has none
+        edge_key: networkx multiedge key of each edge
+
+    Attributes:
+        indptr (np.ndarray): arcs leaving node i are ``indptr[i]:indptr[i + 1]``
+        tail (np.ndarray): node at the start of each arc
+        indices (np.ndarray): node at the end of each arc
+        reverse (np.ndarray): index of the arc in the opposite direction to each arc
+        length (np.ndarray): length of each arc in metres
+        osmid (np.ndarray): OSM way ID of each arc, or -1 if it has none
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        kind: np.ndarray,
+        edge_u: np.ndarray,
+        edge_v: np.ndarray,
+        edge_length: np.ndarray,
+        edge_osmid: np.ndarray,
+        edge_key: np.ndarray,
+    ):
+        self.node_ids = np.asarray(node_ids, dtype=object)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.edge_u = np.asarray(edge_u, dtype=np.int32)
+        self.edge_v = np.asarray(edge_v, dtype=np.int32)
+        self.edge_length = np.asarray(edge_length, dtype=np.float64)
+        self.edge_osmid = np.asarray(edge_osmid, dtype=np.int64)
+        self.edge_key = np.asarray(edge_key, dtype=np.int32)
+
+        # both directions of every edge, shortest of any parallel edges first
+        rows = np.concatenate([self.edge_u, self.edge_v])
+        cols = np.concatenate([self.edge_v, self.edge_u])
+        lengths = np.concatenate([self.edge_length, self.edge_length])
+        osmids = np.concatenate([self.edge_osmid, self.edge_osmid])
+        order = np.lexsort((lengths, cols, rows))
+        rows, cols = rows[order], cols[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+
+        self.tail = rows[first]
+        self.indices = cols[first]
+        self.length = lengths[order][first]
+        self.osmid = osmids[order][first]
+        self.indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[first], minlength=self.n_nodes), out=self.indptr[1:])
+        # sorted key of each arc, used to find arcs by their end nodes
+        self.arc_keys = self.tail.astype(np.int64) * self.n_nodes + self.indices
+        self.reverse = self.arcs(self.indices, self.tail)
+
+    @classmethod
+    def from_graph(cls, G: nx.MultiGraph) -> "NetworkCore":
+        """
+        Build the core from an undirected networkx graph of the road network
+
+        Args:
+            G (networkx.MultiGraph): road network graph
+        """
+        node_ids = np.empty(len(G), dtype=object)
+        node_ids[:] = list(G.nodes)
+        index = {node: i for i, node in enumerate(node_ids)}
+        edges = list(G.edges(keys=True, data=True))
+        return cls(
+            node_ids,
+            [d["x"] for _, d in G.nodes(data=True)],
+            [d["y"] for _, d in G.nodes(data=True)],
+            [d.get("kind", ROAD) for _, d in G.nodes(data=True)],
+            [index[u] for u, _, _, _ in edges],
+            [index[v] for _, v, _, _ in edges],
+            [d["length"] for _, _, _, d in edges],
+            [osmid(d.get("osmid")) for _, _, _, d in edges],
+            [k for _, _, k, _ in edges],
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def arc(self, u: int, v: int) -> int:
+        """
+        Returns the index of the arc from node u to node v
+        """
+        return int(np.searchsorted(self.arc_keys, u * self.n_nodes + v))
+
+    def arcs(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        Returns the index of the arc between each pair of nodes
+        """
+        keys = np.asarray(u, dtype=np.int64) * self.n_nodes + np.asarray(v)
+        return np.searchsorted(self.arc_keys, keys)
+
+    def nodes_of_kind(self, kind: int) -> np.ndarray:
+        """
+        Returns the indices of all nodes of a kind
+        """
+        return np.flatnonzero(self.kind == kind)
+
+    def to_igraph(self) -> igraph.Graph:
+        """
+        Returns an igraph view of the network with the same node and edge order
+        """
+        return igraph.Graph(
+            n=self.n_nodes,
+            edges=np.column_stack([self.edge_u, self.edge_v]),
+            vertex_attrs={"_nx_name": self.node_ids},
+            edge_attrs={
+                "length": self.edge_length,
+                "osmid": self.edge_osmid,
+                "_nx_multiedge_key": self.edge_key,
+            },
+        )
+
+
+def osmid(value) -> int:
+    """
+    Returns an OSM way ID as an integer, or -1 if there is none
+    """
+    if isinstance(value, list):
+        value = value[0]
+    return -1 if value is None else int(value)
@@ -0,0 +1,330 @@
+import multiprocessing
+import os
+import numpy as np
+from geopandas import GeoDataFrame
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import project
+
+
+def partition(
+    x: np.ndarray, y: np.ndarray, weights: np.ndarray, regions: int
+) -> np.ndarray:
+    """
+    Split points into regions of about equal total weight by recursive coordinate bisection
+
+    The points are cut across the longer side of their extent, at the point
+    where the weight on each side is in proportion to the number of regions
+    it will be split into, and each side is cut again in the same way.
+
+    Args:
+        x (np.ndarray): easting of each point in metres
+        y (np.ndarray): northing of each point in metres
+        weights (np.ndarray): weight of each point
+        regions (int): number of regions
+
+    Returns:
+        region of each point, from 0 to ``regions - 1``
+    """
+    region = np.zeros(len(x), dtype=np.int32)
+
+    def split(points: np.ndarray, first: int, count: int) -> None:
+        if count == 1 or len(points) == 0:
+            region[points] = first
+            return
+        left = count // 2
+        px, py = x[points], y[points]
+        coords = px if np.ptp(px) >= np.ptp(py) else py
+        points = points[np.argsort(coords, kind="stable")]
+        total = np.cumsum(weights[points])
+        cut = np.searchsorted(total, total[-1] * left / count, side="right")
+        split(points[:cut], first, left)
+        split(points[cut:], first + left, count - left)
+
+    split(np.arange(len(x)), 0, regions)
+    return region
+
+
+class Region(VectorizedEvacuationModel):
+    """The agents on the roads of one region of a DistributedEvacuationModel, moved in a worker process
+
+    A region holds the agent arrays of the model for the agents in it only,
+    and shares the network and the routes of the model.  An agent is in the
+    region of the node at the start of its road.  An agent that enters a
+    road of another region during a step is taken out of the region, with
+    the distance it can still travel, to be handed to the other region.
+    The arcs the agents travel and the agents that reach a target are kept
+    to be counted in the model's summary when the step is gathered.
+
+    Args:
+        model: the distributed model
+        region: number of the region
+        agents: indices of the model's agents that are in the region
+
+    Attributes:
+        index (np.ndarray): index in the model of each agent in the region
+    """
+
+    def __init__(
+        self, model: "DistributedEvacuationModel", region: int, agents: np.ndarray
+    ):
+        # a region only moves agents, so the model is not initialised
+        self.core = model.core
+        self.route_nodes = model.route_nodes
+        self.route_arcs = model.route_arcs
+        self.node_region = model.node_region
+        self.region = region
+        self.seconds_elapsed = model.seconds_elapsed
+        self.time_step = model.time_step
+        self.index = agents
+        for name in self.agent_arrays:
+            setattr(self, name, getattr(model, name)[agents])
+        # agents that have left the region in this step, with their remaining budget
+        self.leaving: list[tuple[np.ndarray, np.ndarray]] = []
+        # arcs travelled and agents that reached a target in this step
+        self.traversed: list[np.ndarray] = []
+        self.evacuees: list[np.ndarray] = []
+
+    def begin(self, seconds_elapsed: float, time_step: float) -> dict | None:
+        """
+        Move the agents in the region for one time step, and return those that leave it as for ``depart``
+        """
+        self.seconds_elapsed = seconds_elapsed
+        self.time_step = time_step
+        self.travel()
+        return self.depart()
+
+    def arrive(self, agents: dict[str, np.ndarray]) -> dict | None:
+        """
+        Take in agents handed over by other regions and move them on, and return those that leave again as for ``depart``
+
+        Args:
+            agents (dict): arrays of the agents as returned by ``depart``
+        """
+        n = len(self.index)
+        for name in self.agent_arrays + ("index",):
+            setattr(self, name, np.concatenate([getattr(self, name), agents[name]]))
+        budget = np.zeros(len(self.index))
+        budget[n:] = agents["budget"]
+        self.move(np.arange(n, len(self.index)), budget)
+        return self.depart()
+
+    def crossed(self, agents: np.ndarray) -> None:
+        self.traversed.append(
+            self.route_arcs[self.route_start[agents] + self.route_index[agents]]
+        )
+
+    def arrived(self, agents: np.ndarray) -> None:
+        self.evacuees.append(self.index[agents])
+
+    def entered(self, agents: np.ndarray, budget: np.ndarray) -> np.ndarray:
+        position = self.route_nodes[self.route_start[agents] + self.route_index[agents]]
+        leaving = self.node_region[position] != self.region
+        if leaving.any():
+            self.leaving.append((agents[leaving], budget[agents[leaving]]))
+        return agents[~leaving]
+
+    def depart(self) -> dict[str, np.ndarray] | None:
+        """
+        Remove the agents that have left the region in this step
+
+        Returns:
+            the arrays of the agents, their index in the model and the distance
+            in metres that each can still travel, or None if no agent has left
+        """
+        if not self.leaving:
+            return None
+        agents = np.concatenate([a for a, _ in self.leaving])
+        budget = np.concatenate([b for _, b in self.leaving])
+        self.leaving = []
+        names = self.agent_arrays + ("index",)
+        departing = {name: getattr(self, name)[agents] for name in names}
+        departing["budget"] = budget
+        stay = np.ones(len(self.index), dtype=bool)
+        stay[agents] = False
+        for name in names:
+            setattr(self, name, getattr(self, name)[stay])
+        return departing
+
+    def state(self) -> dict[str, np.ndarray]:
+        """
+        Returns the arrays that change as the agents in the region move, their index in the model, and the arcs travelled and agents that reached a target in this step
+        """
+        state = {
+            "index": self.index,
+            "route_index": self.route_index,
+            "distance_along_edge": self.distance_along_edge,
+            "evacuated": self.evacuated,
+            "blocked": self.blocked,
+            "highway": self.highway,
+            "traversed": np.concatenate(self.traversed + [np.empty(0, np.int64)]),
+            "evacuees": np.concatenate(self.evacuees + [np.empty(0, np.int64)]),
+        }
+        self.traversed = []
+        self.evacuees = []
+        return state
+
+
+def serve(region: Region, connection) -> None:
+    """
+    Answer requests to call methods of a region, in a worker process, until asked to close
+    """
+    while True:
+        method, args = connection.recv()
+        if method == "close":
+            break
+        try:
+            result = getattr(region, method)(*args)
+        except Exception as e:
+            result = e
+        connection.send(result)
+    connection.close()
+
+
+class DistributedEvacuationModel(VectorizedEvacuationModel):
+    """A VectorizedEvacuationModel that splits the road network into regions and moves the agents of each region in its own worker process
+
+    Takes the same arguments as ``EvacuationModel``, and the number of
+    regions.  The network is split into regions of about equal load by
+    recursive coordinate bisection, weighting each node by the number of
+    routes through it.  In each step every worker moves the agents in its
+    region, and an agent that enters a road of another region is handed to
+    that region's worker with the distance it can still travel, and moves on
+    there.  Handoffs are passed between the workers through this process
+    until there are none left.  The arrays of all agents are then gathered
+    here, so the data collector, output files, stop conditions and
+    checkpoints work as for ``VectorizedEvacuationModel``.
+
+    Agents handed to a region are held up by where the agents in it stopped,
+    rather than where they were at the start of the round, so results differ
+    slightly from ``VectorizedEvacuationModel`` where agents meet at region
+    boundaries.  Rerouting is not supported.  The workers are forked, which
+    requires a POSIX system.  They are started by the first step with the
+    state of the agents at that time, and stopped by ``close`` or at the end
+    of ``run``.
+
+    Args:
+        regions: number of regions and worker processes.  Defaults to the number of CPUs
+
+    Attributes:
+        node_region (np.ndarray): region of each node of the core
+        handoffs (int): number of times an agent has been handed from one region to another
+    """
+
+    def __init__(self, *args, regions: int | None = None, **kwargs):
+        if kwargs.get("reroute_interval"):
+            raise ValueError("Rerouting is not supported by the distributed model")
+        self.regions = regions or os.cpu_count()
+        self.connections = None
+        super().__init__(*args, **kwargs)
+
+    def create_agents(
+        self, agents_in_evacuation_zone: GeoDataFrame, processes: int | None
+    ) -> None:
+        super().create_agents(agents_in_evacuation_zone, processes)
+        # every node carries a little weight, so that nodes without routes are still split evenly
+        load = np.bincount(self.route_nodes, minlength=self.core.n_nodes) + 1
+        x, y = project(self.core.x, self.core.y).T
+        self.node_region = partition(x, y, load, self.regions)
+        self.handoffs = 0
+
+    def get_agent_state(self) -> dict[str, np.ndarray]:
+        state = super().get_agent_state()
+        state["node_region"] = self.node_region
+        state["handoffs"] = np.array(self.handoffs)
+        return state
+
+    def set_agent_state(self, state: dict[str, np.ndarray]) -> None:
+        super().set_agent_state(state)
+        self.node_region = state["node_region"].copy()
+        self.regions = int(self.node_region.max()) + 1
+        self.handoffs = int(state["handoffs"])
+        self.connections = None
+
+    def start(self) -> None:
+        """
+        Fork a worker process for each region, holding the agents that are in it
+        """
+        context = multiprocessing.get_context("fork")
+        region = self.node_region[self.position]
+        self.workers = []
+        self.connections = []
+        for r in range(self.regions):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(
+                target=serve,
+                args=(Region(self, r, np.flatnonzero(region == r)), worker_connection),
+                daemon=True,
+            )
+            worker.start()
+            worker_connection.close()
+            self.workers.append(worker)
+            self.connections.append(connection)
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.  They are started again by the next step
+        """
+        if self.connections is None:
+            return
+        for connection in self.connections:
+            connection.send(("close", ()))
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+        self.connections = None
+
+    def call(self, regions: list[int], method: str, args: list[tuple]) -> list:
+        """
+        Call a method of several regions at once in their workers, and return the results
+        """
+        for r, a in zip(regions, args):
+            self.connections[r].send((method, a))
+        results = [self.connections[r].recv() for r in regions]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def advance(self):
+        if self.connections is None:
+            self.start()
+        regions = list(range(self.regions))
+        leaving = self.call(
+            regions, "begin", [(self.seconds_elapsed, self.time_step)] * self.regions
+        )
+        while True:
+            leaving = [agents for agents in leaving if agents is not None]
+            if not leaving:
+                break
+            agents = {
+                name: np.concatenate([a[name] for a in leaving]) for name in leaving[0]
+            }
+            self.handoffs += len(agents["index"])
+            position = self.route_nodes[agents["route_start"] + agents["route_index"]]
+            destination = self.node_region[position]
+            targets = np.unique(destination).tolist()
+            leaving = self.call(
+                targets,
+                "arrive",
+                [
+                    ({name: a[destination == r] for name, a in agents.items()},)
+                    for r in targets
+                ],
+            )
+
+        evacuees = []
+        for state in self.call(regions, "state", [()] * self.regions):
+            self.summary.traverse(state.pop("traversed"))
+            evacuees.append(state.pop("evacuees"))
+            index = state.pop("index")
+            for name, values in state.items():
+                getattr(self, name)[index] = values
+        # every agent that reaches a target in a step is counted at the end of it
+        super().arrived(np.concatenate(evacuees))
+        self.schedule.steps += 1
+
+    def run(self, *args, **kwargs):
+        try:
+            return super().run(*args, **kwargs)
+        finally:
+            self.close()
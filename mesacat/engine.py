@@ -0,0 +1,356 @@
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame
+from mesacat.core import AGENT_START
+from mesacat.model import EvacuationModel
+
+
+class VectorizedEvacuationModel(EvacuationModel):
+    """An EvacuationModel that stores the state of every agent in arrays and moves them all at once
+
+    Takes the same arguments as ``EvacuationModel`` and writes the same output
+    files, but there are no ``EvacuationAgent`` objects.  Each step advances
+    every moving agent with array operations, in rounds: agents that do not
+    reach the end of their road move along it, and agents that do either cross
+    the node, or stop 1 m behind the agent ahead of them on the same road if it
+    is within reach.  Agents in each round are held up by where the others were
+    at the start of the round, rather than by agents that have already moved in
+    a random order.
+
+    Attributes:
+        ids (np.ndarray): unique ID of each agent
+        agent_type (np.ndarray): type of each agent
+        in_car (np.ndarray): whether each agent is in a car
+        speed (np.ndarray): speed of each agent in km/h
+        delay (np.ndarray): time in seconds before each pedestrian sets off
+        route_nodes (np.ndarray): the nodes of every route, one after another
+        route_arcs (np.ndarray): the arc from each node of ``route_nodes`` to
+            the next node on its route, -1 at the end of each route
+        route_start (np.ndarray): position in ``route_nodes`` of the start of each agent's route
+        route_length (np.ndarray): number of nodes on each agent's route
+        route_index (np.ndarray): number of nodes each agent has passed along its route
+        distance_along_edge (np.ndarray): distance each agent has travelled from its most recent node
+        evacuated (np.ndarray): whether each agent has reached a target
+        stranded (np.ndarray): whether each agent cannot reach a target
+        blocked (np.ndarray): whether each agent was held up by another in the last step
+        highway (np.ndarray): OSM way ID of the road each agent last turned onto, -1 if none
+        reroute_count (np.ndarray): number of times each agent has been rerouted
+    """
+
+    # the arrays that hold the state of each agent
+    agent_arrays = (
+        "ids",
+        "agent_type",
+        "in_car",
+        "speed",
+        "delay",
+        "route_start",
+        "route_length",
+        "route_index",
+        "distance_along_edge",
+        "evacuated",
+        "stranded",
+        "blocked",
+        "highway",
+        "reroute_count",
+    )
+    # and the routes that they point into
+    state_arrays = ("route_nodes", "route_arcs") + agent_arrays
+
+    def agent_ids(self) -> np.ndarray:
+        return self.ids
+
+    def agent_output(self) -> dict[str, np.ndarray]:
+        return {
+            "position": self.position,
+            "lat": self.lat,
+            "lon": self.lon,
+            "highway": self.highway,
+            "reroute_count": self.reroute_count,
+            "status": self.evacuated,
+            "in_car": self.in_car,
+        }
+
+    def get_agent_state(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.state_arrays}
+
+    def set_agent_state(self, state: dict[str, np.ndarray]) -> None:
+        for name in self.state_arrays:
+            setattr(self, name, state[name].copy())
+
+    def create_agents(
+        self, agents_in_evacuation_zone: GeoDataFrame, processes: int | None
+    ) -> None:
+        agents = agents_in_evacuation_zone
+        n = len(agents)
+        self.ids = agents.index.values
+        self.agent_type = agents["agent_type"].values.astype(np.int64)
+        self.in_car = agents["in_car"].values.astype(bool)
+        self.speed = np.where(self.in_car, 48, agents["walking_speed"].values)
+        self.delay = np.maximum(self.rng.normal(300, 120, n), 0)
+
+        self.route_nodes = np.empty(0, dtype=np.int32)
+        self.route_arcs = np.empty(0, dtype=np.int64)
+        self.route_start = np.zeros(n, dtype=np.int64)
+        self.route_length = np.zeros(n, dtype=np.int64)
+        self.route_index = np.zeros(n, dtype=np.int64)
+        self.distance_along_edge = np.zeros(n)
+        self.evacuated = np.zeros(n, dtype=bool)
+        self.blocked = np.zeros(n, dtype=bool)
+        self.highway = np.full(n, -1, dtype=np.int64)
+        self.reroute_count = np.zeros(n, dtype=np.int64)
+
+        start_idx = self.core.nodes_of_kind(AGENT_START)[self.ids]
+        self.set_routes(np.arange(n), self.initial_routes(start_idx, processes))
+        self.stranded = self.route_length < 2
+        self.summary.strand(int(self.stranded.sum()))
+
+    def set_routes(self, agents: np.ndarray, routes: list[np.ndarray]) -> None:
+        """
+        Give agents new routes, keeping how many nodes they have passed
+
+        Args:
+            agents (np.ndarray): indices of the agents
+            routes (list[np.ndarray]): new route of each agent
+        """
+        lengths = np.array([len(route) for route in routes], dtype=np.int64)
+        nodes = np.concatenate(routes).astype(np.int32)
+        arcs = self.core.arcs(nodes[:-1], nodes[1:])
+        arcs = np.append(arcs, -1)
+        ends = np.cumsum(lengths) - 1
+        arcs[ends] = -1
+
+        self.route_start[agents] = len(self.route_nodes) + ends + 1 - lengths
+        self.route_length[agents] = lengths
+        self.route_nodes = np.concatenate([self.route_nodes, nodes])
+        self.route_arcs = np.concatenate([self.route_arcs, arcs])
+
+    @property
+    def position(self) -> np.ndarray:
+        """
+        Index of the most recent node each agent has passed
+        """
+        return self.route_nodes[self.route_start + self.route_index]
+
+    @property
+    def arc(self) -> np.ndarray:
+        """
+        Arc that each agent is on, -1 for agents that have evacuated or are stranded
+        """
+        return self.route_arcs[self.route_start + self.route_index]
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.interpolate(self.core.y)
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self.interpolate(self.core.x)
+
+    def interpolate(self, values: np.ndarray) -> np.ndarray:
+        """
+        Interpolate a value given at each node to each agent's position along its road
+        """
+        p = self.route_start + self.route_index
+        result = values[self.route_nodes[p]]
+        on_road = np.flatnonzero(self.route_arcs[p] >= 0)
+        arcs = self.route_arcs[p[on_road]]
+        length = self.core.length[arcs]
+        k = np.divide(
+            self.distance_along_edge[on_road],
+            length,
+            out=np.zeros(len(on_road)),
+            where=length > 0,
+        )
+        destination = values[self.core.indices[arcs]]
+        result[on_road] = k * destination + (1 - k) * result[on_road]
+        return result
+
+    def leader_distance(self) -> np.ndarray:
+        """
+        Returns the distance along the road of the nearest agent ahead of each agent, inf if there is none
+
+        Only agents on the same arc in the same mode count.
+        """
+        leader = np.full(len(self.ids), np.inf)
+        arc = self.arc
+        on_road = np.flatnonzero(arc >= 0)
+        group = arc[on_road] * 2 + self.in_car[on_road]
+        distance = self.distance_along_edge[on_road]
+        order = np.lexsort((distance, group))
+        group, distance = group[order], distance[order]
+
+        # the leader is the first agent after those level with each agent
+        level = np.ones(len(order), dtype=bool)
+        level[1:] = (group[1:] != group[:-1]) | (distance[1:] != distance[:-1])
+        starts = np.flatnonzero(level)
+        after = np.append(starts[1:], len(order))[np.cumsum(level) - 1]
+        has_leader = after < len(order)
+        has_leader[has_leader] = group[after[has_leader]] == group[has_leader]
+        ahead = np.full(len(order), np.inf)
+        ahead[has_leader] = distance[after[has_leader]]
+        leader[on_road[order]] = ahead
+        return leader
+
+    def queue(self, agents: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """
+        Returns where agents held up in the same round stop, each at least 1 m behind the one in front
+
+        Agents held up by the same agent, such as agents that entered a road
+        together, would otherwise all stop at the same place.
+
+        Args:
+            agents (np.ndarray): indices of the held up agents
+            target (np.ndarray): where each agent would stop if it were alone
+        """
+        distance = self.distance_along_edge[agents]
+        group = self.arc[agents] * 2 + self.in_car[agents]
+        # front to back within each road
+        order = np.lexsort((-distance, group))
+        group = group[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = group[1:] != group[:-1]
+        starts = np.flatnonzero(first)
+        rank = np.arange(len(order)) - starts[np.cumsum(first) - 1]
+        behind = pd.Series(target[order] + rank).groupby(group).cummin().values - rank
+        stop = np.empty(len(order))
+        stop[order] = np.maximum(behind, distance[order])
+        return stop
+
+    def moving(self) -> np.ndarray:
+        """
+        Returns whether each agent is on the move
+        """
+        return ~(self.evacuated | self.stranded) & (
+            self.in_car | (self.seconds_elapsed >= self.delay)
+        )
+
+    def advance(self):
+        self.travel()
+        self.schedule.steps += 1
+
+    def travel(self) -> None:
+        """
+        Move every agent that is on the move for one time step
+        """
+        moving = self.moving()
+        self.blocked[:] = False
+        # metres travelled in one time step
+        budget = np.where(moving, self.speed / 60 / 60 * self.time_step * 1000, 0)
+        self.move(np.flatnonzero(moving), budget)
+
+    def move(self, todo: np.ndarray, budget: np.ndarray) -> None:
+        """
+        Move agents along their routes until each has travelled its budget, reached a target or been held up
+
+        Args:
+            todo (np.ndarray): indices of the agents to move
+            budget (np.ndarray): distance in metres that each agent can still travel
+        """
+        core = self.core
+        while len(todo) > 0:
+            leader = self.leader_distance()[todo]
+            distance = self.distance_along_edge[todo]
+            remaining = core.length[self.arc[todo]] - distance
+            crossing = budget[todo] >= remaining
+
+            # agents that stay on their road
+            stay = todo[~crossing]
+            self.distance_along_edge[stay] += budget[stay]
+            budget[stay] = 0
+
+            # agents that are held up by the agent ahead
+            gap = leader - distance
+            held = crossing & (gap < budget[todo])
+            h = todo[held]
+            self.distance_along_edge[h] = self.queue(
+                h, distance[held] + np.maximum(gap[held] - 1, 0)
+            )
+            self.blocked[h] = True
+            budget[h] = 0
+
+            # agents that pass through their next node
+            cross = crossing & ~held
+            c = todo[cross]
+            budget[c] -= remaining[cross]
+            self.crossed(c)
+            self.route_index[c] += 1
+            self.distance_along_edge[c] = 0
+            arrived = self.route_index[c] == self.route_length[c] - 1
+            self.evacuated[c[arrived]] = True
+            self.arrived(c[arrived])
+
+            todo = c[~arrived]
+            osmid = core.osmid[self.arc[todo]]
+            self.highway[todo[osmid >= 0]] = osmid[osmid >= 0]
+            todo = self.entered(todo, budget)
+
+    def crossed(self, agents: np.ndarray) -> None:
+        """
+        Called with the agents that are about to pass through the node at the end of their road
+        """
+        self.summary.traverse(
+            self.route_arcs[self.route_start[agents] + self.route_index[agents]]
+        )
+
+    def arrived(self, agents: np.ndarray) -> None:
+        """
+        Called with the agents that have just reached a target, during the current step
+        """
+        self.summary.evacuate_all(
+            self.agent_type[agents],
+            self.route_nodes[self.route_start[agents] + self.route_index[agents]],
+            np.full(len(agents), self.seconds_elapsed + self.time_step),
+        )
+
+    def entered(self, agents: np.ndarray, budget: np.ndarray) -> np.ndarray:
+        """
+        Called with the agents that have just entered a new road and can travel further, returns those that carry on
+        """
+        return agents
+
+    def agent_count(self) -> int:
+        return len(self.ids)
+
+    def interactions(self) -> tuple[int, int]:
+        return int(self.blocked.sum()), int(self.moving().sum())
+
+    def progress(self) -> tuple:
+        return (
+            int(self.evacuated.sum()),
+            int(self.route_index.sum()),
+            float(self.distance_along_edge.sum()),
+        )
+
+    def waiting(self) -> int:
+        return int(
+            (~(self.in_car | self.stranded) & (self.seconds_elapsed < self.delay)).sum()
+        )
+
+    def finished(self) -> bool:
+        return bool((self.evacuated | self.stranded).all())
+
+    def occupancy(self) -> np.ndarray:
+        arc = self.arc
+        occupancy = np.bincount(arc[arc >= 0], minlength=len(self.core.length))
+        return occupancy + occupancy[self.core.reverse]
+
+    def reroute(self) -> None:
+        self.exit_field.update(
+            self.core.length + self.congestion_penalty * self.occupancy()
+        )
+        agents = []
+        routes = []
+        for i in np.flatnonzero(self.blocked & ~(self.evacuated | self.stranded)):
+            start = self.route_start[i]
+            index = self.route_index[i]
+            current = self.route_nodes[start : start + self.route_length[i]]
+            # follow the exit field from the end of the current edge
+            route = self.exit_field.route(current[index + 1])
+            if len(route) < 2 or np.array_equal(route, current[index + 1 :]):
+                continue
+            agents.append(i)
+            routes.append(np.concatenate([current[: index + 1], route]))
+        if agents:
+            self.set_routes(np.array(agents), routes)
+            self.reroute_count[agents] += 1
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import copy
+import multiprocessing
+import os
+from datetime import time
+from typing import Callable
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame
+from scipy import stats
+from shapely.geometry import Polygon
+from mesacat.cache import OSMCache
+from mesacat.model import EvacuationModel
+from mesacat.network import Network, NetworkOverlay
+
+
+class Ensemble:
+    """Many replicates of one evacuation scenario, each drawing from its own random number stream
+
+    The road network and an overlay of it with the targets on the boundary of
+    the evacuation zone are built once, and each replicate adds its agents to
+    a copy of the overlay.  The replicates run in worker processes forked
+    from this one, which share the prebuilt network copy-on-write instead of
+    building or receiving a pickled copy of it.  Forking requires a POSIX
+    system, unless the replicates are run in this process.
+
+    The seed of each replicate is spawned from the ensemble's seed with
+    ``numpy.random.SeedSequence``, and any replicate can be reproduced on its
+    own by building the model with the seed recorded in ``runs``.
+
+    Args:
+        domain: Bounding polygon used
+        evacuation_zone: Spatial table of bomb exclusion zones
+        population_data_path: path to input data files
+        start_time: time that the simulation will begin at
+        n_agents: number of agents to be generated in each replicate
+        cache: Optional on-disk cache of OSM downloads
+        network: Prebuilt road network of the domain area
+        model_class: EvacuationModel or a subclass of it
+        model_kwargs: other arguments of the model, such as ``time_step``
+
+    Attributes:
+        network (NetworkOverlay): road network shared by the replicates, with the targets added
+        runs (pd.DataFrame): counts of every replicate after ``run``, as returned by ``replicates``
+    """
+
+    def __init__(
+        self,
+        domain: Polygon,
+        evacuation_zone: GeoDataFrame,
+        population_data_path: str,
+        start_time: time,
+        n_agents: int,
+        cache: OSMCache | None = None,
+        network: Network | None = None,
+        model_class: type = EvacuationModel,
+        **model_kwargs,
+    ):
+        if network is None:
+            network = Network.from_domain(domain, cache)
+        # the targets are added once, and each replicate adds its agents to a copy
+        self.network = NetworkOverlay(network)
+        self.network.add_targets(evacuation_zone.iloc[0].geometry)
+        self.domain = domain
+        self.evacuation_zone = evacuation_zone
+        self.population_data_path = population_data_path
+        self.start_time = start_time
+        self.n_agents = n_agents
+        self.cache = cache
+        self.model_class = model_class
+        self.model_kwargs = model_kwargs
+        self.runs: pd.DataFrame | None = None
+
+    @staticmethod
+    def seeds(replicates: int, seed: int | None = None) -> list[int]:
+        """
+        Returns the seed of each replicate, spawned from the seed of the ensemble
+        """
+        return [
+            int(s.generate_state(1, np.uint64)[0])
+            for s in np.random.SeedSequence(seed).spawn(replicates)
+        ]
+
+    def model(self, seed: int) -> EvacuationModel:
+        """
+        Build the model of a replicate on the shared network
+        """
+        return self.model_class(
+            None,
+            self.domain,
+            self.evacuation_zone,
+            self.population_data_path,
+            self.start_time,
+            self.n_agents,
+            self.cache,
+            network=self.network,
+            seed=seed,
+            **self.model_kwargs,
+        )
+
+    def replicates(
+        self,
+        replicates: int,
+        seed: int | None = None,
+        processes: int | None = None,
+        steps: int | None = None,
+        until: Callable[[EvacuationModel], bool] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Run the replicates and return the model output of each of them
+
+        Args:
+            replicates (int): number of replicates
+            seed (int): seed of the ensemble
+            processes (int): number of worker processes.  Defaults to the
+                number of CPUs.  If 1, the replicates are run in this process
+            steps (int): maximum number of steps of each replicate
+            until (Callable): condition that stops a replicate early, as for
+                ``EvacuationModel.run``.  Each replicate uses its own copy
+
+        Returns:
+            table indexed by replicate and step, with the seed of each
+            replicate and the ``time``, ``evacuated`` and ``stranded`` columns
+            of its model output
+        """
+        global _run
+        tasks = list(enumerate(self.seeds(replicates, seed)))
+        processes = processes or os.cpu_count()
+        _run = (self, steps, until)
+        try:
+            if processes == 1:
+                runs = [run_replicate(task) for task in tasks]
+            else:
+                context = multiprocessing.get_context("fork")
+                with context.Pool(processes) as pool:
+                    runs = pool.map(run_replicate, tasks, chunksize=1)
+        finally:
+            _run = None
+        self.runs = pd.concat(runs).set_index(["replicate", "step"])
+        return self.runs
+
+    def run(
+        self,
+        replicates: int,
+        seed: int | None = None,
+        processes: int | None = None,
+        steps: int | None = None,
+        until: Callable[[EvacuationModel], bool] | None = None,
+        interval: float | None = None,
+        confidence: float = 0.95,
+    ) -> pd.DataFrame:
+        """
+        Run the replicates and return the mean evacuated and stranded curves with confidence bands
+
+        Takes the same arguments as ``replicates``, and those of ``summarise``.
+        The interval defaults to the model's time step.
+        """
+        runs = self.replicates(replicates, seed, processes, steps, until)
+        if interval is None:
+            interval = self.model_kwargs.get("time_step", 10)
+        return summarise(runs, interval, confidence)
+
+
+# the ensemble, maximum steps and stop condition of a run, inherited by the forked workers
+_run: tuple[Ensemble, int | None, Callable | None] | None = None
+
+
+def run_replicate(task: tuple[int, int]) -> pd.DataFrame:
+    """
+    Run one replicate of the current ensemble and return its model output
+    """
+    replicate, seed = task
+    ensemble, steps, until = _run
+    model = ensemble.model(seed)
+    # stop conditions may keep state, so each replicate gets its own
+    model.run(steps, copy.deepcopy(until))
+    output = pd.DataFrame(
+        {
+            name: model.data_collector.model_vars[name]
+            for name in ("time", "evacuated", "stranded")
+        }
+    )
+    output.insert(0, "seed", np.uint64(seed))
+    output.insert(0, "step", np.arange(len(output)))
+    output.insert(0, "replicate", replicate)
+    return output
+
+
+def summarise(
+    runs: pd.DataFrame, interval: float = 10, confidence: float = 0.95
+) -> pd.DataFrame:
+    """
+    Returns the mean evacuated and stranded curves of an ensemble with confidence bands
+
+    The counts of each replicate are sampled at regular times, holding the
+    last count of a replicate that finished early, so that replicates with
+    different or adaptive time steps can be compared.  The bands are the
+    confidence interval of the mean from Student's t-distribution, and are nan
+    for a single replicate.
+
+    Args:
+        runs (pd.DataFrame): model output of each replicate, as returned by ``Ensemble.replicates``
+        interval (float): time between samples in seconds
+        confidence (float): confidence level of the bands
+
+    Returns:
+        table indexed by time in seconds, with the mean and the lower and
+        upper bound of the number evacuated and stranded
+    """
+    times = np.arange(0, runs.time.max() + interval, interval)
+    curves = {"evacuated": [], "stranded": []}
+    for _, run in runs.groupby(level="replicate"):
+        # the last count at or before each time
+        i = np.searchsorted(run.time.values, times, side="right") - 1
+        for name, samples in curves.items():
+            samples.append(run[name].values[i])
+
+    summary = {}
+    for name, samples in curves.items():
+        samples = np.array(samples, dtype=np.float64)
+        n = len(samples)
+        mean = samples.mean(axis=0)
+        if n > 1:
+            t = stats.t.ppf((1 + confidence) / 2, n - 1)
+            half_width = t * samples.std(axis=0, ddof=1) / np.sqrt(n)
+        else:
+            half_width = np.full(len(times), np.nan)
+        summary[name] = mean
+        summary[name + "_lower"] = mean - half_width
+        summary[name + "_upper"] = mean + half_width
+    return pd.DataFrame(summary, index=pd.Index(times, name="time"))
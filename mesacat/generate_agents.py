@@ -5,17 +5,32 @@ import os
 import osmnx as ox
 import matplotlib.pyplot as plt
 from datetime import time
-import random
-import igraph
-from scipy.spatial import cKDTree
 import numpy as np
 import pandas as pd
 
 from mesacat.schedule_utils import position_at_time
+from mesacat.network import Network
+from mesacat.cache import (
+    OSMCache,
+    graph_from_polygon,
+    features_from_polygon,
+    RESIDENTIAL_TAGS,
+    ALL_BUILDINGS_TAGS,
+    SCHOOL_TAGS,
+    SUPERMARKET_TAGS,
+    SHOP_TAGS,
+    RECREATION_TAGS,
+)
 
 
 def generate_agents(
-    domain: Polygon, n: int, in_path: str, start_time: time
+    domain: Polygon,
+    n: int,
+    in_path: str,
+    start_time: time,
+    cache: OSMCache | None = None,
+    network: Network | None = None,
+    rng: np.random.Generator | None = None,
 ) -> GeoDataFrame:
     """Generates n agents within the domain area.
 
@@ -24,13 +39,16 @@ def generate_agents(
         n (int): number of agents to be generated
         in_path (str): path to input data files
         start_time (time): time that the simulation will begin at
+        cache (OSMCache): optional on-disk cache of OSM downloads
+        network (Network): prebuilt road network of the domain area
+        rng (np.random.Generator): random number generator.  A new, unseeded
+            generator is used if None
     """
 
-    G = ox.graph_from_polygon(domain, simplify=False)
-    G = G.to_undirected()
-    iGraph = igraph.Graph.from_networkx(G)
-    nodes, _ = ox.convert.graph_to_gdfs(G)
-    nodes_tree = cKDTree(np.transpose([nodes.geometry.x, nodes.geometry.y]))
+    if rng is None:
+        rng = np.random.default_rng()
+    if network is None:
+        network = Network.from_domain(domain, cache)
 
     agent_types = get_agent_types(in_path)
     agent_types = add_walking_speed(in_path, agent_types)
@@ -58,22 +76,20 @@ def generate_agents(
         supermarkets,
         shops,
         recreation_buildings,
-    ) = get_buildings(domain)
+    ) = get_buildings(domain, cache)
 
-    agents["home"] = random_buildings(residential_buildings, k=len(agents))
-    agents["work"] = random_buildings(work_buildings, k=len(agents))
-    agents["school"] = random_buildings(schools, k=len(agents))
-    agents["supermarket"] = random_buildings(supermarkets, k=len(agents))
-    agents["shop"] = random_buildings(shops, k=len(agents))
-    agents["recreation"] = random_buildings(recreation_buildings, k=len(agents))
+    agents["home"] = random_buildings(residential_buildings, rng, k=len(agents))
+    agents["work"] = random_buildings(work_buildings, rng, k=len(agents))
+    agents["school"] = random_buildings(schools, rng, k=len(agents))
+    agents["supermarket"] = random_buildings(supermarkets, rng, k=len(agents))
+    agents["shop"] = random_buildings(shops, rng, k=len(agents))
+    agents["recreation"] = random_buildings(recreation_buildings, rng, k=len(agents))
 
     agents[["geometry", "destination", "in_car"]] = agents.apply(
         lambda row: position_at_time(
             row["agent_type"],
             start_time,
-            iGraph,
-            nodes,
-            nodes_tree,
+            network,
             row["walking_speed"],
             row["home"],
             row["work"],
@@ -81,10 +97,14 @@ def generate_agents(
             row["supermarket"],
             row["shop"],
             row["recreation"],
+            rng,
         ),
         axis=1,
     ).apply(pd.Series)
 
+    # keep the shortest-path trees for the next run on the same network
+    network.routes.save()
+
     locations = ["home", "work", "school", "supermarket", "shop", "recreation"]
 
     for location in locations:
@@ -127,6 +147,7 @@ def add_walking_speed(in_path: str, census_df: GeoDataFrame) -> GeoDataFrame:
 
 def get_buildings(
     domain: Polygon,
+    cache: OSMCache | None = None,
 ) -> tuple[
     GeoDataFrame, GeoDataFrame, GeoDataFrame, GeoDataFrame, GeoDataFrame, GeoDataFrame
 ]:
@@ -135,50 +156,25 @@ def get_buildings(
 
     Args:
         domain (Polygon): area of interest
+        cache (OSMCache): optional on-disk cache of OSM downloads
     """
     residential_buildings = polygon(
-        ox.features_from_polygon(
-            domain,
-            tags={
-                "building": [
-                    "apartments",
-                    "bungalow",
-                    "detached",
-                    "dormitory",
-                    "hotel",
-                    "house",
-                    "residential",
-                    "semidetached_house",
-                    "terrace",
-                ]
-            },
-        )
+        features_from_polygon(domain, RESIDENTIAL_TAGS, cache)
     )
 
-    all_buildings = polygon(ox.features_from_polygon(domain, tags={"building": True}))
+    all_buildings = polygon(features_from_polygon(domain, ALL_BUILDINGS_TAGS, cache))
     non_residential_buildings = all_buildings.overlay(
         residential_buildings, how="difference"
     )
 
-    schools = polygon(
-        ox.features_from_polygon(
-            domain, tags={"amenity": ["college", "kindergarten", "school"]}
-        )
-    )
+    schools = polygon(features_from_polygon(domain, SCHOOL_TAGS, cache))
 
-    supermarkets = polygon(
-        ox.features_from_polygon(
-            domain, tags={"building": "supermarket", "shop": ["convenience"]}
-        )
-    )
+    supermarkets = polygon(features_from_polygon(domain, SUPERMARKET_TAGS, cache))
 
-    shops = polygon(ox.features_from_polygon(domain, tags={"building": "retail"}))
+    shops = polygon(features_from_polygon(domain, SHOP_TAGS, cache))
 
     recreation_buildings = polygon(
-        ox.features_from_polygon(
-            domain,
-            tags={"leisure": True, "amenity": ["bar", "cafe", "pub", "restaurant"]},
-        )
+        features_from_polygon(domain, RECREATION_TAGS, cache)
     )
 
     return (
@@ -201,23 +197,26 @@ def polygon(gdf: GeoDataFrame) -> GeoDataFrame:
     return gdf[gdf.geometry.geom_type == "Polygon"].reset_index()
 
 
-def random_buildings(gdf: GeoDataFrame, k=1) -> GeoSeries:
+def random_buildings(gdf: GeoDataFrame, rng: np.random.Generator, k=1) -> GeoSeries:
     """
     Return a random building from a GeoDataFrame
 
     Args:
         gdf (GeoDataFrame): input data frame
+        rng (np.random.Generator): random number generator
     """
 
-    return random.choices(
-        [building[1] for building in gdf.iterrows()],
-        weights=[building[1].geometry.area for building in gdf.iterrows()],
-        k=k,
-    )
+    buildings = [building[1] for building in gdf.iterrows()]
+    area = np.array([geometry.area for geometry in gdf.geometry])
+    return [buildings[i] for i in rng.choice(len(buildings), k, p=area / area.sum())]
 
 
 def plot_agents(
-    domain: Polygon, agents: GeoDataFrame, start_time: time, out_path: str
+    domain: Polygon,
+    agents: GeoDataFrame,
+    start_time: time,
+    out_path: str,
+    cache: OSMCache | None = None,
 ) -> None:
     """
     Plot agents using matplotlib
@@ -237,9 +236,9 @@ def plot_agents(
         supermarkets,
         shops,
         recreation_buildings,
-    ) = get_buildings(domain)
+    ) = get_buildings(domain, cache)
 
-    graph = ox.graph_from_polygon(domain, simplify=False)
+    graph = graph_from_polygon(domain, cache)
     graph = graph.to_undirected()
 
     _, ax = ox.plot_graph(graph, show=False, node_size=0)
@@ -1,18 +1,26 @@
-import copy
+from __future__ import annotations
+from functools import cached_property
+from typing import Callable
+import networkx as nx
 from mesa import Model
 from mesa.space import NetworkGrid
-from mesa.time import RandomActivation
-from mesa.datacollection import DataCollector
-import osmnx
-from shapely.geometry import Polygon, Point
+import shapely
+from shapely.geometry import Polygon
 from geopandas import GeoDataFrame, GeoSeries, sjoin
-from scipy.spatial import cKDTree
 import numpy as np
 from datetime import time
 from mesacat.generate_agents import generate_agents
-import igraph
+from mesacat.cache import OSMCache
+from mesacat.network import Network, NetworkOverlay, project
+from mesacat.core import TARGET, AGENT_START
+from mesacat.routing import ExitField, Route
+from mesacat.occupancy import EdgeOccupancy
+from mesacat.scheduler import ActiveSetActivation
+from mesacat.timestep import AdaptiveTimeStep
+from mesacat.collector import ColumnarDataCollector
+from mesacat.summary import Summary
+from mesacat import bundle, checkpoint, parallel
 import pandas as pd
-from networkx import write_gml
 from . import agent as evacuation_agent
 
 
@@ -23,6 +31,24 @@ class EvacuationModel(Model):
         domain: Bounding polygon used
         agents: Spatial table of agent starting locations
         evacuation_zone: Spatial table of bomb exclusion zones
+        cache: Optional on-disk cache of OSM downloads
+        network: Prebuilt road network of the domain area, which any number of
+            models can share.  The model adds its targets and agent start
+            positions to an overlay of it.  If a ``NetworkOverlay`` with the
+            targets of the same evacuation zone is given, the model adds its
+            agents to a copy of it
+        reroute_interval: If given, every this many steps the routes are
+            updated for the current congestion and agents that were held up by
+            others are rerouted
+        congestion_penalty: Extra cost in metres of each agent on a road when
+            rerouting
+        processes: If greater than one, the agents' initial routes are computed
+            in this many worker processes
+        time_step: Length of a step in seconds
+        adaptive_time_step: If given, chooses the length of each step after
+            the first from how congested the roads are
+        seed: Seed of the model's random number generators.  Models built
+            with the same seed and inputs behave identically
     """
 
     def __init__(
@@ -33,80 +59,485 @@ class EvacuationModel(Model):
         population_data_path: str,
         start_time: time,
         n_agents: int,
+        cache: OSMCache | None = None,
+        network: Network | None = None,
+        reroute_interval: int | None = None,
+        congestion_penalty: float = 50,
+        processes: int | None = None,
+        time_step: float = 10,
+        adaptive_time_step: AdaptiveTimeStep | None = None,
+        seed: int | None = None,
     ):
         super().__init__()
-
-        self.seconds_elapsed: int = 0
+        if seed is not None:
+            self.reset_randomizer(seed)
+        # all randomness in agent generation and behaviour is drawn from here,
+        # never from the global random state
+        self.rng = np.random.default_rng(seed)
+
+        self.seconds_elapsed: float = 0
+        self.time_step = time_step
+        self.adaptive_time_step = adaptive_time_step
         self.output_path = output_path
+        self.reroute_interval = reroute_interval
+        self.congestion_penalty = congestion_penalty
 
-        self.schedule = RandomActivation(self)
+        self.schedule = ActiveSetActivation(self)
 
+        self.domain = domain
         self.evacuation_zone = evacuation_zone
 
         # generate road network graph within domain area
-        self.G = osmnx.graph_from_polygon(domain, simplify=False)
-        self.G = self.G.to_undirected()
-        self.nodes, self.edges = osmnx.convert.graph_to_gdfs(self.G)
-
-        agents = generate_agents(domain, n_agents, population_data_path, start_time)
+        if network is None:
+            network = Network.from_domain(domain, cache)
+        self.use_network(network)
+
+        agents = generate_agents(
+            domain,
+            n_agents,
+            population_data_path,
+            start_time,
+            cache,
+            self.network.base,
+            self.rng,
+        )
 
         agents_in_evacuation_zone = self.get_agents_in_evacuation_zone(agents)
 
-        self.targets = self.get_targets()
+        self.add_targets()
+        self.add_agent_positions_to_graph(agents_in_evacuation_zone)
+        self.build_core()
+        self.exit_field = ExitField(self.core, self.target_idx)
 
-        self.add_targets_to_graph()
+        if output_path is not None:
+            self.write_output_files(output_path, agents_in_evacuation_zone)
 
-        self.add_agent_positions_to_graph(agents_in_evacuation_zone)
+        self.create_agents(agents_in_evacuation_zone, processes)
 
-        self.nodes, self.edges = osmnx.convert.graph_to_gdfs(self.G)
+        self.data_collector = self.new_data_collector()
 
-        self.target_nodes = self.nodes[
-            self.nodes.index.str.contains("target", na=False)
-        ]
+    @classmethod
+    def from_checkpoint(
+        cls,
+        file: str,
+        network: Network | NetworkOverlay | None = None,
+        cache: OSMCache | None = None,
+        output_path: str | None = None,
+        seed: int | None = None,
+        **settings,
+    ) -> EvacuationModel:
+        """
+        Resume a model from a checkpoint written by ``save_checkpoint``
+
+        The agents carry on along their saved routes with the saved random
+        number streams, so a restored model behaves exactly as the model did
+        after it was saved.  Several models can be restored from one
+        checkpoint to branch what-if scenarios from a shared state.  Nothing
+        is downloaded and no routes are computed, but the targets are added to
+        the road network again unless it is an overlay that already has them.
+        The output files written when the model was built are not written
+        again, but ``run`` writes the model and agent output, including the
+        steps before the checkpoint, to ``output_path``.
+
+        Args:
+            file (str): path of the checkpoint
+            network: The road network the model was built on, or an overlay
+                of it with the targets of the same evacuation zone, as for
+                ``EvacuationModel``.  If None, it is built from the cache
+            cache: Optional on-disk cache of OSM downloads
+            output_path: path to write the output files to, if any
+            seed: If given, the random number generators are seeded again,
+                so that branches from the same checkpoint differ
+            settings: ``reroute_interval``, ``congestion_penalty``,
+                ``time_step`` or ``adaptive_time_step``, to change them from
+                their saved values
+
+        Returns:
+            the model, of the class that was saved, which must be this class or a subclass of it
+        """
+        unknown = set(settings) - {
+            "reroute_interval",
+            "congestion_penalty",
+            "time_step",
+            "adaptive_time_step",
+        }
+        if unknown:
+            raise TypeError(
+                "from_checkpoint() got unexpected keyword arguments {0}".format(
+                    ", ".join(sorted(unknown))
+                )
+            )
+        meta, arrays = checkpoint.read(file)
+        model_class = checkpoint.find_class(meta["model_class"])
+        if not issubclass(model_class, cls):
+            raise ValueError(
+                "{0} is a checkpoint of a {1}, not a {2}".format(
+                    file, model_class.__name__, cls.__name__
+                )
+            )
 
-        agent_nodes = self.nodes[
-            self.nodes.index.str.contains("agent-start-pos", na=False)
-        ]
-        self.G_without_agent_start_pos = copy.deepcopy(self.G)
-        for osmid, _ in agent_nodes.iterrows():
-            self.G_without_agent_start_pos.remove_node(osmid)
+        model = model_class.__new__(model_class)
+        Model.__init__(model)
+        # the agents draw a response time when they are created, which is
+        # replaced by the saved one, so the saved generators are set last
+        model.rng = np.random.default_rng()
+        model.seconds_elapsed = meta["seconds_elapsed"]
+        model.time_step = meta["time_step"]
+        adaptive = meta["adaptive_time_step"]
+        model.adaptive_time_step = (
+            None if adaptive is None else AdaptiveTimeStep(**adaptive)
+        )
+        model.output_path = output_path
+        model.reroute_interval = meta["reroute_interval"]
+        model.congestion_penalty = meta["congestion_penalty"]
+        for name, value in settings.items():
+            setattr(model, name, value)
+
+        model.schedule = ActiveSetActivation(model)
+        model.schedule.steps, model.schedule.time = meta["steps"], meta["time"]
+        model._steps, model._time = meta["model_steps"], meta["model_time"]
+
+        model.domain = shapely.from_wkb(meta["domain"])
+        model.evacuation_zone = GeoDataFrame(
+            geometry=GeoSeries.from_wkb(meta["evacuation_zone"]),
+            crs=meta["crs"],
+        )
+        if network is None:
+            network = Network.from_domain(model.domain, cache)
+        model.use_network(network)
+        model.add_targets()
+        # join the start positions to the same road nodes, with the same lengths
+        ids = list(arrays["start_ids"])
+        roads = model.network.base.core.node_ids[arrays["start_road"]]
+        model.network.add_nodes(
+            ids,
+            arrays["start_x"],
+            arrays["start_y"],
+            street_count=1,
+            kind=AGENT_START,
+        )
+        model.network.add_edges(
+            list(zip(ids, roads)), arrays["start_length"], [{} for _ in ids]
+        )
+        model.build_core()
+        if checkpoint.signature(model.core) != meta["network"]:
+            raise ValueError("{0} was saved on a different road network".format(file))
+        model.exit_field = ExitField.from_arrays(
+            model.core,
+            model.target_idx,
+            arrays["exit_cost"],
+            arrays["exit_distance"],
+            arrays["exit_next_hop"],
+            arrays["exit_exit"],
+        )
 
-        self.grid = NetworkGrid(self.G)
-        self.igraph = igraph.Graph.from_networkx(self.G)
+        model.data_collector = model.new_data_collector()
+        for name, values in model.data_collector.model_vars.items():
+            values.extend(arrays["model_" + name].tolist())
+        model.set_agent_state(arrays)
+        model.data_collector.set_state(model.agent_ids(), model.core.node_ids, arrays)
+        model.summary.set_state(arrays)
+
+        model._seed = meta["seed"]
+        model.rng = checkpoint.generator(meta["rng"])
+        checkpoint.set_random_state(model.random, meta["random"])
+        if seed is not None:
+            model.reset_randomizer(seed)
+            model.rng = np.random.default_rng(seed)
+        return model
+
+    def save_checkpoint(self, file: str, compress: bool = False) -> None:
+        """
+        Save the full state of the self to a file, from which ``from_checkpoint`` resumes it
+
+        The checkpoint holds the state of every agent and of the scheduler,
+        the random number generators, the data collected so far, the exit
+        field and the start positions that the self added to the road
+        network.  The road network itself is not saved.  An adaptive time
+        step is saved if it is an ``AdaptiveTimeStep``, and any other
+        controller must be passed to ``from_checkpoint`` again.
+
+        Args:
+            file (str): path of the ``.npz`` file to write
+            compress (bool): whether to compress the arrays, which makes the
+                file smaller but slower to write and read
+        """
+        network = self.network
+        added = network.added_nodes
+        starts = added[added["kind"] == AGENT_START]
+        # the road node and length of the edge joining each start position to the network
+        joined = {u: (v, a["length"]) for (u, v, _), a in network.added_attrs.items()}
+        roads, lengths = zip(*[joined[id] for id in starts.index])
+        adaptive = self.adaptive_time_step
+        meta = {
+            "model_class": checkpoint.class_name(type(self)),
+            "network": checkpoint.signature(self.core),
+            "domain": shapely.to_wkb(self.domain, hex=True),
+            "evacuation_zone": list(self.evacuation_zone.geometry.to_wkb(hex=True)),
+            "crs": (
+                None
+                if self.evacuation_zone.crs is None
+                else self.evacuation_zone.crs.to_string()
+            ),
+            "seconds_elapsed": self.seconds_elapsed,
+            "time_step": self.time_step,
+            "adaptive_time_step": (
+                vars(adaptive) if isinstance(adaptive, AdaptiveTimeStep) else None
+            ),
+            "reroute_interval": self.reroute_interval,
+            "congestion_penalty": self.congestion_penalty,
+            "steps": self.schedule.steps,
+            "time": self.schedule.time,
+            "model_steps": self._steps,
+            "model_time": self._time,
+            "seed": self._seed,
+            "rng": self.rng.bit_generator.state,
+            "random": self.random.getstate(),
+        }
+        arrays = {
+            "start_ids": starts.index.values.astype(str),
+            "start_x": starts.x.values,
+            "start_y": starts.y.values,
+            "start_road": np.array(
+                [network.base.node_index[road] for road in roads], dtype=np.int64
+            ),
+            "start_length": np.array(lengths),
+            "exit_cost": self.exit_field.cost,
+            "exit_distance": self.exit_field.distance,
+            "exit_next_hop": self.exit_field.next_hop,
+            "exit_exit": self.exit_field.exit,
+        }
+        for name, values in self.data_collector.model_vars.items():
+            arrays["model_" + name] = np.array(values)
+        arrays.update(self.get_agent_state())
+        arrays.update(self.data_collector.get_state())
+        arrays.update(self.summary.get_state())
+        checkpoint.write(file, meta, arrays, compress)
+
+    def use_network(self, network: Network | NetworkOverlay) -> None:
+        """
+        Start an overlay of the road network for the model's targets and agents, leaving the network unchanged
+        """
+        if isinstance(network, NetworkOverlay):
+            if (network.added_nodes["kind"] == AGENT_START).any():
+                raise ValueError(
+                    "The network overlay already contains the agents of another "
+                    "model.  Pass its base network or an overlay with only targets"
+                )
+            self.network = network.copy()
+        else:
+            self.network = NetworkOverlay(network)
+
+    def add_targets(self) -> None:
+        """
+        Add the targets on the boundary of the evacuation zone to the network, unless it already has them
+        """
+        # the targets only depend on the evacuation zone, so they may already
+        # have been added to the overlay for other models of the same scenario
+        zone = self.evacuation_zone.iloc[0].geometry
+        if self.network.target_zone is None:
+            self.network.add_targets(zone)
+        elif not self.network.target_zone.equals(zone):
+            raise ValueError(
+                "The network overlay already contains the targets of a different "
+                "evacuation zone"
+            )
+        self.targets = self.network.targets
 
-        if output_path is not None:
-            self.write_output_files(output_path, agents_in_evacuation_zone)
+    def build_core(self) -> None:
+        """
+        Build the core of the network once the targets and start positions have been added, and the grid and summary on it
+        """
+        self.core = self.network.to_core()
+        self.target_idx = self.core.nodes_of_kind(TARGET)
+        added = self.network.added_nodes
+        self.target_nodes = added[added["kind"] == TARGET]
+        self.grid = NetworkGrid(nx.empty_graph(self.core.n_nodes))
+        self.summary = Summary(self.core, self.target_idx)
+
+    def new_data_collector(self) -> ColumnarDataCollector:
+        """
+        Returns an empty data collector for the model output, which writes the agent output to ``<output_path>.trajectory`` if there is an output path
+        """
+        return ColumnarDataCollector(
+            model_reporters={
+                "time": elapsed,
+                "evacuated": evacuated,
+                "stranded": stranded,
+                "evacuation_time_p50": evacuation_time_p50,
+                "evacuation_time_p90": evacuation_time_p90,
+            },
+            directory=(
+                None if self.output_path is None else self.output_path + ".trajectory"
+            ),
+        )
+
+    def agent_ids(self) -> np.ndarray:
+        """
+        Returns the unique ID of each agent, in the order of ``agent_output``
+        """
+        return np.array([a.unique_id for a in self.schedule.agents], dtype=np.int64)
+
+    def agent_output(self) -> dict[str, list]:
+        """
+        Returns the value of each variable of the agent output for every agent, as collected by the data collector
+        """
+        agents = self.schedule.agents
+        return {
+            "position": [a.pos for a in agents],
+            "lat": [a.lat for a in agents],
+            "lon": [a.lon for a in agents],
+            "highway": [-1 if a.highway is None else a.highway for a in agents],
+            "reroute_count": [a.reroute_count for a in agents],
+            "status": [a.evacuated for a in agents],
+            "in_car": [a.in_car for a in agents],
+        }
+
+    @property
+    def G(self) -> nx.MultiGraph:
+        """
+        The road network with the model's targets and agent start positions, built on first use
+        """
+        return self.network.G
+
+    @property
+    def igraph(self):
+        return self.network.igraph
+
+    @property
+    def nodes(self) -> GeoDataFrame:
+        return self.network.nodes
+
+    @property
+    def edges(self) -> GeoDataFrame:
+        return self.network.edges
+
+    @cached_property
+    def G_without_agent_start_pos(self) -> nx.MultiGraph:
+        """
+        Read-only view of the road network without the agents' starting positions, built on first use
+        """
+        agent_start_pos = set(self.core.node_ids[self.core.kind == AGENT_START])
+        return nx.subgraph_view(
+            self.G, filter_node=lambda node: node not in agent_start_pos
+        )
 
+    def create_agents(
+        self, agents_in_evacuation_zone: GeoDataFrame, processes: int | None
+    ) -> None:
+        """
+        Create an agent at each starting position and give it its initial route
+        """
+        start_idx = self.core.nodes_of_kind(AGENT_START)
         for i, agent in agents_in_evacuation_zone.iterrows():
-            id = "agent-start-pos{0}".format(i)
             a = evacuation_agent.EvacuationAgent(i, self, agent)
             self.schedule.add(a)
-            self.grid.place_agent(a, id)
-            a.update_route()
+            self.grid.place_agent(a, start_idx[i])
+
+        agents = list(self.schedule.agents)
+        routes = self.initial_routes([a.pos for a in agents], processes)
+        for a, route in zip(agents, routes):
+            a.set_route(route)
+        self.edge_occupancy = EdgeOccupancy()
+        for a in agents:
             a.update_location()
+            if not a.stranded:
+                self.edge_occupancy.add(a.unique_id, a.edge())
 
-        self.data_collector = DataCollector(
-            model_reporters={"evacuated": evacuated, "stranded": stranded},
-            agent_reporters={
-                "position": "pos",
-                "lat": "lat",
-                "lon": "lon",
-                "highway": "highway",
-                "reroute_count": "reroute_count",
-                "status": status,
-                "in_car": "in_car",
-            },
-        )
+    def initial_routes(
+        self, sources: list[int], processes: int | None
+    ) -> list[np.ndarray]:
+        """
+        Returns the route from each source node to its nearest target
 
-    def calculate_distance(self, point1: Point, point2: Point):
-        df = GeoDataFrame({"geometry": [point1, point2]}, crs="EPSG:4326")
-        df = df.geometry.to_crs("EPSG:27700")
-        return osmnx.distance.euclidean(
-            df.geometry.iloc[0].y,
-            df.geometry.iloc[0].x,
-            df.geometry.iloc[1].y,
-            df.geometry.iloc[1].x,
-        )
+        Args:
+            sources (list[int]): indices of the source nodes
+            processes (int): if greater than one, the routes are computed in
+                this many worker processes
+        """
+        if processes is not None and processes > 1:
+            return parallel.routes(self.exit_field.next_hop, sources, processes)
+        return [self.exit_field.route(source) for source in sources]
+
+    def get_agent_state(self) -> dict[str, np.ndarray]:
+        """
+        Returns the state of the agents and the scheduler, as arrays
+        """
+        agents = self.schedule.agents
+        state = {
+            "unique_id": np.array([a.unique_id for a in agents], dtype=np.int64),
+            "agent_type": np.array([a.agent_type for a in agents]),
+            "in_car": np.array([a.in_car for a in agents], dtype=bool),
+            "speed": np.array([a.speed for a in agents], dtype=np.float64),
+            "delay": np.array([a.delay for a in agents], dtype=np.float64),
+            "route_nodes": np.concatenate([a.route.nodes for a in agents]),
+            "route_length": np.array([len(a.route) for a in agents], dtype=np.int64),
+            "route_index": np.array([a.route_index for a in agents], dtype=np.int64),
+            "distance_along_edge": np.array(
+                [a.distance_along_edge for a in agents], dtype=np.float64
+            ),
+            "lat": np.array([a.lat for a in agents], dtype=np.float64),
+            "lon": np.array([a.lon for a in agents], dtype=np.float64),
+            "evacuated": np.array([a.evacuated for a in agents], dtype=bool),
+            "stranded": np.array([a.stranded for a in agents], dtype=bool),
+            "blocked": np.array([a.blocked for a in agents], dtype=bool),
+            "highway": np.array(
+                [-1 if a.highway is None else a.highway for a in agents],
+                dtype=np.int64,
+            ),
+            "reroute_count": np.array(
+                [a.reroute_count for a in agents], dtype=np.int64
+            ),
+            # the order of the active agents and of the heap of waiting agents
+            "active": np.array(
+                [a.unique_id for a in self.schedule.active], dtype=np.int64
+            ),
+            "waiting": np.array([w[1] for w in self.schedule.waiting], dtype=np.int64),
+        }
+
+        return state
+
+    def set_agent_state(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Recreate the agents and the scheduler from the arrays of ``get_agent_state``
+        """
+        routes = np.split(state["route_nodes"], np.cumsum(state["route_length"])[:-1])
+        agents = {}
+        for i, unique_id in enumerate(state["unique_id"].tolist()):
+            a = evacuation_agent.EvacuationAgent(
+                unique_id,
+                self,
+                {
+                    "agent_type": state["agent_type"][i].item(),
+                    "in_car": bool(state["in_car"][i]),
+                    "walking_speed": float(state["speed"][i]),
+                },
+            )
+            a.delay = float(state["delay"][i])
+            a.route = Route(self.core, routes[i])
+            a.route_index = int(state["route_index"][i])
+            a.distance_along_edge = float(state["distance_along_edge"][i])
+            a.lat = float(state["lat"][i])
+            a.lon = float(state["lon"][i])
+            a.evacuated = bool(state["evacuated"][i])
+            a.stranded = bool(state["stranded"][i])
+            a.blocked = bool(state["blocked"][i])
+            highway = int(state["highway"][i])
+            a.highway = None if highway < 0 else highway
+            a.reroute_count = int(state["reroute_count"][i])
+            self.schedule.add(a)
+            self.grid.place_agent(a, int(a.route[a.route_index]))
+            agents[unique_id] = a
+
+        self.schedule.active = [agents[id] for id in state["active"].tolist()]
+        self.schedule.waiting = [
+            (agents[id].departure_time, id, agents[id])
+            for id in state["waiting"].tolist()
+        ]
+        self.edge_occupancy = EdgeOccupancy()
+        for a in agents.values():
+            if not (a.evacuated or a.stranded):
+                self.edge_occupancy.add(a.unique_id, a.edge(), a.distance_along_edge)
 
     def get_agents_in_evacuation_zone(self, agents: GeoDataFrame) -> GeoDataFrame:
         """
@@ -126,53 +557,12 @@ class EvacuationModel(Model):
 
         return agents_in_evacuation_zone
 
-    def get_targets(self) -> GeoDataFrame:
-        """
-        Returns a GeoDataFrame containing points on the road network at the edge of the evacuation zone
-        """
-        targets = self.edges.unary_union.intersection(
-            self.evacuation_zone.iloc[0].geometry.boundary
-        )
-        s = GeoSeries(targets).explode(index_parts=True)
-        return GeoDataFrame(geometry=s)
-
-    def add_targets_to_graph(self) -> None:
+    def add_agent_positions_to_graph(self, agents_in_evacuation_zone: GeoDataFrame):
         """
-        Add each target as a node in the graph
+        Add each agent's starting position as a node in the graph, connected to the nearest road node
         """
-        for index, row in self.targets.iterrows():
-            # find the road that the target is on
-            [start_node, end_node, _] = osmnx.distance.nearest_edges(
-                self.G, row.geometry.x, row.geometry.y
-            )
-            # find the distance from the target to each end of the road
-            d_start = self.calculate_distance(
-                Point(self.G.nodes[start_node]["x"], self.G.nodes[start_node]["y"]),
-                Point(row.geometry.x, row.geometry.y),
-            )
-            d_end = self.calculate_distance(
-                Point(self.G.nodes[end_node]["x"], self.G.nodes[end_node]["y"]),
-                Point(row.geometry.x, row.geometry.y),
-            )
-
-            id = "target{0}".format(index[1])
-            edge_attrs = self.G[start_node][end_node]
-
-            # remove the old road
-            self.G.remove_edge(start_node, end_node)
-            # add target node
-            self.G.add_node(id, x=row.geometry.x, y=row.geometry.y, street_count=2)
-            # add two new roads connecting the target to each end of the old road
-            self.G.add_edge(start_node, id, **{**edge_attrs, "length": d_start})
-            self.G.add_edge(id, end_node, **{**edge_attrs, "length": d_end})
-
-    def add_agent_positions_to_graph(self, agents_in_evacuation_zone: GeoDataFrame):
-        nodes_tree = cKDTree(
-            np.transpose([self.nodes.geometry.x, self.nodes.geometry.y])
-        )
-
         # find the nearest node to each agent
-        _, node_idx = nodes_tree.query(
+        _, node_idx = self.network.nodes_tree.query(
             np.transpose(
                 [
                     agents_in_evacuation_zone.geometry.x,
@@ -181,61 +571,180 @@ class EvacuationModel(Model):
             )
         )
 
-        for i, agent in agents_in_evacuation_zone.iterrows():
-            nearest_node = self.nodes.iloc[node_idx[i]]
-
-            id = "agent-start-pos{0}".format(i)
-
-            d = self.calculate_distance(
-                Point(nearest_node["x"], nearest_node["y"]),
-                Point(agent.geometry.x, agent.geometry.y),
-            )
-
-            self.G.add_node(id, x=agent.geometry.x, y=agent.geometry.y, street_count=1)
-            self.G.add_edge(id, self.nodes.index[node_idx[i]], **{"length": d})
+        agent_coords = project(
+            agents_in_evacuation_zone.geometry.x.values,
+            agents_in_evacuation_zone.geometry.y.values,
+        )
+        nodes = self.network.base.nodes
+        node_coords = project(nodes.x.values[node_idx], nodes.y.values[node_idx])
+        lengths = np.linalg.norm(agent_coords - node_coords, axis=1)
+
+        ids = ["agent-start-pos{0}".format(i) for i in agents_in_evacuation_zone.index]
+        edges = list(zip(ids, nodes.index[node_idx]))
+
+        self.network.add_nodes(
+            ids,
+            agents_in_evacuation_zone.geometry.x.values,
+            agents_in_evacuation_zone.geometry.y.values,
+            street_count=1,
+            kind=AGENT_START,
+        )
+        self.network.add_edges(edges, lengths, [{} for _ in edges])
 
     def write_output_files(
         self, output_path: str, agents_in_evacuation_zone: GeoDataFrame
     ) -> None:
-        output_gml = output_path + ".gml"
-        write_gml(self.G, path=output_gml)
-
-        output_gpkg = output_path + ".gpkg"
-        self.evacuation_zone.to_file(output_gpkg, layer="hazard", driver="GPKG")
-        agents_in_evacuation_zone[
-            ["agent_type", "walking_speed", "geometry", "home"]
-        ].to_file(output_gpkg, layer="agents", driver="GPKG")
-        self.target_nodes.to_file(output_gpkg, layer="targets", driver="GPKG")
-        self.nodes[["geometry"]].to_file(output_gpkg, layer="nodes", driver="GPKG")
-        self.edges[["geometry"]].to_file(output_gpkg, layer="edges", driver="GPKG")
+        """
+        Write the road network, the evacuation zone, the targets and the agents' start positions to one bundle file
+        """
+        bundle.write_layers(
+            output_path + ".bundle",
+            {
+                "nodes": self.nodes,
+                "edges": self.edges,
+                "hazard": self.evacuation_zone,
+                "targets": self.target_nodes,
+                "agents": agents_in_evacuation_zone[
+                    ["agent_type", "walking_speed", "in_car", "geometry"]
+                ],
+            },
+        )
 
-    def step(self):
+    def occupancy(self) -> np.ndarray:
+        """
+        Returns the number of agents on each arc of the core, counting both directions of each road
+        """
+        occupancy = self.edge_occupancy.counts(len(self.core.length))
+        return occupancy + occupancy[self.core.reverse]
+
+    def reroute(self) -> None:
+        """
+        Update the exit field for the current congestion and reroute the agents that were held up by others
+        """
+        self.exit_field.update(
+            self.core.length + self.congestion_penalty * self.occupancy()
+        )
+        for a in self.schedule.active:
+            if a.blocked and not (a.evacuated or a.stranded):
+                a.reroute()
+
+    def agent_count(self) -> int:
+        """
+        Returns the number of agents in the model
+        """
+        return self.schedule.get_agent_count()
+
+    def interactions(self) -> tuple[int, int]:
+        """
+        Returns the number of agents that were held up by another agent in the last step and the number that were moving
+        """
+        active = self.schedule.active
+        return sum(1 for a in active if a.blocked), len(active)
+
+    def progress(self) -> tuple:
+        """
+        Returns a value that changes whenever any agent moves
+        """
+        active = self.schedule.active
+        return (
+            self.agent_count() - len(active),
+            sum(a.route_index for a in active),
+            sum(a.distance_along_edge for a in active),
+        )
+
+    def waiting(self) -> int:
+        """
+        Returns the number of agents that have not set off yet
+        """
+        return sum(1 for _, _, a in self.schedule.waiting if not a.stranded)
+
+    def finished(self) -> bool:
+        """
+        Returns whether every agent has evacuated or is stranded
+        """
+        return not self.schedule.active and self.waiting() == 0
+
+    def advance(self) -> None:
+        """
+        Move the agents on by one time step
+        """
         self.schedule.step()
-        self.data_collector.collect(self)
-        self.seconds_elapsed += 10
 
-    def run(self, steps: int):
+    def step(self):
+        self.advance()
+        self.seconds_elapsed += self.time_step
+        if self.reroute_interval and self.schedule.steps % self.reroute_interval == 0:
+            self.reroute()
         self.data_collector.collect(self)
-        for i in range(steps):
-            print("Step {0}".format(i))
+        if self.adaptive_time_step is not None:
+            self.time_step = self.adaptive_time_step(self)
+
+    def run(
+        self,
+        steps: int | None = None,
+        until: Callable[[EvacuationModel], bool] | None = None,
+        verbose: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Run the model until every agent has evacuated or is stranded, and write the output files
+
+        The agent and model output are written as CSV and the counts of
+        ``summary`` as JSON, so the headline numbers of a run can be read
+        without loading the agent output.  The agent output is also kept as
+        a trajectory, which ``Trajectory`` reads one step at a time.
+
+        Args:
+            steps (int): maximum number of steps.  There is no limit if None
+            until (Callable): condition checked after each step, such as
+                ``EvacuatedFraction`` or ``NoMovement``.  The run stops early
+                when it returns True
+            verbose (bool): print each step
+
+        Returns:
+            the model output at each step.  The agent output is held by the
+            data collector, which reads it from disk as needed
+        """
+        # a resumed run carries on from the last record rather than repeating it
+        if not self.data_collector.model_vars["time"]:
+            self.data_collector.collect(self)
+        i = 0
+        while steps is None or i < steps:
+            if verbose:
+                print("Step {0}".format(i))
             self.step()
+            i += 1
+            if self.finished() or (until is not None and until(self)):
+                break
+
+        if self.output_path is not None:
+            self.data_collector.save()
+            self.data_collector.to_csv(self.output_path + ".agent.csv")
+            self.data_collector.get_model_vars_dataframe().to_csv(
+                self.output_path + ".model.csv"
+            )
+            self.summary.write(
+                self.output_path + ".summary.json",
+                time=self.seconds_elapsed,
+                agents=self.agent_count(),
+            )
+        return self.data_collector.get_model_vars_dataframe()
 
-        self.data_collector.get_agent_vars_dataframe().astype(
-            {"highway": pd.Int64Dtype()}
-        ).to_csv(self.output_path + ".agent.csv")
-        self.data_collector.get_model_vars_dataframe().to_csv(
-            self.output_path + ".model.csv"
-        )
-        return self.data_collector.get_agent_vars_dataframe()
+
+def elapsed(m):
+    return m.seconds_elapsed
 
 
 def evacuated(m):
-    return len([a for a in m.schedule.agents if a.evacuated])
+    return m.summary.evacuated
 
 
 def stranded(m):
-    return len([a for a in m.schedule.agents if a.stranded])
+    return m.summary.stranded
+
+
+def evacuation_time_p50(m):
+    return m.summary.quantile(0.5)
 
 
-def status(a):
-    return 1 if a.evacuated else 0
+def evacuation_time_p90(m):
+    return m.summary.quantile(0.9)
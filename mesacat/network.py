@@ -0,0 +1,434 @@
+from __future__ import annotations
+from functools import cached_property
+import networkx as nx
+import numpy as np
+import osmnx
+import pandas as pd
+from geopandas import GeoDataFrame, GeoSeries, points_from_xy
+from scipy.spatial import cKDTree
+from pyproj import Transformer
+from shapely import STRtree, linestrings, points
+from shapely.geometry import Polygon
+from mesacat.cache import OSMCache, graph_from_polygon
+from mesacat.core import NetworkCore, ROAD, TARGET, osmid
+from mesacat.routing import RoutingIndex
+
+# British National Grid, used to measure distances in metres
+to_metres = Transformer.from_crs("EPSG:4326", "EPSG:27700", always_xy=True)
+
+
+def project(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Project arrays of longitudes and latitudes to an (n, 2) array of coordinates in metres
+    """
+    return np.column_stack(to_metres.transform(np.asarray(x), np.asarray(y)))
+
+
+def concat(first: GeoDataFrame, second: GeoDataFrame) -> GeoDataFrame:
+    """
+    Returns the rows of two tables one after the other, without a copy if either is empty
+    """
+    if len(second) == 0:
+        return first
+    if len(first) == 0:
+        return second
+    return pd.concat([first, second])
+
+
+class Network:
+    """The road network within the domain area, built once and shared by agent generation and any number of models
+
+    The network is not changed after it is built.  The targets and agent
+    start positions of each scenario are added to a ``NetworkOverlay`` of it
+    instead.
+
+    Args:
+        G: undirected road network graph
+        routes_file: optional file to load and save the routing index from
+
+    Attributes:
+        G (networkx.MultiGraph): the road network
+        core (NetworkCore): compact, integer-indexed core of the road network
+        igraph (igraph.Graph): igraph view of ``G`` with the same node order,
+            holding only the attributes needed for routing
+        nodes (GeoDataFrame): node table, in the same order as ``G``, with the
+            kind (``ROAD``) of each node
+        edges (GeoDataFrame): edge table indexed by (u, v, key)
+        nodes_tree (cKDTree): spatial index of the nodes
+        routes (RoutingIndex): shortest routes between nodes
+    """
+
+    def __init__(self, G: nx.MultiGraph, routes_file: str | None = None):
+        self.G = G
+        self.nodes, self.edges = osmnx.convert.graph_to_gdfs(self.G)
+        self.nodes["kind"] = ROAD
+        self.core = NetworkCore.from_graph(self.G)
+        self.igraph = self.core.to_igraph()
+        self.routes = RoutingIndex(self.core, routes_file)
+        self.nodes_tree = cKDTree(
+            np.transpose([self.nodes.geometry.x, self.nodes.geometry.y])
+        )
+
+    @classmethod
+    def from_domain(cls, domain: Polygon, cache: OSMCache | None = None) -> "Network":
+        """
+        Download the road network within the domain area
+
+        Args:
+            domain (Polygon): area of interest
+            cache (OSMCache): optional on-disk cache of OSM downloads
+        """
+        return cls(
+            graph_from_polygon(domain, cache).to_undirected(),
+            None if cache is None else cache.routes_file(domain),
+        )
+
+    @cached_property
+    def node_index(self) -> dict:
+        """
+        Index of each node in the core, by node ID
+        """
+        return {node: i for i, node in enumerate(self.core.node_ids)}
+
+    @cached_property
+    def edge_index(self) -> dict[tuple, int]:
+        """
+        Index of each edge in the core, by (u, v, key) in either direction
+        """
+        core = self.core
+        u, v = core.node_ids[core.edge_u], core.node_ids[core.edge_v]
+        index = {}
+        for i, (a, b, key) in enumerate(zip(u, v, core.edge_key.tolist())):
+            index[(a, b, key)] = index[(b, a, key)] = i
+        return index
+
+    @cached_property
+    def edges_tree(self) -> STRtree:
+        """
+        Spatial index of the edges, in the same order as the edge table
+        """
+        return STRtree(self.edges.geometry.values)
+
+    def nearest_edges(self, x: np.ndarray, y: np.ndarray) -> list[tuple]:
+        """
+        Returns the (u, v, key) of the edge nearest to each point, as ``osmnx.distance.nearest_edges`` does
+
+        Args:
+            x (np.ndarray): longitude of each point
+            y (np.ndarray): latitude of each point
+        """
+        _, pos = self.edges_tree.query_nearest(points(x, y), all_matches=False)
+        return list(self.edges.index[pos])
+
+    def to_core(self) -> NetworkCore:
+        """
+        Returns the compact, integer-indexed core of the network
+        """
+        return self.core
+
+
+class NetworkOverlay:
+    """The changes that a scenario makes to a road network, which is left unchanged so other scenarios can share it
+
+    Targets split the roads that cross the boundary of the evacuation zone,
+    and new edges join the agents' start positions to the road network.  The
+    overlay stores only these added nodes and edges and the roads that were
+    split, so many evacuation zones can be tried against one base network
+    without copying it.  The networkx graph, the igraph view and the node and
+    edge tables of the combined network are built when they are first used.
+
+    Args:
+        base: road network
+
+    Attributes:
+        base (Network): the road network
+        added_nodes (GeoDataFrame): nodes added to the road network, with the
+            kind (``TARGET`` or ``AGENT_START``) of each node
+        added_edges (GeoDataFrame): edges added to the road network, indexed by (u, v, key)
+        removed_edges (dict): index in the road network's core of each of its
+            edges that has been removed, by (u, v, key)
+        targets (GeoDataFrame): points where the roads cross the boundary of
+            the evacuation zone, once they have been added by ``add_targets``
+        target_zone (Polygon): evacuation zone that the targets were added for
+    """
+
+    def __init__(self, base: Network):
+        self.base = base
+        self.added_nodes = GeoDataFrame(
+            {"x": [], "y": [], "street_count": [], "kind": []},
+            geometry=points_from_xy([], []),
+            index=pd.Index([], name=base.nodes.index.name, dtype=object),
+            crs=base.nodes.crs,
+        )
+        self.added_edges = GeoDataFrame(
+            {"length": []},
+            geometry=GeoSeries([], crs=base.edges.crs),
+            index=pd.MultiIndex.from_tuples([], names=base.edges.index.names),
+            crs=base.edges.crs,
+        )
+        # attributes of each added edge by (u, v, key), in the order they were added
+        self.added_attrs: dict[tuple, dict] = {}
+        # keys of the added edges between each pair of nodes
+        self.added_keys: dict[frozenset, set[int]] = {}
+        # index of each added node in the core of the combined network
+        self.added_index: dict = {}
+        self.removed_edges: dict[tuple, int] = {}
+        self.targets: GeoDataFrame | None = None
+        self.target_zone: Polygon | None = None
+
+    def copy(self) -> "NetworkOverlay":
+        """
+        Returns an independent copy of the overlay on the same road network
+        """
+        other = NetworkOverlay(self.base)
+        # the tables are replaced rather than changed in place, so can be shared
+        other.added_nodes = self.added_nodes
+        other.added_edges = self.added_edges
+        other.added_attrs = dict(self.added_attrs)
+        other.added_keys = {pair: set(keys) for pair, keys in self.added_keys.items()}
+        other.added_index = dict(self.added_index)
+        other.removed_edges = dict(self.removed_edges)
+        other.targets = self.targets
+        other.target_zone = self.target_zone
+        return other
+
+    @property
+    def nodes_tree(self) -> cKDTree:
+        """
+        Spatial index of the nodes of the road network
+        """
+        return self.base.nodes_tree
+
+    @property
+    def routes(self) -> RoutingIndex:
+        """
+        Shortest routes between nodes of the road network
+        """
+        return self.base.routes
+
+    @cached_property
+    def nodes(self) -> GeoDataFrame:
+        """
+        Node table of the combined network, in the same order as its core
+        """
+        return concat(self.base.nodes, self.added_nodes)
+
+    @cached_property
+    def edges(self) -> GeoDataFrame:
+        """
+        Edge table of the combined network, indexed by (u, v, key)
+        """
+        index = self.base.edges.index
+        removed = [e if e in index else (e[1], e[0], e[2]) for e in self.removed_edges]
+        return concat(self.base.edges.drop(removed), self.added_edges)
+
+    @cached_property
+    def G(self) -> nx.MultiGraph:
+        """
+        The combined network as a networkx graph, built from a copy of the road network
+        """
+        G = self.base.G.copy()
+        G.remove_edges_from(self.removed_edges)
+        nodes = self.added_nodes
+        G.add_nodes_from(
+            (id, {"x": x, "y": y, "street_count": street_count})
+            for id, x, y, street_count in zip(
+                nodes.index, nodes.x, nodes.y, nodes.street_count
+            )
+        )
+        G.add_edges_from((u, v, key, a) for (u, v, key), a in self.added_attrs.items())
+        return G
+
+    @cached_property
+    def igraph(self):
+        """
+        igraph view of the combined network with the same node order, holding only the attributes needed for routing
+        """
+        return self.to_core().to_igraph()
+
+    def changed(self) -> None:
+        """
+        Drop the combined graph and tables, so that they are built again when next used
+        """
+        for name in ("nodes", "edges", "G", "igraph"):
+            self.__dict__.pop(name, None)
+
+    def index(self, ids: list) -> np.ndarray:
+        """
+        Returns the index of each node in the core of the combined network
+        """
+        base, added = self.base.node_index, self.added_index
+        return np.array(
+            [base[id] if id in base else added[id] for id in ids], dtype=np.int32
+        )
+
+    def add_targets(self, evacuation_zone: Polygon) -> None:
+        """
+        Add a target node wherever a road crosses the boundary of the evacuation zone, splitting the road that it lies on
+
+        Args:
+            evacuation_zone (Polygon): area to be evacuated
+        """
+        G, nodes = self.base.G, self.base.nodes
+        s = GeoSeries(
+            self.base.edges.unary_union.intersection(evacuation_zone.boundary)
+        )
+        self.targets = GeoDataFrame(geometry=s.explode(index_parts=True))
+        self.target_zone = evacuation_zone
+
+        x = self.targets.geometry.x.values
+        y = self.targets.geometry.y.values
+        ids = ["target{0}".format(index[1]) for index in self.targets.index]
+
+        # find the road that each target is on with a single spatial index query
+        roads = self.base.nearest_edges(x, y)
+        road_nodes = [n for u, v, _ in roads for n in (u, v)]
+        road_coords = project(
+            nodes.loc[road_nodes, "x"].values,
+            nodes.loc[road_nodes, "y"].values,
+        ).reshape(-1, 2, 2)
+        target_coords = project(x, y)
+
+        # group the targets by road, ordered by distance from the start of the road
+        targets_on_road = {}
+        for i, road in enumerate(roads):
+            targets_on_road.setdefault(tuple(road), []).append(i)
+
+        edges = []
+        lengths = []
+        attrs = []
+        for (start_node, end_node, key), targets in targets_on_road.items():
+            start = road_coords[targets[0], 0]
+            end = road_coords[targets[0], 1]
+            targets = sorted(
+                targets, key=lambda t: np.linalg.norm(target_coords[t] - start)
+            )
+            # split the road into a chain start -> target -> ... -> target -> end
+            chain = [start_node] + [ids[t] for t in targets] + [end_node]
+            points = np.vstack([start, target_coords[targets], end])
+            edges += list(zip(chain[:-1], chain[1:]))
+            lengths += list(np.linalg.norm(np.diff(points, axis=0), axis=1))
+            attrs += [dict(G.edges[start_node, end_node, key])] * (len(chain) - 1)
+
+        # remove the old roads
+        self.remove_edges(list(targets_on_road.keys()))
+        # add target nodes
+        self.add_nodes(ids, x, y, street_count=2, kind=TARGET)
+        # add new roads connecting the targets to each end of the old roads
+        self.add_edges(edges, lengths, attrs)
+
+    def add_nodes(
+        self, ids: list, x: np.ndarray, y: np.ndarray, street_count: int, kind: int
+    ) -> None:
+        """
+        Add nodes to the overlay
+
+        Args:
+            ids (list): node identifiers
+            x (np.ndarray): longitude of each node
+            y (np.ndarray): latitude of each node
+            street_count (int): number of streets meeting at each node
+            kind (int): ``TARGET`` or ``AGENT_START``
+        """
+        n = self.base.core.n_nodes + len(self.added_nodes)
+        self.added_index.update((id, n + i) for i, id in enumerate(ids))
+        new_nodes = GeoDataFrame(
+            {"x": x, "y": y, "street_count": street_count, "kind": kind},
+            geometry=points_from_xy(x, y),
+            index=pd.Index(ids, name=self.added_nodes.index.name, dtype=object),
+            crs=self.added_nodes.crs,
+        )
+        self.added_nodes = concat(self.added_nodes, new_nodes)
+        self.changed()
+
+    def new_key(self, u, v) -> int:
+        """
+        Returns the key that networkx would give a new edge between two nodes of the combined network
+        """
+        keys = set(self.added_keys.get(frozenset((u, v)), ()))
+        G = self.base.G
+        if G.has_edge(u, v):
+            removed = set(self.removed_edges.values())
+            edge_index = self.base.edge_index
+            keys |= {k for k in G[u][v] if edge_index[(u, v, k)] not in removed}
+        key = len(keys)
+        while key in keys:
+            key += 1
+        return key
+
+    def add_edges(
+        self, edges: list[tuple], lengths: np.ndarray, attrs: list[dict]
+    ) -> None:
+        """
+        Add edges to the overlay
+
+        Args:
+            edges (list[tuple]): (u, v) node pairs
+            lengths (np.ndarray): length of each edge in metres
+            attrs (list[dict]): other attributes of each edge
+        """
+        attrs = [{**a, "length": float(d)} for a, d in zip(attrs, lengths)]
+        names = []
+        for (u, v), a in zip(edges, attrs):
+            key = self.new_key(u, v)
+            self.added_keys.setdefault(frozenset((u, v)), set()).add(key)
+            self.added_attrs[(u, v, key)] = a
+            names.append((u, v, key))
+
+        node_idx = self.index([n for e in edges for n in e])
+        x = np.concatenate([self.base.core.x, self.added_nodes.x.values])
+        y = np.concatenate([self.base.core.y, self.added_nodes.y.values])
+        coords = np.column_stack([x[node_idx], y[node_idx]])
+        new_edges = GeoDataFrame(
+            attrs,
+            geometry=linestrings(coords.reshape(-1, 2, 2)),
+            index=pd.MultiIndex.from_tuples(names, names=self.added_edges.index.names),
+            crs=self.added_edges.crs,
+        )
+        self.added_edges = concat(self.added_edges, new_edges)
+        self.changed()
+
+    def remove_edges(self, edges: list[tuple]) -> None:
+        """
+        Remove edges of the road network or of the overlay
+
+        Args:
+            edges (list[tuple]): (u, v, key) edges
+        """
+        added = []
+        for u, v, key in edges:
+            name = (u, v, key) if (u, v, key) in self.added_attrs else (v, u, key)
+            if name in self.added_attrs:
+                del self.added_attrs[name]
+                self.added_keys[frozenset((u, v))].discard(key)
+                added.append(name)
+            else:
+                self.removed_edges[(u, v, key)] = self.base.edge_index[(u, v, key)]
+        if added:
+            self.added_edges = self.added_edges.drop(added)
+        self.changed()
+
+    def to_core(self) -> NetworkCore:
+        """
+        Returns the compact, integer-indexed core of the combined network
+        """
+        base = self.base.core
+        keep = np.ones(len(base.edge_u), dtype=bool)
+        keep[list(self.removed_edges.values())] = False
+        nodes = self.added_nodes
+        names = list(self.added_attrs)
+        attrs = list(self.added_attrs.values())
+        edge_idx = self.index([n for u, v, _ in names for n in (u, v)]).reshape(-1, 2)
+        return NetworkCore(
+            np.concatenate([base.node_ids, nodes.index.values.astype(object)]),
+            np.concatenate([base.x, nodes.x.values]),
+            np.concatenate([base.y, nodes.y.values]),
+            np.concatenate([base.kind, nodes["kind"].values.astype(np.int8)]),
+            np.concatenate([base.edge_u[keep], edge_idx[:, 0]]),
+            np.concatenate([base.edge_v[keep], edge_idx[:, 1]]),
+            np.concatenate([base.edge_length[keep], [a["length"] for a in attrs]]),
+            np.concatenate(
+                [base.edge_osmid[keep], [osmid(a.get("osmid")) for a in attrs]]
+            ),
+            np.concatenate([base.edge_key[keep], [k for _, _, k in names]]),
+        )
@@ -0,0 +1,70 @@
+from bisect import bisect_right, insort
+import math
+import numpy as np
+
+
+class EdgeOccupancy:
+    """The agents on each road, ordered by how far along it they are
+
+    Each road is kept separately for each direction and for agents in cars and
+    on foot, since agents only queue behind others travelling the same way.
+    Finding the agent ahead of another is a binary search within its road.
+
+    Attributes:
+        edges (dict): (arc, in_car) -> sorted list of (distance along edge, agent ID)
+        entries (dict): agent ID -> ((arc, in_car), distance along edge)
+    """
+
+    def __init__(self):
+        self.edges: dict[tuple[int, bool], list[tuple[float, int]]] = {}
+        self.entries: dict[int, tuple[tuple[int, bool], float]] = {}
+
+    def add(self, agent_id: int, edge: tuple[int, bool], distance: float = 0) -> None:
+        """
+        Record an agent entering a road
+
+        Args:
+            agent_id (int): unique ID of the agent
+            edge (tuple[int, bool]): arc that the agent is on and whether it is in a car
+            distance (float): distance that the agent has travelled along the arc
+        """
+        insort(self.edges.setdefault(edge, []), (distance, agent_id))
+        self.entries[agent_id] = (edge, distance)
+
+    def remove(self, agent_id: int) -> None:
+        """
+        Record an agent leaving its road
+        """
+        edge, distance = self.entries.pop(agent_id)
+        agents = self.edges[edge]
+        del agents[bisect_right(agents, (distance, agent_id)) - 1]
+        if len(agents) == 0:
+            del self.edges[edge]
+
+    def move(self, agent_id: int, distance: float) -> None:
+        """
+        Record an agent moving along its road
+        """
+        edge, previous = self.entries[agent_id]
+        if distance == previous:
+            return
+        self.remove(agent_id)
+        self.add(agent_id, edge, distance)
+
+    def leader(self, agent_id: int) -> float | None:
+        """
+        Returns the distance along the road of the nearest agent ahead of an agent, or None if there is none
+        """
+        edge, distance = self.entries[agent_id]
+        agents = self.edges[edge]
+        i = bisect_right(agents, (distance, math.inf))
+        return agents[i][0] if i < len(agents) else None
+
+    def counts(self, n_arcs: int) -> np.ndarray:
+        """
+        Returns the number of agents on each arc, in either mode
+        """
+        counts = np.zeros(n_arcs, dtype=np.int64)
+        for (arc, _), agents in self.edges.items():
+            counts[arc] += len(agents)
+        return counts
@@ -0,0 +1,97 @@
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from mesacat.routing import follow
+
+
+class SharedArray:
+    """A copy of a numpy array in shared memory, which worker processes attach to by name instead of receiving a pickled copy
+
+    Args:
+        array: array to copy into shared memory
+
+    Attributes:
+        spec (tuple): name, shape and dtype needed to attach to the array with ``attach``
+        array (np.ndarray): the array in shared memory
+    """
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.spec = (self.memory.name, array.shape, array.dtype.str)
+        self.array = np.ndarray(array.shape, array.dtype, buffer=self.memory.buf)
+        self.array[:] = array
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release and remove the shared memory
+        """
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+
+def attach(spec: tuple) -> tuple[SharedMemory, np.ndarray]:
+    """
+    Attach to an array shared by a ``SharedArray``, returning the shared memory and a view of the array
+
+    The shared memory must be kept open for as long as the view is used.
+    """
+    name, shape, dtype = spec
+    memory = SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype, buffer=memory.buf)
+
+
+# state of each worker process, set by init_worker
+_memory: SharedMemory | None = None
+_next_hop: np.ndarray | None = None
+
+
+def init_worker(spec: tuple) -> None:
+    global _memory, _next_hop
+    _memory, _next_hop = attach(spec)
+
+
+def routes_of_chunk(sources: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the concatenated routes from a chunk of sources and the offset at which each route after the first starts
+    """
+    routes = [follow(_next_hop, source) for source in sources]
+    if len(routes) == 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+    offsets = np.cumsum([len(route) for route in routes])[:-1]
+    return np.concatenate(routes), offsets
+
+
+def routes(
+    next_hop: np.ndarray, sources: np.ndarray, processes: int, chunks_per_process=4
+) -> list[np.ndarray]:
+    """
+    Follow next hops from many sources across a pool of worker processes
+
+    Returns the same routes, in the same order, as following the next hops
+    from each source in turn.
+
+    Args:
+        next_hop (np.ndarray): next node from each node, -1 where there is none
+        sources (np.ndarray): node that each route starts from
+        processes (int): number of worker processes
+        chunks_per_process (int): number of chunks the sources are split into
+            for each process, to balance the work between them
+    """
+    chunks = np.array_split(np.asarray(sources), processes * chunks_per_process)
+    with SharedArray(next_hop) as shared:
+        with Pool(processes, initializer=init_worker, initargs=(shared.spec,)) as pool:
+            results = pool.map(routes_of_chunk, chunks)
+    return [
+        route
+        for nodes, offsets in results
+        if len(nodes) > 0
+        for route in np.split(nodes, offsets)
+    ]
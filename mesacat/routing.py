@@ -0,0 +1,391 @@
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from mesacat.core import NetworkCore
+
+
+class ExitField:
+    """The shortest distance from every node to its nearest exit, and the next node on the way there
+
+    Computed with a single multi-source Dijkstra search from all of the
+    targets at once, which is equivalent to one search from a virtual
+    super-sink joined to every target.  Arc costs must be symmetric.
+
+    Args:
+        core: compact road network
+        targets: indices of the target nodes
+        cost: cost of each arc of the core.  Defaults to its length
+
+    Attributes:
+        distance (np.ndarray): cost from each node to its nearest target, inf if unreachable
+        next_hop (np.ndarray): next node on the way to the nearest target, -1 at targets
+            and unreachable nodes
+        exit (np.ndarray): index of the nearest target to each node, -1 if unreachable
+    """
+
+    def __init__(
+        self,
+        core: NetworkCore,
+        targets: np.ndarray,
+        cost: np.ndarray | None = None,
+    ):
+        self.core = core
+        self.targets = np.asarray(targets)
+        self.update(core.length if cost is None else cost)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        core: NetworkCore,
+        targets: np.ndarray,
+        cost: np.ndarray,
+        distance: np.ndarray,
+        next_hop: np.ndarray,
+        exit: np.ndarray,
+    ) -> "ExitField":
+        """
+        Returns a field computed earlier from its arrays, without searching again
+        """
+        field = cls.__new__(cls)
+        field.core = core
+        field.targets = np.asarray(targets)
+        field.cost = cost
+        field.distance = distance
+        field.next_hop = next_hop
+        field.exit = exit
+        return field
+
+    def update(self, cost: np.ndarray) -> None:
+        """
+        Recompute the field for new arc costs
+
+        If no arc has become cheaper, only the nodes whose shortest route uses
+        an arc that has become more expensive are searched again.  Otherwise
+        the whole field is recomputed.
+
+        Args:
+            cost (np.ndarray): cost of each arc of the core
+        """
+        cost = np.array(cost, dtype=np.float64)
+        previous = getattr(self, "cost", None)
+        if previous is None or np.any(cost < previous):
+            self.search(cost)
+        else:
+            self.repair(np.flatnonzero(cost > previous), cost)
+        self.cost = cost
+
+    def search(self, cost: np.ndarray) -> None:
+        """
+        Compute the field from scratch with a multi-source search from all targets
+        """
+        n = self.core.n_nodes
+        graph = csr_matrix((cost, self.core.indices, self.core.indptr), shape=(n, n))
+        # the search runs outwards from the targets, so each node's predecessor
+        # on the path from its nearest target is its next hop towards it
+        self.distance, next_hop, exit = dijkstra(
+            graph,
+            directed=True,
+            indices=self.targets,
+            min_only=True,
+            return_predecessors=True,
+        )
+        self.next_hop = np.where(next_hop < 0, -1, next_hop)
+        self.exit = np.where(np.isinf(self.distance), -1, exit)
+
+    def repair(self, changed: np.ndarray, cost: np.ndarray) -> None:
+        """
+        Update the field after the cost of some arcs has increased
+
+        The routes of nodes that do not pass through a changed arc are still
+        shortest, so only the subtree of nodes that do is searched again,
+        starting from the best unaffected neighbour of each of them.
+
+        Args:
+            changed (np.ndarray): indices of the arcs whose cost has increased
+            cost (np.ndarray): new cost of each arc
+        """
+        core = self.core
+        n = core.n_nodes
+        tails = core.tail[changed]
+        roots = tails[self.next_hop[tails] == core.indices[changed]]
+        if len(roots) == 0:
+            return
+
+        # mark every node whose route passes through a root, by pointer jumping
+        affected = np.zeros(n, dtype=bool)
+        affected[roots] = True
+        ancestor = np.where(self.next_hop < 0, np.arange(n), self.next_hop)
+        while True:
+            affected |= affected[ancestor]
+            jumped = ancestor[ancestor]
+            if np.array_equal(jumped, ancestor):
+                break
+            ancestor = jumped
+
+        nodes = np.flatnonzero(affected)
+        k = len(nodes)
+        local = np.full(n, -1)
+        local[nodes] = np.arange(k)
+
+        # all arcs leaving the affected nodes
+        starts, ends = core.indptr[nodes], core.indptr[nodes + 1]
+        counts = ends - starts
+        arcs = np.repeat(ends - np.cumsum(counts), counts) + np.arange(counts.sum())
+        tail = np.repeat(np.arange(k), counts)
+        head = core.indices[arcs]
+        internal = affected[head]
+
+        # cost of leaving the subtree through each arc to an unaffected node
+        exit_tail = tail[~internal]
+        exit_head = head[~internal]
+        exit_cost = cost[arcs[~internal]] + self.distance[exit_head]
+        order = np.lexsort((exit_cost, exit_tail))
+        exit_tail, exit_head, exit_cost = (
+            exit_tail[order],
+            exit_head[order],
+            exit_cost[order],
+        )
+        best = np.ones(len(exit_tail), dtype=bool)
+        best[1:] = exit_tail[1:] != exit_tail[:-1]
+        best &= np.isfinite(exit_cost)
+        exit_hop = np.full(k, -1)
+        exit_hop[exit_tail[best]] = exit_head[best]
+
+        # search the subtree from a virtual node joined to each node by its best exit,
+        # with arc costs reversed so predecessors are next hops as in the full search
+        graph = csr_matrix(
+            (
+                np.concatenate([cost[arcs[internal]], exit_cost[best]]),
+                (
+                    np.concatenate([local[head[internal]], np.full(best.sum(), k)]),
+                    np.concatenate([tail[internal], exit_tail[best]]),
+                ),
+            ),
+            shape=(k + 1, k + 1),
+        )
+        distance, predecessor = dijkstra(
+            graph, directed=True, indices=k, return_predecessors=True
+        )
+        predecessor = predecessor[:k]
+        next_hop = np.where(
+            predecessor == k, exit_hop, nodes[np.clip(predecessor, 0, k - 1)]
+        )
+        next_hop[predecessor < 0] = -1
+        self.distance[nodes] = distance[:k]
+        self.next_hop[nodes] = next_hop
+
+        # the exit of each affected node is the exit of the first unaffected node on its route
+        ancestor = np.arange(n)
+        ancestor[nodes] = np.where(next_hop < 0, nodes, next_hop)
+        while True:
+            jumped = ancestor[ancestor]
+            if np.array_equal(jumped, ancestor):
+                break
+            ancestor = jumped
+        exit = self.exit[ancestor[nodes]]
+        self.exit[nodes] = np.where(np.isinf(distance[:k]), -1, exit)
+
+    def route(self, source: int) -> np.ndarray:
+        """
+        Returns the nodes on the shortest route from a node to its nearest target
+
+        The route only contains the source if no target can be reached.
+        """
+        return follow(self.next_hop, source)
+
+    def as_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the field as a table indexed by node ID
+        """
+        ids = self.core.node_ids
+        return pd.DataFrame(
+            {
+                "distance": self.distance,
+                "next_hop": np.where(self.next_hop < 0, None, ids[self.next_hop]),
+                "exit": np.where(self.exit < 0, None, ids[self.exit]),
+            },
+            index=pd.Index(ids, name="osmid"),
+        )
+
+
+class Route:
+    """The nodes of a route, with the arrays needed to move along it
+
+    Indexing a route, taking its length or converting it to an array gives
+    its nodes.
+
+    Args:
+        core: compact road network
+        nodes: indices of the nodes on the route
+
+    Attributes:
+        nodes (np.ndarray): indices of the nodes on the route
+        arcs (np.ndarray): arc from each node to the next
+        length (np.ndarray): length of each arc in metres
+        distance (np.ndarray): distance along the route to each node in metres
+        x (np.ndarray): longitude of each node
+        y (np.ndarray): latitude of each node
+        osmid (np.ndarray): OSM way ID of each arc, or -1 if it has none
+    """
+
+    def __init__(self, core: NetworkCore, nodes: np.ndarray):
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.arcs = core.arcs(self.nodes[:-1], self.nodes[1:])
+        self.length = core.length[self.arcs]
+        self.distance = np.concatenate([[0], np.cumsum(self.length)])
+        self.x = core.x[self.nodes]
+        self.y = core.y[self.nodes]
+        self.osmid = core.osmid[self.arcs]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __getitem__(self, index):
+        return self.nodes[index]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return self.nodes if dtype is None else self.nodes.astype(dtype)
+
+
+def follow(next_hop: np.ndarray, source: int) -> np.ndarray:
+    """
+    Returns the nodes visited by following next hops from a source until there are none
+    """
+    route = [source]
+    node = next_hop[source]
+    while node >= 0:
+        route.append(node)
+        node = next_hop[node]
+    return np.array(route, dtype=np.int32)
+
+
+class RoutingIndex:
+    """Shortest routes between pairs of nodes, answered from stored shortest-path trees
+
+    The tree of shortest routes from an origin is grown the first time the
+    origin is queried, so later queries from the same origin, such as the
+    trips of every agent who lives in the same building, only look up a
+    distance or follow predecessors.  The trees can be saved to a file and are
+    loaded from it again if the network has not changed.
+
+    Args:
+        core: compact road network
+        file: optional ``.npz`` file to load the trees from and save them to
+        max_trees: maximum number of trees to keep; the least recently used
+            trees are dropped when it is exceeded
+    """
+
+    def __init__(self, core: NetworkCore, file: str | None = None, max_trees=256):
+        self.core = core
+        self.file = file
+        self.max_trees = max_trees
+        n = core.n_nodes
+        self.graph = csr_matrix((core.length, core.indices, core.indptr), shape=(n, n))
+        # origin -> (distance to each node, predecessor of each node)
+        self.trees: OrderedDict[int, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self.modified = False
+        if file is not None and os.path.exists(file):
+            self.load()
+
+    def signature(self) -> str:
+        """
+        Returns a hash of the network, used to check that saved trees belong to it
+        """
+        h = hashlib.sha256()
+        for array in (self.core.indptr, self.core.indices, self.core.length):
+            h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()
+
+    def tree(self, origin: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the distance from an origin to each node and the predecessor of each node on the way
+        """
+        origin = int(origin)
+        if origin in self.trees:
+            self.trees.move_to_end(origin)
+            return self.trees[origin]
+        self.precompute([origin])
+        return self.trees[origin]
+
+    def precompute(self, origins: list[int]) -> None:
+        """
+        Grow the trees of many origins with a single call
+
+        Args:
+            origins (list[int]): indices of the origin nodes
+        """
+        origins = np.unique([int(o) for o in origins if int(o) not in self.trees])
+        if len(origins) == 0:
+            return
+        distance, predecessor = dijkstra(
+            self.graph, directed=True, indices=origins, return_predecessors=True
+        )
+        for origin, d, p in zip(origins, distance, predecessor.astype(np.int32)):
+            self.trees[int(origin)] = (d, p)
+        self.modified = True
+        while len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+
+    def distance(self, origin: int, destination: int) -> float:
+        """
+        Returns the length of the shortest route between two nodes, inf if there is none
+        """
+        return float(self.tree(origin)[0][destination])
+
+    def path(self, origin: int, destination: int) -> list[int]:
+        """
+        Returns the nodes on the shortest route between two nodes, or an empty list if there is none
+        """
+        distance, predecessor = self.tree(origin)
+        if np.isinf(distance[destination]):
+            return []
+        path = [int(destination)]
+        while path[-1] != origin:
+            path.append(int(predecessor[path[-1]]))
+        return path[::-1]
+
+    def save(self) -> None:
+        """
+        Write the trees to the index's file, if they have changed since they were loaded
+        """
+        if self.file is None or not self.modified:
+            return
+        origins = np.array(list(self.trees), dtype=np.int64)
+        n = self.core.n_nodes
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.file), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    signature=self.signature(),
+                    origins=origins,
+                    distance=np.array([self.trees[o][0] for o in origins]).reshape(
+                        -1, n
+                    ),
+                    predecessor=np.array([self.trees[o][1] for o in origins]).reshape(
+                        -1, n
+                    ),
+                )
+            os.replace(tmp, self.file)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.modified = False
+
+    def load(self) -> None:
+        """
+        Read the trees from the index's file, ignoring it if it was saved for a different network
+        """
+        with np.load(self.file) as data:
+            if str(data["signature"]) != self.signature():
+                return
+            origins = data["origins"][-self.max_trees :]
+            distance = data["distance"][-self.max_trees :]
+            predecessor = data["predecessor"][-self.max_trees :]
+        for origin, d, p in zip(origins, distance, predecessor):
+            self.trees[int(origin)] = (d, p)
@@ -1,15 +1,12 @@
 from datetime import time, date, timedelta, datetime
 import matplotlib.pyplot as plt
 import numpy as np
-import random
 from shapely import Point, Polygon, buffer
-import pointpats
 import networkx as nx
 from geopandas import GeoSeries, GeoDataFrame
-from igraph import Graph
-from scipy.spatial import cKDTree
 
 from mesacat.generate_schedule import get_schedule
+from mesacat.network import Network
 
 
 def plot_graph(G: nx.DiGraph) -> None:
@@ -25,9 +22,7 @@ def plot_graph(G: nx.DiGraph) -> None:
 def position_at_time(
     agent_type: int,
     t: time,
-    igraph: Graph,
-    nodes: GeoDataFrame,
-    nodes_tree: cKDTree,
+    network: Network,
     walking_speed: float,
     home: GeoSeries,
     work: GeoSeries,
@@ -35,6 +30,7 @@ def position_at_time(
     supermarket: GeoSeries,
     shop: GeoSeries,
     recreation: GeoSeries,
+    rng: np.random.Generator,
 ) -> tuple[Point, str | None, bool]:
     """
     Determine the location of an agent at a given time, based off their daily schedule
@@ -42,14 +38,20 @@ def position_at_time(
     Args:
         agent_type (int): agent type identifier
         t (time): time of day
+        network (Network): road network of the domain area
+        walking_speed (float): agent's walking speed in km/h
         home (GeoSeries): agent's home location
         work (GeoSeries): agent's work location
         school (GeoSeries): agent's (or their child's) school location
         supermarket (GeoSeries): agent's assigned supermarket
         shop (GeoSeries): agent's assigned shop
         recreation (GeoSeries): location of agent's assigned recreational activity
+        rng (np.random.Generator): random number generator
     """
 
+    routes = network.routes
+    nodes = network.nodes
+
     schedule = get_schedule(agent_type)
     # assume that the agent will always be in the same location at the start of the day (most likely at home)
     # this is the start node and it has zero incoming edges
@@ -63,9 +65,7 @@ def position_at_time(
         # current node in the schedule graph
         node = schedule.nodes[current_node]
         # apply random variation to the time that the agent will leave their current location
-        time_delta = timedelta(
-            seconds=np.random.normal(0, node["variation"].total_seconds())
-        )
+        time_delta = timedelta(seconds=rng.normal(0, node["variation"].total_seconds()))
 
         # time the agent will leave their current location
         leave_time: datetime
@@ -87,30 +87,28 @@ def position_at_time(
             break
 
         # select the agent's next destination, based on the assigned probabilities
-        next_node_name = random.choices(
-            [item[1] for item in next_location_options],
-            weights=[item[2] for item in next_location_options],
-        )[0]
+        weights = np.array([item[2] for item in next_location_options])
+        next_node_name = next_location_options[
+            rng.choice(len(next_location_options), p=weights / weights.sum())
+        ][1]
 
         # teleport the agent to their next destination (travel time is not accounted for)
         origin = point_from_node_name(
-            current_node, home, work, school, supermarket, shop, recreation
+            current_node, home, work, school, supermarket, shop, recreation, rng
         )
         destination = point_from_node_name(
-            next_node_name, home, work, school, supermarket, shop, recreation
+            next_node_name, home, work, school, supermarket, shop, recreation, rng
         )
 
-        _, [origin_idx, destination_idx] = nodes_tree.query(
+        _, [origin_idx, destination_idx] = network.nodes_tree.query(
             [[origin.x, origin.y], [destination.x, destination.y]]
         )
 
-        path = igraph.get_shortest_paths(origin_idx, destination_idx, weights="length")[
-            0
-        ]
+        path = routes.path(origin_idx, destination_idx)
 
-        total_distance = igraph.distances(
-            origin_idx, destination_idx, weights="length"
-        )[0][0]
+        # distance from the origin to each node along the path
+        distance_along_path = routes.tree(origin_idx)[0][path]
+        total_distance = routes.distance(origin_idx, destination_idx)
 
         car_speed = 48  # kph
         walking_speed = walking_speed
@@ -132,9 +130,9 @@ def position_at_time(
             i = 0
             t = leave_time
             while t < target_time:
-                distance_to_next_node = igraph.distances(
-                    path[i], path[i + 1], weights="length"
-                )[0][0]
+                distance_to_next_node = (
+                    distance_along_path[i + 1] - distance_along_path[i]
+                )
                 time_to_next_node = (distance_to_next_node / 1000) / speed
 
                 t += timedelta(hours=time_to_next_node)
@@ -144,7 +142,7 @@ def position_at_time(
             return (Point(node.x, node.y), nodes.iloc[path[i - 1]].name, in_car)
 
     current_location = point_from_node_name(
-        current_node, home, work, school, supermarket, shop, recreation
+        current_node, home, work, school, supermarket, shop, recreation, rng
     )
 
     return (current_location, None, False)
@@ -158,22 +156,23 @@ def point_from_node_name(
     supermarket: GeoSeries,
     shop: GeoSeries,
     recreation: GeoSeries,
+    rng: np.random.Generator,
 ):
     """
     Return the geopgraphic location of the agent based on the name of the node they are at
     """
     if "home" in node:
-        return random_point_in_polygon(home.geometry)
+        return random_point_in_polygon(home.geometry, rng)
     elif "work" in node:
-        return random_point_in_polygon(work.geometry)
+        return random_point_in_polygon(work.geometry, rng)
     elif "school" in node:
-        return random_point_in_polygon(school.geometry)
+        return random_point_in_polygon(school.geometry, rng)
     elif "supermarket" in node:
-        return random_point_in_polygon(supermarket.geometry)
+        return random_point_in_polygon(supermarket.geometry, rng)
     elif "shop" in node:
-        return random_point_in_polygon(shop.geometry)
+        return random_point_in_polygon(shop.geometry, rng)
     elif "recreation" in node:
-        return random_point_in_polygon(recreation.geometry)
+        return random_point_in_polygon(recreation.geometry, rng)
     else:
         ValueError("Unknown location: {0}".format(node))
 
@@ -205,12 +204,15 @@ def index_from_node_name(
         ValueError("Unknown OSMID: {0}".format(node))
 
 
-def random_point_in_polygon(geometry: Polygon):
+def random_point_in_polygon(geometry: Polygon, rng: np.random.Generator):
     """
-    Generate a random point within a polygon
+    Generate a random point within a polygon, by rejection sampling from its bounding box
     """
 
     # A buffer is added because the method hangs if the polygon is too small
-    return Point(
-        pointpats.random.poisson(buffer(geometry=geometry, distance=0.000001), size=1)
-    )
+    geometry = buffer(geometry=geometry, distance=0.000001)
+    min_x, min_y, max_x, max_y = geometry.bounds
+    while True:
+        point = Point(rng.uniform(min_x, max_x), rng.uniform(min_y, max_y))
+        if geometry.contains(point):
+            return point
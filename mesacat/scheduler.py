@@ -0,0 +1,57 @@
+from __future__ import annotations
+import heapq
+from mesa import Agent, Model
+from mesa.time import BaseScheduler
+
+
+class ActiveSetActivation(BaseScheduler):
+    """A scheduler that activates only the agents that are on the move, in a random order each step
+
+    Agents that have not set off yet wait in a priority queue keyed by their
+    departure time and join the active set when it is reached.  Agents that
+    have evacuated or are stranded leave the active set for good, so a step
+    costs time in proportion to the number of agents still moving.  All agents
+    remain in ``agents``, so they are still reported on every step.
+
+    Agents must have ``departure_time``, ``evacuated`` and ``stranded``
+    attributes, and the model a ``seconds_elapsed`` clock.
+
+    Attributes:
+        active (list): agents that are moving
+        waiting (list): heap of (departure time, unique ID, agent) of the agents yet to set off
+    """
+
+    def __init__(self, model: Model):
+        super().__init__(model)
+        self.active: list[Agent] = []
+        self.waiting: list[tuple[float, int, Agent]] = []
+
+    def add(self, agent: Agent) -> None:
+        super().add(agent)
+        heapq.heappush(self.waiting, (agent.departure_time, agent.unique_id, agent))
+
+    def remove(self, agent: Agent) -> None:
+        super().remove(agent)
+        if agent in self.active:
+            self.active.remove(agent)
+        self.waiting = [w for w in self.waiting if w[2] is not agent]
+        heapq.heapify(self.waiting)
+
+    def wake(self) -> None:
+        """
+        Move the agents whose departure time has been reached into the active set
+        """
+        now = self.model.seconds_elapsed
+        while self.waiting and self.waiting[0][0] <= now:
+            _, _, agent = heapq.heappop(self.waiting)
+            if not (agent.evacuated or agent.stranded):
+                self.active.append(agent)
+
+    def step(self) -> None:
+        self.wake()
+        self.model.random.shuffle(self.active)
+        for agent in self.active:
+            agent.step()
+        self.active = [a for a in self.active if not (a.evacuated or a.stranded)]
+        self.steps += 1
+        self.time += 1
@@ -0,0 +1,304 @@
+from __future__ import annotations
+import json
+import math
+import numpy as np
+from mesacat.core import NetworkCore
+
+
+class P2Quantile:
+    """Estimates a quantile of a stream of values in constant memory, with the P² algorithm of Jain and Chlamtac (1985)
+
+    Five markers follow the minimum, the maximum, the quantile and the
+    quantiles half way to each end.  Each new value moves the markers it
+    passes, and a marker that drifts from its ideal position is adjusted by
+    piecewise-parabolic interpolation of its neighbours.  The estimate is
+    exact until there are five values.
+
+    Args:
+        p: the quantile to estimate, between 0 and 1
+
+    Attributes:
+        count (int): number of values seen
+        heights (list[float]): value at each marker
+        positions (list[float]): number of values below each marker
+        desired (list[float]): ideal position of each marker
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: list[float] = []
+        self.positions = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self) -> float:
+        """The estimate of the quantile, nan if there are no values"""
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+    def get_state(self) -> np.ndarray:
+        heights = self.heights + [math.nan] * (5 - len(self.heights))
+        return np.array([self.count] + heights + self.positions + self.desired)
+
+    def set_state(self, state: np.ndarray) -> None:
+        self.count = int(state[0])
+        self.heights = state[1 : 1 + min(self.count, 5)].tolist()
+        self.positions = state[6:11].tolist()
+        self.desired = state[11:16].tolist()
+
+
+class TimeStatistics:
+    """Running count, mean, range and quantiles of evacuation times
+
+    Args:
+        quantiles: the quantiles to estimate
+    """
+
+    def __init__(self, quantiles: tuple[float, ...]):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketches = [P2Quantile(p) for p in quantiles]
+
+    def add(self, t: float) -> None:
+        self.count += 1
+        self.total += t
+        self.min = min(self.min, t)
+        self.max = max(self.max, t)
+        for sketch in self.sketches:
+            sketch.add(t)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the statistics, with the quantiles named p50, p90 and so on
+        """
+        empty = self.count == 0
+        values = {
+            "count": self.count,
+            "mean": None if empty else self.total / self.count,
+            "min": None if empty else self.min,
+            "max": None if empty else self.max,
+        }
+        for sketch in self.sketches:
+            values[quantile_name(sketch.p)] = None if empty else sketch.value
+        return values
+
+    def get_state(self) -> np.ndarray:
+        return np.concatenate(
+            [[self.count, self.total, self.min, self.max]]
+            + [sketch.get_state() for sketch in self.sketches]
+        )
+
+    def set_state(self, state: np.ndarray) -> None:
+        self.count = int(state[0])
+        self.total, self.min, self.max = state[1:4].tolist()
+        for i, sketch in enumerate(self.sketches):
+            sketch.set_state(state[4 + 16 * i : 20 + 16 * i])
+
+
+def quantile_name(p: float) -> str:
+    return "p{0:g}".format(100 * p)
+
+
+class Summary:
+    """Counts of the progress of an evacuation, updated as agents change state
+
+    Every update costs the same however many agents there are, so the
+    headline numbers of a run can be reported at every step, and written at
+    the end, without going through the agents or the agent output.
+
+    Args:
+        core: the network core of the model
+        target_idx: indices in the core of the targets
+        quantiles: the quantiles of the evacuation time to estimate
+
+    Attributes:
+        evacuated (int): number of agents that have reached a target
+        stranded (int): number of agents that cannot reach a target
+        target_arrivals (np.ndarray): number of agents that have reached each target, in the order of ``target_idx``
+        edge_traversals (np.ndarray): number of times an agent has travelled the length of each arc of the core
+        evacuation_time (TimeStatistics): evacuation times of all agents
+        evacuation_time_by_type (dict): agent type -> TimeStatistics of the agents of that type
+    """
+
+    def __init__(
+        self,
+        core: NetworkCore,
+        target_idx: np.ndarray,
+        quantiles: tuple[float, ...] = (0.5, 0.9, 0.95),
+    ):
+        self.core = core
+        self.target_idx = target_idx
+        self.quantiles = quantiles
+        # position in target_idx of each node of the core, -1 for other nodes
+        self.target_number = np.full(core.n_nodes, -1, dtype=np.int64)
+        self.target_number[target_idx] = np.arange(len(target_idx))
+        self.evacuated = 0
+        self.stranded = 0
+        self.target_arrivals = np.zeros(len(target_idx), dtype=np.int64)
+        self.edge_traversals = np.zeros(len(core.length), dtype=np.int64)
+        self.evacuation_time = TimeStatistics(quantiles)
+        self.evacuation_time_by_type: dict[int, TimeStatistics] = {}
+
+    def evacuate(self, agent_type: int, target: int, t: float) -> None:
+        """
+        Count an agent reaching a target
+
+        Args:
+            agent_type (int): type of the agent
+            target (int): index in the core of the target
+            t (float): time in seconds since the start of the evacuation
+        """
+        self.evacuated += 1
+        self.target_arrivals[self.target_number[target]] += 1
+        self.evacuation_time.add(t)
+        by_type = self.evacuation_time_by_type.get(agent_type)
+        if by_type is None:
+            by_type = self.evacuation_time_by_type[agent_type] = TimeStatistics(
+                self.quantiles
+            )
+        by_type.add(t)
+
+    def evacuate_all(
+        self, agent_types: np.ndarray, targets: np.ndarray, times: np.ndarray
+    ) -> None:
+        """
+        Count several agents reaching targets, as for ``evacuate``
+        """
+        for agent_type, target, t in zip(
+            agent_types.tolist(), targets.tolist(), times.tolist()
+        ):
+            self.evacuate(agent_type, target, t)
+
+    def strand(self, n: int = 1) -> None:
+        """
+        Count agents that cannot reach a target
+        """
+        self.stranded += n
+
+    def traverse(self, arcs) -> None:
+        """
+        Count agents travelling the length of arcs of the core
+
+        Args:
+            arcs: index of an arc, or an array of them which may repeat
+        """
+        np.add.at(self.edge_traversals, arcs, 1)
+
+    def quantile(self, p: float) -> float:
+        """
+        Returns the estimate of a quantile of the evacuation time of all agents, nan before any agent has evacuated
+        """
+        return self.evacuation_time.sketches[self.quantiles.index(p)].value
+
+    def to_dict(self) -> dict:
+        """
+        Returns the summary with targets named by their node ID and roads by their OSM way ID, as written by ``write``
+        """
+        osmid = self.core.osmid
+        traversed = np.flatnonzero(self.edge_traversals)
+        roads = osmid[traversed] >= 0
+        way_ids, way = np.unique(osmid[traversed[roads]], return_inverse=True)
+        way_traversals = np.bincount(
+            way, weights=self.edge_traversals[traversed[roads]]
+        )
+        return {
+            "evacuated": self.evacuated,
+            "stranded": self.stranded,
+            "evacuation_time": self.evacuation_time.to_dict(),
+            "evacuation_time_by_type": {
+                str(agent_type): stats.to_dict()
+                for agent_type, stats in sorted(self.evacuation_time_by_type.items())
+            },
+            "target_arrivals": dict(
+                zip(
+                    self.core.node_ids[self.target_idx].astype(str).tolist(),
+                    self.target_arrivals.tolist(),
+                )
+            ),
+            "road_traversals": dict(
+                zip(way_ids.astype(str).tolist(), way_traversals.astype(int).tolist())
+            ),
+        }
+
+    def write(self, path: str, **extra) -> None:
+        """
+        Write the summary to a JSON file, with any extra values given
+        """
+        with open(path, "w") as f:
+            json.dump({**extra, **self.to_dict()}, f, indent=2)
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """
+        Returns the counts as arrays, to be saved in a checkpoint
+        """
+        types = sorted(self.evacuation_time_by_type)
+        return {
+            "summary_counts": np.array([self.evacuated, self.stranded]),
+            "summary_target_arrivals": self.target_arrivals,
+            "summary_edge_traversals": self.edge_traversals,
+            "summary_types": np.array(types, dtype=np.int64),
+            "summary_times": np.stack(
+                [self.evacuation_time.get_state()]
+                + [self.evacuation_time_by_type[t].get_state() for t in types]
+            ),
+        }
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Set the counts from the arrays of ``get_state``
+        """
+        self.evacuated, self.stranded = state["summary_counts"].tolist()
+        self.target_arrivals = state["summary_target_arrivals"].copy()
+        self.edge_traversals = state["summary_edge_traversals"].copy()
+        times = state["summary_times"]
+        self.evacuation_time.set_state(times[0])
+        self.evacuation_time_by_type = {}
+        for agent_type, values in zip(state["summary_types"].tolist(), times[1:]):
+            stats = self.evacuation_time_by_type[agent_type] = TimeStatistics(
+                self.quantiles
+            )
+            stats.set_state(values)
@@ -0,0 +1,90 @@
+"""
+Time taken to write the road network output of a model and read it back
+
+Compares the GML graph and GeoPackage layers written before with the
+binary bundle, read as ``read_model`` reads each.
+
+Usage: python -m mesacat.tests.benchmarks.bundle [grid size] [number of agents]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import geopandas as gpd
+import networkx as nx
+import osmnx
+from mesacat import bundle
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def write_gml(model, path):
+    nx.write_gml(model.G, path + ".gml")
+    model.evacuation_zone.to_file(path + ".gpkg", layer="hazard", driver="GPKG")
+    model.target_nodes.to_file(path + ".gpkg", layer="targets", driver="GPKG")
+    model.nodes[["geometry"]].to_file(path + ".gpkg", layer="nodes", driver="GPKG")
+    model.edges[["geometry"]].to_file(path + ".gpkg", layer="edges", driver="GPKG")
+
+
+def read_gml(path):
+    graph = nx.read_gml(path + ".gml")
+    nodes, edges = osmnx.convert.graph_to_gdfs(graph)
+    agent_nodes = nodes[nodes.index.str.contains("agent-start-pos", na=False)]
+    for osmid, _ in agent_nodes.iterrows():
+        graph.remove_node(osmid)
+    gpd.read_file(path + ".gpkg", layer="hazard")
+    gpd.read_file(path + ".gpkg", layer="targets")
+
+
+def write_bundle(model, path):
+    bundle.write_layers(
+        path + ".bundle",
+        {
+            "nodes": model.nodes,
+            "edges": model.edges,
+            "hazard": model.evacuation_zone,
+            "targets": model.target_nodes,
+        },
+    )
+
+
+def read_bundle(path):
+    layers = bundle.read_layers(path + ".bundle")
+    bundle.road_graph(layers["nodes"], layers["edges"])
+
+
+def timed(f, *args) -> float:
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    n_agents = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    network = Network(grid_graph(size, size).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    model = build_model(network, zone, random_agents(zone, n_agents))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run")
+        for name, write, read in [
+            ("gml", write_gml, read_gml),
+            ("bundle", write_bundle, read_bundle),
+        ]:
+            # the graph and tables are built again for each format
+            model.network.changed()
+            write_time = timed(write, model, path)
+            read_time = timed(read, path)
+            print(
+                "{0:>8}: write {1:6.2f} s, read {2:6.2f} s".format(
+                    name, write_time, read_time
+                )
+            )
@@ -0,0 +1,52 @@
+"""
+Memory used to collect the agent output of a run and write it as CSV
+
+Runs a VectorizedEvacuationModel with the agent output written to disk in
+small chunks, and with chunks large enough to hold the whole run in memory,
+and reports the peak memory allocated by the run and its run time.
+
+Usage: python -m mesacat.tests.benchmarks.collector [number of agents] [steps]
+"""
+
+import os
+import sys
+import tempfile
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.tests.benchmarks.memory import measure
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(network, zone, agents, chunk_size, directory):
+    model = build_model(
+        network,
+        zone,
+        agents,
+        VectorizedEvacuationModel,
+        output_path=os.path.join(directory, "run"),
+    )
+    model.data_collector.chunk_size = chunk_size
+    return model
+
+
+if __name__ == "__main__":
+    n_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    network = Network(grid_graph(50, 50).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    agents = random_agents(zone, n_agents)
+
+    for name, chunk_size in [
+        ("chunked", 200000),
+        ("in memory", n_agents * (steps + 1)),
+    ]:
+        with tempfile.TemporaryDirectory() as directory:
+            model = build(network, zone, agents, chunk_size, directory)
+            peak, elapsed = measure(lambda: model.run(steps))
+        print("{0:>10}: {1:8.1f} MB peak, {2:6.2f} s".format(name, peak, elapsed))
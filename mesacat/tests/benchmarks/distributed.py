@@ -0,0 +1,55 @@
+"""
+Time taken by a step of the distributed model as the number of regions grows
+
+Each region's agents are moved in their own worker process, so the time per
+step should fall as regions are added until the handoffs between regions
+and gathering the agents' state each step dominate.  The vectorized engine,
+which runs in one process, is timed first for comparison.
+
+Usage: python -m mesacat.tests.benchmarks.distributed [grid size] [steps] [agents] [regions...]
+"""
+
+import sys
+import time
+from mesacat.distributed import DistributedEvacuationModel
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    n_agents = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    counts = [int(n) for n in sys.argv[4:]] or [1, 2, 4, 8]
+
+    network = Network(grid_graph(size, size).to_undirected())
+    zone = between_nodes(network, 0.1, 0.9)
+    agents = random_agents(zone, n_agents)
+    for regions in [None] + counts:
+        if regions is None:
+            model = build_model(network, zone, agents, VectorizedEvacuationModel)
+            name = "vectorized"
+        else:
+            model = build_model(
+                network, zone, agents, DistributedEvacuationModel, regions=regions
+            )
+            name = "{0} regions".format(regions)
+            # start the workers before timing
+            model.step()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        elapsed = (time.perf_counter() - start) / steps
+        handoffs = getattr(model, "handoffs", 0)
+        print(
+            "{0:>12}: {1:8.1f} ms per step, {2:8d} handoffs".format(
+                name, elapsed * 1e3, handoffs
+            )
+        )
+        if regions is not None:
+            model.close()
@@ -0,0 +1,77 @@
+"""
+Memory used to hold the road network without the agents' starting positions
+
+Compares the previous approach (a deep copy of the graph with the agent
+nodes removed) with the lazy view used by EvacuationModel, and the memory
+per node of the networkx graph with that of the compact network core.
+
+Usage: python -m mesacat.tests.benchmarks.memory [grid size] [number of agents]
+"""
+
+import copy
+import sys
+import time
+import tracemalloc
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def measure(f) -> tuple[float, float]:
+    """
+    Returns the peak memory allocated by f in MB and its run time in seconds
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / 1e6, elapsed
+
+
+def deep_copy(model):
+    G = copy.deepcopy(model.G)
+    agent_nodes = [n for n in G.nodes if str(n).startswith("agent-start-pos")]
+    G.remove_nodes_from(agent_nodes)
+    return G
+
+
+def view(model):
+    G = model.G_without_agent_start_pos
+    # touch every node and edge, as plotting does
+    sum(1 for _ in G.nodes(data=True)), sum(1 for _ in G.edges(keys=True, data=True))
+    return G
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    n_agents = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    network = Network(grid_graph(size, size).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    model = build_model(network, zone, random_agents(zone, n_agents))
+    print(
+        "{0} nodes, {1} edges".format(
+            model.G.number_of_nodes(), model.G.number_of_edges()
+        )
+    )
+
+    for name, f in [("deepcopy", deep_copy), ("view", view)]:
+        peak, elapsed = measure(lambda: f(model))
+        print("{0:>10}: {1:8.1f} MB peak, {2:6.2f} s".format(name, peak, elapsed))
+
+    n_nodes = model.G.number_of_nodes()
+    graph_peak, _ = measure(lambda: copy.deepcopy(model.G))
+    core_peak, _ = measure(model.network.to_core)
+    print(
+        "{0:>10}: {1:8.0f} bytes per node".format(
+            "networkx", graph_peak * 1e6 / n_nodes
+        )
+    )
+    print("{0:>10}: {1:8.0f} bytes per node".format("core", core_peak * 1e6 / n_nodes))
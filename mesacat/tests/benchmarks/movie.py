@@ -0,0 +1,87 @@
+"""
+Time taken to draw the frames of a movie, without encoding them
+
+Compares selecting each step from the agent output table and drawing the
+whole figure, as each frame was drawn before, with drawing the precomputed
+frames over the background.  Encoding is left out, as it needs FFmpeg and
+is split across processes by ``create_movie``.
+
+Usage: python -m mesacat.tests.benchmarks.movie [grid size] [number of agents] [steps]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.utils import MovieFrames, MovieRenderer, read_model
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def draw_tables(renderer, path):
+    agent_df, model_df, *_, target_nodes = read_model(path)
+    target_nodes = target_nodes.set_axis(target_nodes.index.astype(str))
+    for artist in (renderer.agents, renderer.targets, renderer.title):
+        artist.set_animated(False)
+    for step in model_df.index:
+        agents_at_step = agent_df.loc[[step]]
+        evacuated_agents = agents_at_step[agents_at_step.status == 1]
+        renderer.agents.set_offsets(agents_at_step[["lon", "lat"]].values)
+        renderer.agents.set_color(
+            [
+                (renderer.vehicle_agents_color if in_car else renderer.agents_color)
+                for in_car in agents_at_step.in_car
+            ]
+        )
+        renderer.targets.set_sizes(
+            target_nodes.join(
+                evacuated_agents.position.value_counts().rename("occupants")
+            )
+            .occupants.fillna(0)
+            .values
+        )
+        renderer.title.set_text(str(step))
+        renderer.canvas.draw()
+        np.asarray(renderer.canvas.buffer_rgba())
+    for artist in (renderer.agents, renderer.targets, renderer.title):
+        artist.set_animated(True)
+
+
+def draw_frames(renderer, path):
+    renderer = MovieRenderer(MovieFrames(path))
+    for index in range(len(renderer.frames.steps)):
+        renderer.render(index)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    n_agents = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    steps = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    network = Network(grid_graph(size, size).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run")
+        model = build_model(
+            network,
+            zone,
+            random_agents(zone, n_agents),
+            VectorizedEvacuationModel,
+            output_path=path,
+        )
+        model.run(steps)
+        renderer = MovieRenderer(MovieFrames(path))
+
+        for name, draw in [("tables", draw_tables), ("frames", draw_frames)]:
+            start = time.perf_counter()
+            draw(renderer, path)
+            elapsed = time.perf_counter() - start
+            print("{0:>8}: {1:6.2f} s".format(name, elapsed))
@@ -0,0 +1,45 @@
+"""
+Time taken by a model step as the number of agents grows
+
+Each agent finds the agent ahead of it on its road in the model's edge
+occupancy index, so the time per step should grow roughly linearly with the
+number of agents, i.e. the time per agent should stay roughly constant.
+The same populations are then run with the vectorized engine.
+
+Usage: python -m mesacat.tests.benchmarks.step [grid size] [steps] [agents...]
+"""
+
+import sys
+import time
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.model import EvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    populations = [int(n) for n in sys.argv[3:]] or [1000, 2000, 4000, 8000, 16000]
+
+    for model_class in (EvacuationModel, VectorizedEvacuationModel):
+        print(model_class.__name__)
+        for n_agents in populations:
+            network = Network(grid_graph(size, size).to_undirected())
+            zone = between_nodes(network, 0.27, 0.73)
+            model = build_model(
+                network, zone, random_agents(zone, n_agents), model_class
+            )
+            start = time.perf_counter()
+            for _ in range(steps):
+                model.step()
+            elapsed = (time.perf_counter() - start) / steps
+            print(
+                "{0:>8} agents: {1:8.1f} ms per step, {2:6.1f} us per agent".format(
+                    n_agents, elapsed * 1e3, elapsed / n_agents * 1e6
+                )
+            )
@@ -0,0 +1,60 @@
+"""
+Memory used to read the agents at every step of a run, as making a movie does
+
+Compares reading the whole agent output file into a table and selecting
+each step from it with reading each step from the memory-mapped
+trajectory, and reports the peak memory allocated and the time taken.
+
+Usage: python -m mesacat.tests.benchmarks.trajectory [number of agents] [steps]
+"""
+
+import os
+import sys
+import tempfile
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.trajectory import Trajectory
+from mesacat.utils import read_model
+from mesacat.tests.benchmarks.memory import measure
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def read_csv(path, steps):
+    agent_df, *_ = read_model(path)
+    for step in range(steps + 1):
+        agent_df.loc[[step]]
+
+
+def read_trajectory(path, steps):
+    trajectory = Trajectory(path)
+    for step in range(steps + 1):
+        trajectory.frame(step)
+
+
+if __name__ == "__main__":
+    n_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    network = Network(grid_graph(50, 50).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run")
+        model = build_model(
+            network,
+            zone,
+            random_agents(zone, n_agents),
+            VectorizedEvacuationModel,
+            output_path=path,
+        )
+        model.run(steps)
+        steps = len(model.data_collector.get_model_vars_dataframe()) - 1
+
+        for name, read in [("csv", read_csv), ("trajectory", read_trajectory)]:
+            peak, elapsed = measure(lambda: read(path, steps))
+            print("{0:>10}: {1:8.1f} MB peak, {2:6.2f} s".format(name, peak, elapsed))
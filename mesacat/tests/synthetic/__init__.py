@@ -0,0 +1,125 @@
+import math
+from datetime import time
+from unittest import mock
+import networkx as nx
+import numpy as np
+from geopandas import GeoDataFrame, points_from_xy
+from shapely.geometry import Polygon, box
+from mesacat import model as evacuation_model
+from mesacat.network import Network
+
+# roughly the centre of Newcastle upon Tyne
+origin_lon = -1.6178
+origin_lat = 54.9783
+
+
+def grid_graph(rows: int, cols: int, spacing: float = 100) -> nx.MultiDiGraph:
+    """
+    Returns a rectangular street grid in the same format as ``osmnx.graph_from_polygon``
+
+    Args:
+        rows (int): number of nodes north to south
+        cols (int): number of nodes east to west
+        spacing (float): distance between neighbouring nodes in metres
+    """
+    d_lat = spacing / 111320
+    d_lon = spacing / (111320 * math.cos(math.radians(origin_lat)))
+
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for i in range(rows):
+        for j in range(cols):
+            G.add_node(
+                i * cols + j + 1,
+                x=origin_lon + j * d_lon,
+                y=origin_lat + i * d_lat,
+                street_count=4,
+            )
+
+    osmid = 1000
+    for i in range(rows):
+        for j in range(cols):
+            u = i * cols + j + 1
+            neighbours = []
+            if j + 1 < cols:
+                neighbours.append(u + 1)
+            if i + 1 < rows:
+                neighbours.append(u + cols)
+            for v in neighbours:
+                osmid += 1
+                for a, b in ((u, v), (v, u)):
+                    G.add_edge(a, b, osmid=osmid, length=spacing, highway="residential")
+    return G
+
+
+def random_agents(zone: Polygon, n: int, seed: int = 0) -> GeoDataFrame:
+    """
+    Returns n agents placed uniformly at random within a zone, in the same format as ``generate_agents``
+
+    Args:
+        zone (Polygon): area within which the agents will be placed
+        n (int): number of agents
+        seed (int): random seed
+    """
+    rng = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = zone.bounds
+    return GeoDataFrame(
+        {
+            "agent_type": rng.integers(0, 3, n),
+            "walking_speed": rng.uniform(3, 6, n),
+            "in_car": rng.random(n) < 0.3,
+            "home": 0,
+        },
+        geometry=points_from_xy(
+            rng.uniform(min_x, max_x, n), rng.uniform(min_y, max_y, n)
+        ),
+        crs="EPSG:4326",
+    )
+
+
+def between_nodes(network: Network, start: float, end: float) -> Polygon:
+    """
+    Returns a box covering a fraction of the network that does not run along any road
+
+    Args:
+        network (Network): road network
+        start (float): fraction of the network's extent at which the box starts
+        end (float): fraction of the network's extent at which the box ends
+    """
+    min_x, min_y, max_x, max_y = network.nodes.unary_union.bounds
+    return box(
+        min_x + start * (max_x - min_x),
+        min_y + start * (max_y - min_y),
+        min_x + end * (max_x - min_x),
+        min_y + end * (max_y - min_y),
+    )
+
+
+def build_model(
+    network: Network,
+    zone: Polygon,
+    agents: GeoDataFrame,
+    model_class: type | None = None,
+    **kwargs
+) -> "evacuation_model.EvacuationModel":
+    """
+    Build an EvacuationModel on a synthetic network with pre-generated agents
+
+    Args:
+        network (Network): road network
+        zone (Polygon): evacuation zone
+        agents (GeoDataFrame): agents, as returned by ``random_agents``
+        model_class (type): subclass of EvacuationModel to build
+    """
+    model_class = model_class or evacuation_model.EvacuationModel
+    evacuation_zone = GeoDataFrame(geometry=[zone], crs="EPSG:4326")
+    with mock.patch.object(evacuation_model, "generate_agents", return_value=agents):
+        return model_class(
+            kwargs.pop("output_path", None),
+            zone,
+            evacuation_zone,
+            "",
+            time(hour=8),
+            len(agents),
+            network=network,
+            **kwargs,
+        )
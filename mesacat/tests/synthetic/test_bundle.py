@@ -0,0 +1,87 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+from mesacat import bundle
+from mesacat.core import AGENT_START
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.utils import read_model
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class TestBundle(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_arrays_are_mapped_from_the_file(self):
+        file = os.path.join(self.directory, "arrays.bundle")
+        arrays = {
+            "ints": np.arange(10, dtype=np.int32),
+            "matrix": np.random.default_rng(0).random((3, 5)),
+            "text": np.array(["a", "target1", ""]),
+            "empty": np.zeros(0, dtype=bool),
+        }
+        bundle.write(file, {"crs": "EPSG:4326"}, arrays)
+        meta, read = bundle.read(file)
+        self.assertEqual(meta, {"crs": "EPSG:4326"})
+        for name, a in arrays.items():
+            np.testing.assert_array_equal(read[name], a)
+            self.assertEqual(read[name].dtype, a.dtype)
+            if a.size:
+                self.assertIsInstance(read[name], np.memmap)
+                self.assertEqual(read[name].ctypes.data % bundle.ALIGN, 0)
+
+    def test_refuses_other_files(self):
+        file = os.path.join(self.directory, "other.bundle")
+        with open(file, "wb") as f:
+            f.write(b"not a bundle, but long enough to read a header")
+        with self.assertRaises(ValueError):
+            bundle.read(file)
+
+    def test_read_model_accepts_bundle(self):
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        output_path = os.path.join(self.directory, "run")
+        model = build_model(
+            network,
+            zone,
+            random_agents(zone, 20),
+            VectorizedEvacuationModel,
+            output_path=output_path,
+        )
+        model.run(10)
+        self.assertFalse(os.path.exists(output_path + ".gml"))
+
+        for path in (output_path, output_path + ".bundle"):
+            _, _, graph, nodes, edges, hazard, targets = read_model(path)
+            np.testing.assert_array_equal(
+                nodes.index, model.nodes.index.astype(str).values
+            )
+            np.testing.assert_array_equal(nodes.kind, model.nodes.kind)
+            self.assertTrue(
+                nodes.geometry.equals(model.nodes.geometry.set_axis(nodes.index))
+            )
+            self.assertEqual(len(edges), len(model.edges))
+            np.testing.assert_allclose(edges["length"], model.edges["length"])
+            self.assertTrue(hazard.geometry[0].equals(zone))
+            self.assertEqual(list(targets.index), list(model.target_nodes.index))
+            # the graph is the road network without the agents' start positions
+            self.assertEqual(
+                graph.number_of_nodes(),
+                (model.nodes.kind != AGENT_START).sum(),
+            )
+            self.assertEqual(
+                graph.number_of_edges(), network.G.number_of_edges() + len(targets)
+            )
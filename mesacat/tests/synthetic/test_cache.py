@@ -0,0 +1,86 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase, mock
+import os
+import tempfile
+from geopandas import GeoDataFrame
+from shapely.geometry import box
+from mesacat.cache import OSMCache, BUILDING_TAGS
+from mesacat.generate_agents import get_buildings
+from mesacat.tests.synthetic import grid_graph
+
+
+class TestOSMCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.domain = box(-1.62, 54.97, -1.60, 54.99)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_warm_start_does_not_download(self):
+        cache = OSMCache(self.dir.name)
+        with mock.patch("osmnx.graph_from_polygon", return_value=grid_graph(3, 3)) as f:
+            cold = cache.graph_from_polygon(self.domain)
+            warm = cache.graph_from_polygon(self.domain)
+        self.assertEqual(f.call_count, 1)
+        self.assertEqual(list(cold.edges), list(warm.edges))
+
+        offline = OSMCache(self.dir.name, offline=True)
+        self.assertEqual(len(offline.graph_from_polygon(self.domain)), 9)
+        with self.assertRaises(LookupError):
+            offline.graph_from_polygon(box(0, 0, 1, 1))
+
+    def test_warm_start_buildings(self):
+        cache = OSMCache(self.dir.name)
+        buildings = GeoDataFrame(
+            {"osmid": [1, 2]},
+            geometry=[box(0, 0, 1, 1), box(2, 2, 3, 3)],
+            crs="EPSG:4326",
+        )
+        with mock.patch("osmnx.features_from_polygon", return_value=buildings) as f:
+            get_buildings(self.domain, cache)
+            get_buildings(self.domain, cache)
+        self.assertEqual(f.call_count, len(BUILDING_TAGS))
+        self.assertCountEqual(
+            [call.kwargs["tags"] for call in f.call_args_list], BUILDING_TAGS
+        )
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        cache = OSMCache(self.dir.name)
+        with self.assertRaises(Exception):
+            cache.put("a", lambda: None)
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_key_depends_on_domain_and_tags(self):
+        key = OSMCache.key(self.domain, "features", {"building": True})
+        self.assertEqual(key, OSMCache.key(self.domain, "features", {"building": True}))
+        self.assertNotEqual(key, OSMCache.key(self.domain, "features", {"shop": True}))
+        self.assertNotEqual(
+            key, OSMCache.key(box(0, 0, 1, 1), "features", {"building": True})
+        )
+
+    def test_invalidate(self):
+        cache = OSMCache(self.dir.name)
+        with mock.patch("osmnx.graph_from_polygon", return_value=grid_graph(3, 3)) as f:
+            cache.graph_from_polygon(self.domain)
+            open(cache.routes_file(self.domain), "wb").close()
+            cache.invalidate(self.domain)
+            self.assertFalse(os.path.exists(cache.routes_file(self.domain)))
+            cache.graph_from_polygon(self.domain)
+        self.assertEqual(f.call_count, 2)
+
+        cache.invalidate()
+        self.assertEqual(cache.entries(), [])
+
+    def test_eviction(self):
+        cache = OSMCache(self.dir.name)
+        cache.put("a", grid_graph(10, 10))
+        size = cache.size()
+        cache.max_bytes = int(size * 1.5)
+        os.utime(cache.file("a"), (0, 0))
+        cache.put("b", grid_graph(10, 10))
+        self.assertFalse(os.path.exists(cache.file("a")))
+        self.assertTrue(os.path.exists(cache.file("b")))
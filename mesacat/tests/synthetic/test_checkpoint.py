@@ -0,0 +1,133 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.events import EventDrivenEvacuationModel
+from mesacat.model import EvacuationModel
+from mesacat.network import Network, NetworkOverlay
+from mesacat.timestep import AdaptiveTimeStep
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class TestCheckpoint(TestCase):
+    def setUp(self):
+        self.network = Network(grid_graph(20, 20).to_undirected())
+        self.zone = between_nodes(self.network, 0.27, 0.73)
+        self.agents = random_agents(self.zone, 50, seed=3)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file = os.path.join(directory.name, "checkpoint.npz")
+
+    def build(self, model_class, **kwargs):
+        return build_model(
+            self.network, self.zone, self.agents, model_class, seed=5, **kwargs
+        )
+
+    def assert_same_output(self, model, other):
+        pd.testing.assert_frame_equal(
+            model.data_collector.get_model_vars_dataframe(),
+            other.data_collector.get_model_vars_dataframe(),
+        )
+        pd.testing.assert_frame_equal(
+            model.data_collector.get_agent_vars_dataframe(),
+            other.data_collector.get_agent_vars_dataframe(),
+        )
+
+    def test_resumed_run_matches_uninterrupted_run(self):
+        for model_class, kwargs in (
+            (EvacuationModel, {"reroute_interval": 3}),
+            (VectorizedEvacuationModel, {"reroute_interval": 3}),
+            (
+                VectorizedEvacuationModel,
+                {"adaptive_time_step": AdaptiveTimeStep(min_step=2, max_step=40)},
+            ),
+            (EventDrivenEvacuationModel, {}),
+        ):
+            with self.subTest(model_class=model_class.__name__, **kwargs):
+                model = self.build(model_class, **kwargs)
+                model.run(40)
+                model.save_checkpoint(self.file)
+                model.run(40)
+
+                restored = EvacuationModel.from_checkpoint(self.file, self.network)
+                self.assertIs(type(restored), model_class)
+                restored.run(40)
+                self.assert_same_output(model, restored)
+                self.assertEqual(restored.summary.to_dict(), model.summary.to_dict())
+                self.assertEqual(restored.seconds_elapsed, model.seconds_elapsed)
+                self.assertEqual(restored.time_step, model.time_step)
+
+    def test_restore_does_not_change_the_network(self):
+        model = self.build(EvacuationModel)
+        model.run(5)
+        model.save_checkpoint(self.file, compress=True)
+        overlay = NetworkOverlay(self.network)
+        overlay.add_targets(self.zone)
+
+        restored = EvacuationModel.from_checkpoint(self.file, overlay)
+        np.testing.assert_array_equal(restored.core.node_ids, model.core.node_ids)
+        self.assertEqual(len(overlay.added_nodes), len(overlay.targets))
+        self.assertEqual(len(self.network.nodes), 400)
+
+    def test_branches_with_different_settings(self):
+        model = self.build(VectorizedEvacuationModel)
+        model.run(20)
+        model.save_checkpoint(self.file)
+
+        branches = [
+            VectorizedEvacuationModel.from_checkpoint(
+                self.file, self.network, reroute_interval=1, time_step=time_step
+            )
+            for time_step in (5, 20)
+        ]
+        for branch in branches:
+            self.assertEqual(branch.reroute_interval, 1)
+            self.assertEqual(branch.schedule.steps, 20)
+            branch.run(10)
+        # the steps before the branch are shared
+        times = [b.data_collector.model_vars["time"] for b in branches]
+        self.assertEqual(times[0][:21], model.data_collector.model_vars["time"])
+        self.assertEqual(times[0][:21], times[1][:21])
+        self.assertEqual(times[0][-1], 250)
+        self.assertEqual(times[1][-1], 400)
+
+        with self.assertRaises(TypeError):
+            VectorizedEvacuationModel.from_checkpoint(
+                self.file, self.network, n_agents=10
+            )
+
+    def test_reseeded_branches_differ(self):
+        model = self.build(EvacuationModel)
+        model.run(5)
+        model.save_checkpoint(self.file)
+        same = [EvacuationModel.from_checkpoint(self.file, self.network) for _ in "ab"]
+        self.assertEqual(same[0].rng.random(), same[1].rng.random())
+        self.assertEqual(same[0].random.random(), same[1].random.random())
+
+        branches = [
+            EvacuationModel.from_checkpoint(self.file, self.network, seed=seed)
+            for seed in (1, 2)
+        ]
+        self.assertNotEqual(branches[0].rng.random(), branches[1].rng.random())
+        self.assertNotEqual(branches[0].random.random(), branches[1].random.random())
+
+    def test_refuses_another_network_or_model_class(self):
+        model = self.build(VectorizedEvacuationModel)
+        model.save_checkpoint(self.file)
+        with self.assertRaises(ValueError):
+            VectorizedEvacuationModel.from_checkpoint(
+                self.file, Network(grid_graph(20, 21).to_undirected())
+            )
+        with self.assertRaises(ValueError):
+            EventDrivenEvacuationModel.from_checkpoint(self.file, self.network)
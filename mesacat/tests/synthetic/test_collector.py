@@ -0,0 +1,83 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from mesacat.collector import ColumnarDataCollector
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(model_class=VectorizedEvacuationModel, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    agents = random_agents(zone, 50, seed=3)
+    return build_model(network, zone, agents, model_class, seed=1, **kwargs)
+
+
+class TestColumnarDataCollector(TestCase):
+    def test_chunks_written_to_disk_match_output_held_in_memory(self):
+        model = build()
+        model.run(30)
+        chunked = model.new_data_collector()
+        chunked.chunk_size = 7 * 50
+        chunked.set_state(
+            model.ids, model.core.node_ids, model.data_collector.get_state()
+        )
+        # only the steps of the last, partial chunk are held in memory
+        self.assertEqual(chunked.buffers["position"].shape, (7, 50))
+        self.assertEqual(chunked.flushed, 31)
+        chunked.collect(model)
+        model.data_collector.collect(model)
+        pd.testing.assert_frame_equal(
+            chunked.get_agent_vars_dataframe(),
+            model.data_collector.get_agent_vars_dataframe(),
+        )
+        self.assertEqual(len(list(chunked.chunks())), 6)
+
+    def test_columns_are_typed(self):
+        model = build()
+        model.run(3)
+        collector = model.data_collector
+        self.assertEqual(collector.column("position").dtype, np.int32)
+        self.assertEqual(collector.column("lat").dtype, np.float32)
+        self.assertEqual(collector.column("status").dtype, np.bool_)
+        self.assertEqual(collector.column("status").shape, (4, 50))
+        agents = collector.get_agent_vars_dataframe()
+        self.assertEqual(agents["highway"].dtype, pd.Int64Dtype())
+        self.assertTrue(agents["highway"].isna().any())
+
+    def test_csv_is_written_one_chunk_at_a_time(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, "run")
+            model = build(output_path=output_path)
+            model.data_collector.chunk_size = 4 * 50
+            model.run(10)
+            self.assertGreater(model.data_collector.flushed, 0)
+            written = pd.read_csv(
+                output_path + ".agent.csv",
+                index_col=["Step", "AgentID"],
+                dtype={"highway": pd.Int64Dtype()},
+            )
+            expected = model.data_collector.get_agent_vars_dataframe()
+        self.assertEqual(len(written), 11 * 50)
+        np.testing.assert_array_equal(written.index, expected.index)
+        np.testing.assert_array_equal(written["status"], expected["status"])
+        np.testing.assert_allclose(written["lat"], expected["lat"], rtol=1e-6)
+
+    def test_temporary_directory_is_removed_with_the_collector(self):
+        collector = ColumnarDataCollector({})
+        directory = collector.directory
+        self.assertTrue(os.path.isdir(directory))
+        del collector
+        self.assertFalse(os.path.exists(directory))
@@ -0,0 +1,46 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import numpy as np
+from mesacat.core import NetworkCore, ROAD
+from mesacat.tests.synthetic import grid_graph
+
+
+class TestNetworkCore(TestCase):
+    def setUp(self):
+        G = grid_graph(3, 3).to_undirected()
+        # a longer road parallel to the road between nodes 1 and 2
+        G.add_edge(1, 2, length=555, osmid=99)
+        self.G = G
+        self.core = NetworkCore.from_graph(G)
+
+    def test_nodes(self):
+        self.assertEqual(list(self.core.node_ids), list(self.G.nodes))
+        self.assertTrue(np.all(self.core.kind == ROAD))
+        self.assertEqual(self.core.x[4], self.G.nodes[5]["x"])
+
+    def test_adjacency(self):
+        core = self.core
+        for i, node in enumerate(core.node_ids):
+            neighbours = core.node_ids[
+                core.indices[core.indptr[i] : core.indptr[i + 1]]
+            ]
+            self.assertCountEqual(neighbours, list(self.G.neighbors(node)))
+
+        # the shorter of the parallel roads is used for routing
+        arc = core.arc(0, 1)
+        self.assertEqual(core.indices[arc], 1)
+        self.assertEqual(core.length[arc], 100)
+        self.assertEqual(core.length[core.arc(1, 0)], 100)
+        np.testing.assert_array_equal(
+            core.indices[core.arcs([0, 4, 8], [3, 5, 7])], [3, 5, 7]
+        )
+
+    def test_igraph(self):
+        g = self.core.to_igraph()
+        self.assertEqual(g.vcount(), len(self.G))
+        self.assertEqual(g.ecount(), self.G.number_of_edges())
+        self.assertEqual(sorted(g.es.select(_between=([0], [1]))["length"]), [100, 555])
+        self.assertEqual(g.distances(0, 8, weights="length")[0][0], 400)
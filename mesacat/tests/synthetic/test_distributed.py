@@ -0,0 +1,102 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from mesacat.distributed import DistributedEvacuationModel, partition
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.model import EvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(n, model_class, in_car=None, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    agents = random_agents(zone, n, seed=3)
+    if in_car is not None:
+        agents["in_car"] = in_car
+    return build_model(network, zone, agents, model_class, seed=1, **kwargs)
+
+
+def assert_same_output(model, other):
+    pd.testing.assert_frame_equal(
+        model.data_collector.get_model_vars_dataframe(),
+        other.data_collector.get_model_vars_dataframe(),
+    )
+    pd.testing.assert_frame_equal(
+        model.data_collector.get_agent_vars_dataframe(),
+        other.data_collector.get_agent_vars_dataframe(),
+    )
+
+
+class TestPartition(TestCase):
+    def test_regions_have_equal_weight(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(0, 1000, (2, 2000))
+        weights = rng.integers(0, 10, 2000)
+        region = partition(x, y, weights, 5)
+        self.assertEqual(set(region), set(range(5)))
+        load = np.bincount(region, weights=weights)
+        np.testing.assert_allclose(load, weights.sum() / 5, rtol=0.02)
+
+    def test_regions_are_compact(self):
+        # two clusters of points are never mixed when split in two
+        x = np.concatenate([np.arange(10), 100 + np.arange(10)])
+        region = partition(x, np.zeros(20), np.ones(20), 2)
+        np.testing.assert_array_equal(region, np.repeat([0, 1], 10))
+
+
+class TestDistributedEvacuationModel(TestCase):
+    def test_one_region_matches_vectorized_engine(self):
+        vectorized = build(50, VectorizedEvacuationModel)
+        distributed = build(50, DistributedEvacuationModel, regions=1)
+        vectorized.run(40)
+        distributed.run(40)
+        assert_same_output(vectorized, distributed)
+        self.assertEqual(distributed.handoffs, 0)
+
+    def test_agents_are_handed_between_regions(self):
+        # cars that do not meet behave exactly as in one process
+        vectorized = build(6, VectorizedEvacuationModel, in_car=True)
+        distributed = build(6, DistributedEvacuationModel, in_car=True, regions=4)
+        vectorized.run(100)
+        distributed.run(100)
+        assert_same_output(vectorized, distributed)
+        self.assertGreater(distributed.handoffs, 0)
+        self.assertIsNone(distributed.connections)
+
+    def test_every_agent_finishes(self):
+        model = build(200, DistributedEvacuationModel, regions=3)
+        model.run(1000)
+        self.assertTrue(model.finished())
+        self.assertEqual(
+            model.data_collector.model_vars["evacuated"][-1]
+            + model.data_collector.model_vars["stranded"][-1],
+            200,
+        )
+
+    def test_checkpoint(self):
+        model = build(50, DistributedEvacuationModel, regions=3)
+        model.run(20)
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, "checkpoint.npz")
+            model.save_checkpoint(file)
+            model.run(20)
+            restored = EvacuationModel.from_checkpoint(file, model.network.base)
+        restored.run(20)
+        self.assertEqual(restored.regions, 3)
+        assert_same_output(model, restored)
+
+    def test_rerouting_is_not_supported(self):
+        with self.assertRaises(ValueError):
+            build(6, DistributedEvacuationModel, reroute_interval=3)
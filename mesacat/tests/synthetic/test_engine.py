@@ -0,0 +1,104 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(agents, model_class=None, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    return build_model(network, zone, agents(zone), model_class, **kwargs)
+
+
+class TestVectorizedEvacuationModel(TestCase):
+    def test_matches_agents_that_do_not_meet(self):
+        def cars(zone):
+            agents = random_agents(zone, 6, seed=3)
+            agents["in_car"] = True
+            return agents
+
+        objects = build(cars)
+        arrays = build(cars, VectorizedEvacuationModel)
+        for model in (objects, arrays):
+            model.data_collector.collect(model)
+            for _ in range(15):
+                model.step()
+
+        # the object model records agents in the order they were activated
+        expected = objects.data_collector.get_agent_vars_dataframe().sort_index()
+        result = arrays.data_collector.get_agent_vars_dataframe()
+        pd.testing.assert_frame_equal(result, expected)
+        pd.testing.assert_frame_equal(
+            arrays.data_collector.get_model_vars_dataframe(),
+            objects.data_collector.get_model_vars_dataframe(),
+        )
+
+    def test_agents_queue_behind_each_other(self):
+        model = build(lambda zone: random_agents(zone, 2000), VectorizedEvacuationModel)
+        blocked = 0
+        for _ in range(30):
+            model.step()
+            blocked += model.blocked.sum()
+            # agents held up on the same road queue one behind the other
+            arc = model.arc
+            held = model.blocked & (model.distance_along_edge > 0)
+            keys = pd.DataFrame(
+                {
+                    "arc": arc[held],
+                    "in_car": model.in_car[held],
+                    "distance": model.distance_along_edge[held],
+                }
+            )
+            self.assertFalse(keys.duplicated().any())
+        self.assertGreater(blocked, 0)
+        self.assertGreater(model.evacuated.sum(), 0)
+
+    def test_output_files(self):
+        with tempfile.TemporaryDirectory() as dir:
+            output_path = os.path.join(dir, "run")
+            model = build(
+                lambda zone: random_agents(zone, 50),
+                VectorizedEvacuationModel,
+                output_path=output_path,
+            )
+            self.assertEqual(len(model.run(5)), 6)
+            agents = model.data_collector.get_agent_vars_dataframe()
+            self.assertEqual(len(agents), 6 * 50)
+            written = pd.read_csv(output_path + ".agent.csv")
+            self.assertEqual(
+                list(written.columns),
+                [
+                    "Step",
+                    "AgentID",
+                    "position",
+                    "lat",
+                    "lon",
+                    "highway",
+                    "reroute_count",
+                    "status",
+                    "in_car",
+                ],
+            )
+            self.assertEqual(
+                list(pd.read_csv(output_path + ".model.csv", index_col=0).columns),
+                [
+                    "time",
+                    "evacuated",
+                    "stranded",
+                    "evacuation_time_p50",
+                    "evacuation_time_p90",
+                ],
+            )
@@ -0,0 +1,107 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase, mock
+from datetime import time
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame
+from mesacat import model as evacuation_model
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.ensemble import Ensemble, summarise
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def network():
+    return Network(grid_graph(20, 20).to_undirected())
+
+
+class TestEnsemble(TestCase):
+    def setUp(self):
+        self.zone = between_nodes(network(), 0.27, 0.73)
+        self.agents = random_agents(self.zone, 50)
+        patcher = mock.patch.object(
+            evacuation_model, "generate_agents", return_value=self.agents
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ensemble(self, **kwargs):
+        return Ensemble(
+            self.zone,
+            GeoDataFrame(geometry=[self.zone], crs="EPSG:4326"),
+            "",
+            time(hour=8),
+            len(self.agents),
+            network=network(),
+            model_class=VectorizedEvacuationModel,
+            **kwargs,
+        )
+
+    def test_replicates(self):
+        ensemble = self.ensemble()
+        # the targets are added once, before any replicate is built
+        self.assertIsNotNone(ensemble.network.target_zone)
+
+        runs = ensemble.replicates(4, seed=1, processes=2, steps=30)
+        self.assertEqual(list(runs.index.unique("replicate")), [0, 1, 2, 3])
+        self.assertEqual(runs.loc[0].index[0], 0)
+        # the agents were added to copies of the shared overlay
+        added = ensemble.network.added_nodes
+        self.assertEqual(len(added), len(ensemble.network.targets))
+
+        # the same seed gives the same replicates, and the replicates differ
+        again = self.ensemble().replicates(4, seed=1, processes=2, steps=30)
+        pd.testing.assert_frame_equal(runs, again)
+        self.assertEqual(runs.seed.groupby(level="replicate").nunique().max(), 1)
+        self.assertEqual(runs.groupby(level="replicate").seed.first().nunique(), 4)
+        self.assertFalse(
+            np.array_equal(runs.loc[0].evacuated.values, runs.loc[1].evacuated.values)
+        )
+
+        # each replicate can be reproduced on its own from its seed
+        seed = int(runs.loc[3].seed.iloc[0])
+        model = build_model(
+            network(),
+            self.zone,
+            self.agents,
+            VectorizedEvacuationModel,
+            seed=seed,
+        )
+        model.run(30)
+        np.testing.assert_array_equal(
+            model.data_collector.model_vars["evacuated"], runs.loc[3].evacuated.values
+        )
+
+    def test_summary(self):
+        summary = self.ensemble(time_step=5).run(3, seed=2, processes=1, steps=40)
+        self.assertEqual(summary.index[0], 0)
+        np.testing.assert_allclose(np.diff(summary.index), 5)
+        for name in ("evacuated", "stranded"):
+            self.assertTrue((summary[name + "_lower"] <= summary[name]).all())
+            self.assertTrue((summary[name] <= summary[name + "_upper"]).all())
+        self.assertGreater(summary.evacuated.iloc[-1], 0)
+
+    def test_summarise_holds_the_last_count(self):
+        runs = pd.DataFrame(
+            {
+                "replicate": [0, 0, 0, 1, 1],
+                "step": [0, 1, 2, 0, 1],
+                "seed": 0,
+                "time": [0, 10, 20, 0, 10],
+                "evacuated": [0, 2, 4, 0, 4],
+                "stranded": [1, 1, 1, 0, 0],
+            }
+        ).set_index(["replicate", "step"])
+        summary = summarise(runs, interval=5)
+        self.assertEqual(list(summary.index), [0, 5, 10, 15, 20])
+        np.testing.assert_allclose(summary.evacuated, [0, 0, 3, 3, 4])
+        np.testing.assert_allclose(summary.stranded, [0.5] * 5)
+        self.assertTrue(np.isfinite(summary.evacuated_lower).all())
@@ -0,0 +1,73 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.events import EventDrivenEvacuationModel
+from mesacat.network import Network
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(agents, model_class, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    return build_model(network, zone, agents(zone), model_class, **kwargs)
+
+
+def cars(zone):
+    agents = random_agents(zone, 6, seed=3)
+    agents["in_car"] = True
+    return agents
+
+
+class TestEventDrivenEvacuationModel(TestCase):
+    def test_matches_ticks_for_agents_that_do_not_meet(self):
+        ticks = build(cars, VectorizedEvacuationModel)
+        events = build(cars, EventDrivenEvacuationModel)
+        for model in (ticks, events):
+            model.data_collector.collect(model)
+            for _ in range(15):
+                model.step()
+
+        pd.testing.assert_frame_equal(
+            events.data_collector.get_agent_vars_dataframe(),
+            ticks.data_collector.get_agent_vars_dataframe(),
+        )
+        # and knows when each agent arrived to within the tick
+        seconds = 10 * np.argmax(ticks.data_collector.column("status"), axis=0)
+        evacuated = events.evacuated
+        self.assertTrue(evacuated.any())
+        np.testing.assert_array_less(
+            events.evacuation_time[evacuated], seconds[evacuated] + 1e-9
+        )
+        np.testing.assert_array_less(
+            seconds[evacuated] - 10, events.evacuation_time[evacuated]
+        )
+
+    def test_agents_leave_a_road_in_the_order_they_entered_it(self):
+        model = build(cars, EventDrivenEvacuationModel)
+        # put a second car on the road of the first, just behind it
+        a, b = 0, 1
+        for array in (model.route_start, model.route_length, model.route_index):
+            array[b] = array[a]
+        model.enter(b, model.entered[a] + 0.1)
+        self.assertGreaterEqual(model.arrival[b], model.arrival[a] + 1 / (48 / 3.6))
+
+    def test_quiet_periods_are_skipped(self):
+        model = build(lambda zone: random_agents(zone, 200), EventDrivenEvacuationModel)
+        for _ in range(400):
+            model.step()
+        self.assertTrue((model.evacuated | model.stranded).all())
+        self.assertEqual(model.events, [])
+
+    def test_rerouting_is_not_supported(self):
+        with self.assertRaises(ValueError):
+            build(cars, EventDrivenEvacuationModel, reroute_interval=5)
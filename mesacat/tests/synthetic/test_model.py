@@ -0,0 +1,187 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase, mock
+from datetime import time
+import os
+import numpy as np
+from geopandas import GeoDataFrame, GeoSeries
+from shapely.geometry import Point, box
+from mesacat import model as evacuation_model
+from mesacat import network as evacuation_network
+from mesacat.network import Network, NetworkOverlay
+from mesacat.core import NetworkCore
+from mesacat.cache import ALL_BUILDINGS_TAGS
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+population_data = os.path.join(
+    os.path.dirname(__file__), "..", "newcastle", "population_data"
+)
+
+
+class TestEvacuationModel(TestCase):
+    def test_agent_connector_lengths(self):
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(network, zone, random_agents(zone, 50))
+
+        for u, v, length in model.G.edges(data="length"):
+            if "agent-start-pos" not in str(u) + str(v):
+                continue
+            points = GeoSeries(
+                [Point(model.G.nodes[n]["x"], model.G.nodes[n]["y"]) for n in (u, v)],
+                crs="EPSG:4326",
+            ).to_crs("EPSG:27700")
+            self.assertAlmostEqual(length, points.iloc[0].distance(points.iloc[1]))
+
+    def test_network_is_built_once(self):
+        G = grid_graph(10, 10)
+        network = Network(G.to_undirected())
+        zone = between_nodes(network, 0.05, 0.95)
+
+        def features_from_polygon(domain, tags):
+            # a non-residential building in addition to the residential ones
+            corners = (0.2, 0.45, 0.7) if tags == ALL_BUILDINGS_TAGS else (0.2, 0.45)
+            return GeoDataFrame(
+                {"osmid": range(len(corners))},
+                geometry=[between_nodes(network, a, a + 0.1) for a in corners],
+                crs="EPSG:4326",
+            )
+
+        evacuation_zone = GeoDataFrame(geometry=[zone], crs="EPSG:4326")
+
+        with mock.patch(
+            "osmnx.graph_from_polygon", return_value=G
+        ) as graph_from_polygon, mock.patch(
+            "osmnx.features_from_polygon", side_effect=features_from_polygon
+        ), mock.patch.object(
+            NetworkCore, "from_graph", wraps=NetworkCore.from_graph
+        ) as from_graph, mock.patch.object(
+            evacuation_network, "cKDTree", wraps=evacuation_network.cKDTree
+        ) as kd_tree:
+            model = evacuation_model.EvacuationModel(
+                None, zone, evacuation_zone, population_data, time(hour=8), 20
+            )
+
+        self.assertEqual(graph_from_polygon.call_count, 1)
+        self.assertEqual(from_graph.call_count, 1)
+        self.assertEqual(kd_tree.call_count, 1)
+        self.assertIs(model.igraph, model.network.igraph)
+
+        # the network is shared, not changed, by the model
+        base = model.network.base
+        self.assertEqual(len(base.G), len(G))
+        other = build_model(base, zone, random_agents(zone, 5))
+        self.assertEqual(len(other.G), len(base.G) + len(other.targets) + 5)
+
+    def test_shared_overlay(self):
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        overlay = NetworkOverlay(network)
+        overlay.add_targets(zone)
+
+        # the targets of the overlay are reused for the same zone
+        model = build_model(overlay, zone, random_agents(zone, 20))
+        again = build_model(overlay, zone, random_agents(zone, 20, seed=1))
+        self.assertIs(model.targets, overlay.targets)
+        self.assertIs(again.targets, overlay.targets)
+        self.assertEqual(len(overlay.added_nodes), len(overlay.targets))
+        self.assertEqual(len(again.G), len(model.G))
+
+        with self.assertRaises(ValueError):
+            other = between_nodes(network, 0.2, 0.6)
+            build_model(overlay, other, random_agents(other, 5))
+        with self.assertRaises(ValueError):
+            build_model(model.network, zone, random_agents(zone, 5))
+
+    def test_targets_on_the_same_road(self):
+        network = Network(grid_graph(4, 4).to_undirected())
+        nodes = network.nodes
+        x1, x2, y = nodes.x[9], nodes.x[10], nodes.y[9]
+        # a zone crossing the road between nodes 9 and 10 twice
+        zone = box(x1 + (x2 - x1) * 0.3, y - 0.0001, x1 + (x2 - x1) * 0.6, y + 0.0001)
+        road_length = network.G.edges[9, 10, 0]["length"]
+
+        model = build_model(network, zone, random_agents(zone, 5))
+
+        G = model.G
+        self.assertFalse(G.has_edge(9, 10))
+        self.assertEqual(sorted(G.neighbors("target1"), key=str), [9, "target0"])
+        self.assertEqual(sorted(G.neighbors("target0"), key=str), [10, "target1"])
+        lengths = [
+            G.edges[u, v, 0]["length"]
+            for u, v in ((9, "target1"), ("target1", "target0"), ("target0", 10))
+        ]
+        self.assertAlmostEqual(sum(lengths), road_length, delta=1)
+        self.assertEqual(model.igraph.ecount(), G.number_of_edges())
+        self.assertEqual(len(model.edges), G.number_of_edges())
+        names = model.igraph.vs["_nx_name"]
+        for edge in model.igraph.es:
+            u, v = names[edge.source], names[edge.target]
+            key = edge["_nx_multiedge_key"]
+            self.assertEqual(edge["length"], G.edges[u, v, key]["length"])
+
+    def test_view_without_agent_start_positions(self):
+        network = Network(grid_graph(6, 6).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(network, zone, random_agents(zone, 10))
+
+        view = model.G_without_agent_start_pos
+        self.assertEqual(len(view), len(model.G) - 10)
+        self.assertEqual(view.number_of_edges(), model.G.number_of_edges() - 10)
+        self.assertFalse(any(str(n).startswith("agent-start-pos") for n in view))
+
+    def test_congestion_rerouting(self):
+        network = Network(grid_graph(12, 12).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(
+            network,
+            zone,
+            random_agents(zone, 500),
+            reroute_interval=3,
+            congestion_penalty=100,
+        )
+        for _ in range(30):
+            model.step()
+
+        core = model.core
+        self.assertGreater(sum(a.reroute_count for a in model.schedule.agents), 0)
+        for a in model.schedule.agents:
+            if a.reroute_count == 0:
+                continue
+            # the new route is connected and still ends at a target
+            arcs = core.arcs(a.route[:-1], a.route[1:])
+            np.testing.assert_array_equal(core.tail[arcs], a.route[:-1])
+            np.testing.assert_array_equal(core.indices[arcs], a.route[1:])
+            self.assertIn(a.route[-1], model.target_idx)
+
+    def test_no_rerouting_by_default(self):
+        network = Network(grid_graph(12, 12).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(network, zone, random_agents(zone, 200))
+        for _ in range(10):
+            model.step()
+        self.assertEqual(sum(a.reroute_count for a in model.schedule.agents), 0)
+
+    def test_parallel_routes_match_serial(self):
+        models = []
+        for processes in (None, 2):
+            network = Network(grid_graph(10, 10).to_undirected())
+            zone = between_nodes(network, 0.27, 0.73)
+            models.append(
+                build_model(
+                    network, zone, random_agents(zone, 100), processes=processes
+                )
+            )
+        serial, parallel = models
+        for a, b in zip(serial.schedule.agents, parallel.schedule.agents):
+            self.assertEqual(a.unique_id, b.unique_id)
+            np.testing.assert_array_equal(a.route, b.route)
+            self.assertEqual((a.lat, a.lon), (b.lat, b.lon))
+            self.assertEqual(a.stranded, b.stranded)
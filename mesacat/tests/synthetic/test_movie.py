@@ -0,0 +1,81 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+import matplotlib.pyplot as plt
+import numpy as np
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.utils import MovieFrames, MovieRenderer, create_movie, read_model
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class TestMovie(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.output_path = os.path.join(directory.name, "run")
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(
+            network,
+            zone,
+            random_agents(zone, 30, seed=3),
+            VectorizedEvacuationModel,
+            seed=1,
+            output_path=self.output_path,
+        )
+        model.run(40)
+
+    def test_frames_match_agent_output_file(self):
+        frames = MovieFrames(self.output_path)
+        agent_df, model_df, *_, target_nodes = read_model(self.output_path)
+        self.assertEqual(len(frames.titles), len(model_df))
+        for step in model_df.index:
+            agents_at_step = agent_df.loc[[step]]
+            evacuated_agents = agents_at_step[agents_at_step.status == 1]
+            occupants = (
+                target_nodes.set_axis(target_nodes.index.astype(str))
+                .join(evacuated_agents.position.value_counts().rename("occupants"))
+                .occupants.fillna(0)
+                .values
+            )
+            np.testing.assert_array_equal(frames.occupants[step], occupants)
+            np.testing.assert_allclose(frames.lon[step], agents_at_step.lon, rtol=1e-6)
+            np.testing.assert_array_equal(frames.in_car[step], agents_at_step.in_car)
+        self.assertGreater(frames.occupants[-1].sum(), 0)
+
+        # output written before trajectories gives the same frames
+        shutil.rmtree(self.output_path + ".trajectory")
+        legacy = MovieFrames(self.output_path)
+        np.testing.assert_array_equal(legacy.occupants, frames.occupants)
+        np.testing.assert_allclose(legacy.lat, frames.lat, rtol=1e-6)
+        self.assertEqual(legacy.titles, frames.titles)
+
+    def test_frame_drawn_over_background_matches_whole_figure(self):
+        renderer = MovieRenderer(MovieFrames(self.output_path))
+        self.addCleanup(plt.close, renderer.figure)
+        frame = np.array(renderer.render(20))
+        width, height = renderer.size
+        self.assertEqual(frame.shape, (height, width, 4))
+
+        for artist in (renderer.agents, renderer.targets, renderer.title):
+            artist.set_animated(False)
+        renderer.canvas.draw()
+        np.testing.assert_array_equal(frame, np.asarray(renderer.canvas.buffer_rgba()))
+
+    @skipUnless(shutil.which(plt.rcParams["animation.ffmpeg_path"]), "needs FFmpeg")
+    def test_segments_are_joined(self):
+        out_path = os.path.join(self.directory, "run.mp4")
+        create_movie(self.output_path, out_path, processes=3)
+        self.assertGreater(os.path.getsize(out_path), 0)
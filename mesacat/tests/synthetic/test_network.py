@@ -0,0 +1,85 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import numpy as np
+from mesacat.network import Network, NetworkOverlay
+from mesacat.core import AGENT_START
+from mesacat.tests.synthetic import grid_graph, between_nodes
+
+
+class TestNetwork(TestCase):
+    def assertConsistent(self, network: Network | NetworkOverlay):
+        G = network.G
+        self.assertEqual(list(G.nodes), list(network.nodes.index))
+        self.assertEqual(network.igraph.vs["_nx_name"], list(network.nodes.index))
+        self.assertEqual(network.igraph.ecount(), G.number_of_edges())
+        self.assertEqual(len(network.edges), G.number_of_edges())
+
+        names = network.igraph.vs["_nx_name"]
+        table = {
+            tuple(sorted(map(str, (u, v)))) + (k,): length
+            for (u, v, k), length in network.edges["length"].items()
+        }
+        for edge in network.igraph.es:
+            u, v = names[edge.source], names[edge.target]
+            key = edge["_nx_multiedge_key"]
+            self.assertEqual(edge["length"], G.edges[u, v, key]["length"])
+            self.assertEqual(
+                edge["length"], table[tuple(sorted(map(str, (u, v)))) + (key,)]
+            )
+
+    def test_add_and_remove(self):
+        base = Network(grid_graph(3, 3).to_undirected())
+        self.assertConsistent(base)
+        network = NetworkOverlay(base)
+        self.assertConsistent(network)
+
+        network.add_nodes(
+            ["a", "b"], np.array([-1.6, -1.61]), np.array([54.9, 54.91]), 1, AGENT_START
+        )
+        network.add_edges([("a", 1), ("b", "a")], [10.0, 20.0], [{}, {"osmid": 5}])
+        network.remove_edges([(1, 2, 0), (5, 6, 0)])
+        self.assertConsistent(network)
+        self.assertFalse(network.G.has_edge(1, 2))
+        self.assertEqual(network.to_core().n_nodes, 11)
+
+        # the base network is unchanged
+        self.assertConsistent(base)
+        self.assertTrue(base.G.has_edge(1, 2))
+        self.assertEqual(len(base.G), 9)
+
+    def test_remove_parallel_edge(self):
+        network = NetworkOverlay(Network(grid_graph(3, 3).to_undirected()))
+        network.add_edges([(1, 2)], [555.0], [{}])
+        self.assertEqual(list(network.added_edges.index), [(1, 2, 1)])
+        network.remove_edges([(1, 2, 0)])
+        self.assertConsistent(network)
+        self.assertEqual(
+            network.igraph.es.select(_between=([0], [1]))["length"], [555.0]
+        )
+
+        # an added edge can be removed again
+        network.remove_edges([(2, 1, 1)])
+        self.assertConsistent(network)
+        self.assertFalse(network.G.has_edge(1, 2))
+
+    def test_overlays_share_a_base_network(self):
+        base = Network(grid_graph(6, 6).to_undirected())
+        small = NetworkOverlay(base)
+        small.add_targets(between_nodes(base, 0.3, 0.5))
+        large = NetworkOverlay(base)
+        large.add_targets(between_nodes(base, 0.1, 0.9))
+        for network in (small, large):
+            self.assertConsistent(network)
+        self.assertNotEqual(len(small.targets), len(large.targets))
+        self.assertEqual(base.G.number_of_edges(), 60)
+
+        # a copy can be changed without changing the original
+        copy = small.copy()
+        copy.add_nodes(["a"], np.array([-1.6]), np.array([54.9]), 1, AGENT_START)
+        copy.add_edges([("a", 1)], [10.0], [{}])
+        self.assertConsistent(copy)
+        self.assertConsistent(small)
+        self.assertEqual(len(copy.G), len(small.G) + 1)
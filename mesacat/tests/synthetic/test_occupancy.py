@@ -0,0 +1,67 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import numpy as np
+from mesacat.network import Network
+from mesacat.occupancy import EdgeOccupancy
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class TestEdgeOccupancy(TestCase):
+    def test_leader(self):
+        occupancy = EdgeOccupancy()
+        occupancy.add(1, (0, False), 10)
+        occupancy.add(2, (0, False), 30)
+        occupancy.add(3, (0, False), 20)
+        # other directions and modes do not hold an agent up
+        occupancy.add(4, (0, True), 15)
+        occupancy.add(5, (1, False), 15)
+
+        self.assertEqual(occupancy.leader(1), 20)
+        self.assertEqual(occupancy.leader(3), 30)
+        self.assertIsNone(occupancy.leader(2))
+        self.assertIsNone(occupancy.leader(4))
+
+        occupancy.move(3, 40)
+        self.assertEqual(occupancy.leader(1), 30)
+        occupancy.remove(2)
+        self.assertEqual(occupancy.leader(1), 40)
+        occupancy.remove(3)
+        self.assertIsNone(occupancy.leader(1))
+
+    def test_agents_level_with_each_other_are_not_ahead(self):
+        occupancy = EdgeOccupancy()
+        occupancy.add(1, (0, False))
+        occupancy.add(2, (0, False))
+        self.assertIsNone(occupancy.leader(1))
+        self.assertIsNone(occupancy.leader(2))
+
+    def test_counts(self):
+        occupancy = EdgeOccupancy()
+        occupancy.add(1, (0, False))
+        occupancy.add(2, (0, True))
+        occupancy.add(3, (2, True))
+        np.testing.assert_array_equal(occupancy.counts(3), [2, 0, 1])
+
+    def test_model_keeps_occupancy_up_to_date(self):
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(network, zone, random_agents(zone, 300))
+        for _ in range(20):
+            model.step()
+            on_road = [
+                a for a in model.schedule.agents if not (a.evacuated or a.stranded)
+            ]
+            self.assertEqual(len(model.edge_occupancy.entries), len(on_road))
+            for a in on_road:
+                self.assertEqual(
+                    model.edge_occupancy.entries[a.unique_id],
+                    (a.edge(), a.distance_along_edge),
+                )
@@ -0,0 +1,132 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+from mesacat.core import NetworkCore
+from mesacat.routing import ExitField, Route, RoutingIndex
+from mesacat.tests.synthetic import grid_graph
+
+
+class TestExitField(TestCase):
+    def setUp(self):
+        G = grid_graph(5, 5).to_undirected()
+        # an isolated node that cannot reach any target
+        G.add_node(100, x=0, y=0)
+        self.core = NetworkCore.from_graph(G)
+        self.targets = np.array([0, 24])
+        self.field = ExitField(self.core, self.targets)
+
+    def test_distance_matches_dijkstra_per_node(self):
+        g = self.core.to_igraph()
+        expected = np.min(g.distances(target=self.targets, weights="length"), axis=1)
+        np.testing.assert_allclose(self.field.distance, expected)
+
+    def test_routes_follow_next_hops_to_the_nearest_exit(self):
+        for source in range(25):
+            route = self.field.route(source)
+            self.assertEqual(route[-1], self.field.exit[source])
+            self.assertIn(route[-1], self.targets)
+            length = self.core.length[self.core.arcs(route[:-1], route[1:])].sum()
+            self.assertAlmostEqual(length, self.field.distance[source])
+
+    def test_unreachable(self):
+        isolated = self.core.n_nodes - 1
+        self.assertTrue(np.isinf(self.field.distance[isolated]))
+        self.assertEqual(self.field.exit[isolated], -1)
+        self.assertEqual(list(self.field.route(isolated)), [isolated])
+        self.assertEqual(self.field.as_dataframe().exit.loc[100], None)
+
+    def test_increased_costs_are_repaired_like_a_full_search(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            cost = self.field.cost.copy()
+            edges = rng.choice(np.flatnonzero(self.core.tail < self.core.indices), 6)
+            cost[edges] += rng.uniform(0, 500, 6)
+            cost[self.core.reverse[edges]] = cost[edges]
+            self.field.update(cost)
+            expected = ExitField(self.core, self.targets, cost)
+            np.testing.assert_allclose(self.field.distance, expected.distance)
+            np.testing.assert_array_equal(self.field.exit >= 0, expected.exit >= 0)
+            for source in range(25):
+                route = self.field.route(source)
+                self.assertEqual(route[-1], self.field.exit[source])
+                length = cost[self.core.arcs(route[:-1], route[1:])].sum()
+                self.assertAlmostEqual(length, expected.distance[source])
+
+    def test_decreased_costs_are_searched_again(self):
+        cost = self.core.length * 2
+        field = ExitField(self.core, self.targets, cost)
+        field.update(self.core.length)
+        np.testing.assert_allclose(field.distance, self.field.distance)
+
+
+class TestRoutingIndex(TestCase):
+    def setUp(self):
+        G = grid_graph(5, 5).to_undirected()
+        G.add_node(100, x=0, y=0)
+        self.core = NetworkCore.from_graph(G)
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.dir.name, "routes.npz")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_matches_igraph(self):
+        g = self.core.to_igraph()
+        routes = RoutingIndex(self.core)
+        for origin, destination in [(0, 24), (3, 20), (12, 12), (7, 25)]:
+            expected = g.distances(origin, destination, weights="length")[0][0]
+            self.assertEqual(routes.distance(origin, destination), expected)
+            path = routes.path(origin, destination)
+            if np.isinf(expected):
+                self.assertEqual(path, [])
+                continue
+            self.assertEqual(path[0], origin)
+            self.assertEqual(path[-1], destination)
+            length = self.core.length[self.core.arcs(path[:-1], path[1:])].sum()
+            self.assertAlmostEqual(length, expected)
+
+    def test_saved_trees_are_reused(self):
+        routes = RoutingIndex(self.core, self.file)
+        routes.precompute([0, 5, 10])
+        routes.save()
+
+        loaded = RoutingIndex(self.core, self.file)
+        self.assertEqual(list(loaded.trees), [0, 5, 10])
+        self.assertEqual(loaded.path(5, 24), routes.path(5, 24))
+        self.assertFalse(loaded.modified)
+
+        # trees saved for another network are ignored
+        other = NetworkCore.from_graph(grid_graph(3, 3).to_undirected())
+        self.assertEqual(len(RoutingIndex(other, self.file).trees), 0)
+
+    def test_least_recently_used_trees_are_dropped(self):
+        routes = RoutingIndex(self.core, max_trees=2)
+        routes.tree(0)
+        routes.tree(1)
+        routes.tree(0)
+        routes.tree(2)
+        self.assertEqual(list(routes.trees), [0, 2])
+
+
+class TestRoute(TestCase):
+    def test_arrays(self):
+        core = NetworkCore.from_graph(grid_graph(5, 5).to_undirected())
+        nodes = ExitField(core, np.array([24])).route(0)
+        route = Route(core, nodes)
+
+        self.assertEqual(len(route), len(nodes))
+        np.testing.assert_array_equal(np.asarray(route), nodes)
+        np.testing.assert_array_equal(route[1:], nodes[1:])
+        for i in range(len(nodes) - 1):
+            arc = core.arc(nodes[i], nodes[i + 1])
+            self.assertEqual(route.arcs[i], arc)
+            self.assertEqual(route.length[i], core.length[arc])
+            self.assertEqual(route.osmid[i], core.osmid[arc])
+        np.testing.assert_allclose(route.distance, [0, *np.cumsum(route.length)])
+        np.testing.assert_array_equal(route.x, core.x[nodes])
+        np.testing.assert_array_equal(route.y, core.y[nodes])
@@ -0,0 +1,75 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+from mesa import Agent, Model
+from mesacat.network import Network
+from mesacat.scheduler import ActiveSetActivation
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class Walker(Agent):
+    def __init__(self, unique_id, model, departure_time, steps_to_evacuate):
+        super().__init__(unique_id, model)
+        self.departure_time = departure_time
+        self.steps_to_evacuate = steps_to_evacuate
+        self.steps = 0
+        self.evacuated = False
+        self.stranded = False
+
+    def step(self):
+        self.steps += 1
+        self.evacuated = self.steps == self.steps_to_evacuate
+
+
+class Clock(Model):
+    def __init__(self):
+        super().__init__()
+        self.seconds_elapsed = 0
+        self.schedule = ActiveSetActivation(self)
+
+    def step(self):
+        self.schedule.step()
+        self.seconds_elapsed += 10
+
+
+class TestActiveSetActivation(TestCase):
+    def test_agents_wake_at_departure_and_leave_when_evacuated(self):
+        model = Clock()
+        agents = [
+            Walker(0, model, 0, 2),
+            Walker(1, model, 15, 1),
+            Walker(2, model, 30, 3),
+        ]
+        for a in agents:
+            model.schedule.add(a)
+
+        active = []
+        for _ in range(7):
+            model.step()
+            active.append(sorted(a.unique_id for a in model.schedule.active))
+        # agent 1 sets off at 20 s and evacuates in the same step
+        self.assertEqual(active, [[0], [], [], [2], [2], [], []])
+        # each agent is stepped until it evacuates and never again
+        self.assertEqual([a.steps for a in agents], [2, 1, 3])
+        self.assertEqual(len(model.schedule.agents), 3)
+
+    def test_model_only_steps_moving_agents(self):
+        network = Network(grid_graph(10, 10).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        model = build_model(network, zone, random_agents(zone, 200))
+        for _ in range(40):
+            departed = model.seconds_elapsed
+            model.step()
+            expected = {
+                a.unique_id
+                for a in model.schedule.agents
+                if a.departure_time <= departed and not (a.evacuated or a.stranded)
+            }
+            self.assertEqual({a.unique_id for a in model.schedule.active}, expected)
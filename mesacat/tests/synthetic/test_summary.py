@@ -0,0 +1,103 @@
+import sys
+
+sys.path.append("..")
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.events import EventDrivenEvacuationModel
+from mesacat.model import EvacuationModel
+from mesacat.network import Network
+from mesacat.summary import P2Quantile
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(n, model_class, in_car=None, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    agents = random_agents(zone, n, seed=3)
+    if in_car is not None:
+        agents["in_car"] = in_car
+    return build_model(network, zone, agents, model_class, seed=1, **kwargs)
+
+
+class TestP2Quantile(TestCase):
+    def test_estimates_quantiles_of_a_stream(self):
+        values = np.random.default_rng(0).gamma(2, 300, 20000)
+        for p in (0.5, 0.9, 0.95):
+            sketch = P2Quantile(p)
+            for x in values.tolist():
+                sketch.add(x)
+            self.assertAlmostEqual(
+                sketch.value, np.quantile(values, p), delta=0.02 * values.std()
+            )
+
+    def test_is_exact_for_few_values(self):
+        sketch = P2Quantile(0.5)
+        self.assertTrue(np.isnan(sketch.value))
+        for x in (5, 1, 4):
+            sketch.add(x)
+        self.assertEqual(sketch.value, 4)
+
+
+class TestSummary(TestCase):
+    def test_counts_match_the_agents(self):
+        model = build(200, VectorizedEvacuationModel)
+        model.run(60)
+        summary = model.summary
+        self.assertEqual(summary.evacuated, model.evacuated.sum())
+        self.assertEqual(summary.stranded, model.stranded.sum())
+        self.assertGreater(summary.evacuated, 0)
+        self.assertEqual(summary.target_arrivals.sum(), summary.evacuated)
+        # every node an agent passes is the end of an arc it travelled
+        self.assertEqual(summary.edge_traversals.sum(), model.route_index.sum())
+        for agent_type, stats in summary.evacuation_time_by_type.items():
+            self.assertEqual(
+                stats.count, (model.evacuated & (model.agent_type == agent_type)).sum()
+            )
+
+    def test_object_and_array_models_agree(self):
+        # cars that do not meet behave the same in both models
+        objects = build(6, EvacuationModel, in_car=True)
+        arrays = build(6, VectorizedEvacuationModel, in_car=True)
+        for model in (objects, arrays):
+            model.run(100)
+        self.assertEqual(objects.summary.to_dict(), arrays.summary.to_dict())
+        np.testing.assert_array_equal(
+            objects.summary.edge_traversals, arrays.summary.edge_traversals
+        )
+
+    def test_event_driven_model_counts_exact_times(self):
+        model = build(100, EventDrivenEvacuationModel)
+        model.run(200)
+        times = model.evacuation_time[model.evacuated]
+        stats = model.summary.evacuation_time
+        self.assertEqual(stats.count, len(times))
+        self.assertAlmostEqual(stats.total / stats.count, times.mean())
+        self.assertEqual(stats.max, times.max())
+
+    def test_summary_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, "run")
+            model = build(50, VectorizedEvacuationModel, output_path=output_path)
+            model.run(1000)
+            with open(output_path + ".summary.json") as f:
+                summary = json.load(f)
+        self.assertEqual(summary["agents"], 50)
+        self.assertEqual(summary["evacuated"] + summary["stranded"], 50)
+        self.assertEqual(sum(summary["target_arrivals"].values()), 50)
+        self.assertEqual(
+            summary["evacuation_time"]["p50"],
+            model.data_collector.model_vars["evacuation_time_p50"][-1],
+        )
+        self.assertLessEqual(
+            summary["evacuation_time"]["p50"], summary["evacuation_time"]["p90"]
+        )
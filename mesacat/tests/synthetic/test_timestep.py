@@ -0,0 +1,110 @@
+import sys
+
+sys.path.append("..")
+
+from unittest import TestCase
+import numpy as np
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.events import EventDrivenEvacuationModel
+from mesacat.model import EvacuationModel
+from mesacat.network import Network
+from mesacat.timestep import AdaptiveTimeStep, EvacuatedFraction, NoMovement
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+def build(n, model_class=None, in_car=None, **kwargs):
+    network = Network(grid_graph(20, 20).to_undirected())
+    zone = between_nodes(network, 0.27, 0.73)
+    agents = random_agents(zone, n, seed=3)
+    if in_car is not None:
+        agents["in_car"] = in_car
+    return build_model(network, zone, agents, model_class, **kwargs)
+
+
+class TestTimeStep(TestCase):
+    def test_distance_per_step_follows_time_step(self):
+        for model_class in (EvacuationModel, VectorizedEvacuationModel):
+            short = build(6, model_class, in_car=True, time_step=5)
+            long = build(6, model_class, in_car=True, time_step=10)
+            for _ in range(2):
+                short.step()
+            long.step()
+            self.assertEqual(short.seconds_elapsed, long.seconds_elapsed)
+            np.testing.assert_allclose(short.data_collector.model_vars["time"], [5, 10])
+            if model_class is EvacuationModel:
+                key = lambda a: (a.route_index, a.distance_along_edge)
+                short_state = sorted(key(a) for a in short.schedule.agents)
+                long_state = sorted(key(a) for a in long.schedule.agents)
+                np.testing.assert_allclose(short_state, long_state)
+            else:
+                np.testing.assert_array_equal(short.route_index, long.route_index)
+                np.testing.assert_allclose(
+                    short.distance_along_edge, long.distance_along_edge
+                )
+
+    def test_run_stops_when_everyone_has_evacuated(self):
+        for model_class in (
+            EvacuationModel,
+            VectorizedEvacuationModel,
+            EventDrivenEvacuationModel,
+        ):
+            model = build(6, model_class, in_car=True)
+            model.run(1000)
+            self.assertTrue(model.finished())
+            self.assertLess(model.schedule.steps, 1000)
+            self.assertEqual(
+                model.data_collector.model_vars["evacuated"][-1]
+                + model.data_collector.model_vars["stranded"][-1],
+                6,
+            )
+
+    def test_run_until_evacuated_fraction(self):
+        model = build(50, VectorizedEvacuationModel)
+        model.run(until=EvacuatedFraction(0.5))
+        evacuated = model.data_collector.model_vars["evacuated"]
+        self.assertGreaterEqual(evacuated[-1], 25)
+        self.assertLess(evacuated[-2], 25)
+
+    def test_no_movement_waits_for_agents_yet_to_set_off(self):
+        model = build(50, EvacuationModel)
+        model.run(until=NoMovement(3))
+        self.assertEqual(model.waiting(), 0)
+        self.assertGreater(
+            model.seconds_elapsed, max(a.delay for a in model.schedule.agents)
+        )
+
+    def test_no_movement_stops_a_stuck_model(self):
+        model = build(6, VectorizedEvacuationModel, in_car=True)
+        # freeze every agent in place
+        model.speed[:] = 0
+        model.run(1000, until=NoMovement(3))
+        self.assertEqual(model.schedule.steps, 4)
+
+    def test_adaptive_time_step(self):
+        controller = AdaptiveTimeStep(min_step=2, max_step=40, growth=2)
+        model = build(
+            6, VectorizedEvacuationModel, in_car=True, adaptive_time_step=controller
+        )
+        # nobody is held up, so the step grows up to its maximum
+        for _ in range(4):
+            model.step()
+        self.assertEqual(model.data_collector.model_vars["time"], [10, 30, 70, 110])
+        self.assertEqual(model.time_step, 40)
+
+        # everybody is held up, so it shrinks down to its minimum
+        model.blocked[:] = True
+        for expected in (20, 10, 5, 2.5, 2, 2):
+            model.time_step = controller(model)
+            self.assertEqual(model.time_step, expected)
+
+    def test_run_without_output_path(self):
+        model = build(6, EvacuationModel, in_car=True)
+        self.assertEqual(len(model.run(3)), 4)
+        self.assertEqual(model.schedule.steps, 3)
+        agents = model.data_collector.get_agent_vars_dataframe()
+        self.assertEqual(len(agents), 4 * 6)
@@ -0,0 +1,83 @@
+import sys
+
+sys.path.append("..")
+
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from mesacat.engine import VectorizedEvacuationModel
+from mesacat.network import Network
+from mesacat.trajectory import Trajectory
+from mesacat.utils import read_model
+from mesacat.tests.synthetic import (
+    grid_graph,
+    random_agents,
+    build_model,
+    between_nodes,
+)
+
+
+class TestTrajectory(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_path = os.path.join(directory.name, "run")
+        network = Network(grid_graph(20, 20).to_undirected())
+        zone = between_nodes(network, 0.27, 0.73)
+        self.model = build_model(
+            network,
+            zone,
+            random_agents(zone, 50, seed=3),
+            VectorizedEvacuationModel,
+            seed=1,
+            output_path=self.output_path,
+        )
+        # several chunks are flushed during the run
+        self.model.data_collector.chunk_size = 4 * 50
+        self.model.run(10)
+
+    def test_steps_match_the_collected_output(self):
+        collector = self.model.data_collector
+        for path in (self.output_path, self.output_path + ".trajectory"):
+            trajectory = Trajectory(path)
+            self.assertEqual(len(trajectory), 11)
+            np.testing.assert_array_equal(trajectory.ids, collector.ids)
+            np.testing.assert_array_equal(trajectory.time, collector.model_vars["time"])
+            for name in collector.agent_columns:
+                np.testing.assert_array_equal(
+                    trajectory.columns[name], collector.column(name)
+                )
+
+    def test_steps_are_views_of_the_files(self):
+        trajectory = Trajectory(self.output_path)
+        step = trajectory.step(5)
+        self.assertIsInstance(step["lat"], np.memmap)
+        self.assertEqual(step["lat"].shape, (50,))
+        np.testing.assert_array_equal(
+            step["status"], self.model.data_collector.column("status")[5]
+        )
+
+        chunks = list(trajectory.iter_steps(start=2, chunk=4))
+        self.assertEqual([first for first, _ in chunks], [2, 6, 10])
+        self.assertEqual(chunks[-1][1]["position"].shape, (1, 50))
+        np.testing.assert_array_equal(
+            np.concatenate([columns["lon"] for _, columns in chunks]),
+            trajectory.columns["lon"][2:],
+        )
+
+    def test_frame_matches_agent_output_file(self):
+        trajectory = Trajectory(self.output_path)
+        agent_df, *_ = read_model(self.output_path)
+        for step in (0, 7):
+            frame = trajectory.frame(step)
+            expected = agent_df.loc[[step]]
+            np.testing.assert_array_equal(frame.index, expected.index)
+            np.testing.assert_array_equal(frame.AgentID, expected.AgentID)
+            np.testing.assert_array_equal(frame.position, expected.position)
+            np.testing.assert_array_equal(frame.status, expected.status)
+            np.testing.assert_allclose(frame.lat, expected.lat, rtol=1e-6)
+            pd.testing.assert_extension_array_equal(
+                frame.highway.array, expected.highway.array
+            )
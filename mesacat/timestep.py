@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mesacat.model import EvacuationModel
+
+
+class AdaptiveTimeStep:
+    """Chooses the length of the next step from how many agents were held up in the last one
+
+    While no moving agent is held up by the agent ahead, agents only interact
+    with the network, so the step is lengthened to cover more ground per
+    update.  When more than a fraction of the moving agents are held up, the
+    step is shortened so that queues form and clear in finer detail.
+
+    Args:
+        min_step: shortest step in seconds
+        max_step: longest step in seconds
+        growth: factor by which the step is lengthened or shortened
+        congestion: fraction of moving agents held up above which the step is shortened
+    """
+
+    def __init__(
+        self,
+        min_step: float = 1,
+        max_step: float = 60,
+        growth: float = 2,
+        congestion: float = 0.1,
+    ):
+        if not 0 < min_step <= max_step:
+            raise ValueError("Steps must satisfy 0 < min_step <= max_step")
+        if growth <= 1:
+            raise ValueError("growth must be greater than 1")
+        self.min_step = min_step
+        self.max_step = max_step
+        self.growth = growth
+        self.congestion = congestion
+
+    def __call__(self, model: EvacuationModel) -> float:
+        held, moving = model.interactions()
+        step = model.time_step
+        if held == 0:
+            step *= self.growth
+        elif held > self.congestion * moving:
+            step /= self.growth
+        return min(max(step, self.min_step), self.max_step)
+
+
+class EvacuatedFraction:
+    """Stops a run once a fraction of the agents has evacuated
+
+    Args:
+        fraction: fraction of all agents, between 0 and 1
+    """
+
+    def __init__(self, fraction: float):
+        self.fraction = fraction
+
+    def __call__(self, model: EvacuationModel) -> bool:
+        evacuated = model.data_collector.model_vars["evacuated"][-1]
+        return evacuated >= self.fraction * model.agent_count()
+
+
+class NoMovement:
+    """Stops a run once no agent has moved for a number of steps
+
+    Agents that are still waiting to set off will move later, so the run is
+    not stopped while there are any.
+
+    Args:
+        steps: number of consecutive steps without movement
+    """
+
+    def __init__(self, steps: int):
+        self.steps = steps
+        self.still = 0
+        self.last = None
+
+    def __call__(self, model: EvacuationModel) -> bool:
+        progress = model.progress()
+        self.still = self.still + 1 if progress == self.last else 0
+        self.last = progress
+        return self.still >= self.steps and model.waiting() == 0
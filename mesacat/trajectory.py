@@ -0,0 +1,109 @@
+from __future__ import annotations
+import json
+import os
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from mesacat.collector import TRAJECTORY_FORMAT
+
+
+class Trajectory:
+    """The agent output of a run, mapped from the files written by its data collector rather than read into memory
+
+    Each variable is stored as one row per step of a value per agent, so a
+    step or a range of steps is read as a view of the mapped file, and only
+    the parts of the files that are used are read from disk.  The agents are
+    in the same order at every step.
+
+    Args:
+        path: path of the run's output files without extension, or of its
+            ``.trajectory`` directory
+
+    Attributes:
+        ids (np.ndarray): unique ID of each agent
+        node_ids (np.ndarray): identifier of each node that positions index, as text
+        time (np.ndarray): time in seconds at each step
+        columns (dict): name -> array of the variable, of shape (steps, agents)
+    """
+
+    def __init__(self, path: str):
+        if not path.endswith(".trajectory"):
+            path += ".trajectory"
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != TRAJECTORY_FORMAT:
+            raise ValueError(
+                "{0} is not a trajectory of this version of mesacat".format(path)
+            )
+        self.path = path
+        self.ids = np.load(os.path.join(path, "ids.npy"))
+        self.node_ids = np.load(os.path.join(path, "node_ids.npy"))
+        self.time = np.load(os.path.join(path, "time.npy"))
+        shape = (meta["steps"], meta["agents"])
+        self.columns = {
+            name: (
+                np.memmap(
+                    os.path.join(path, name + ".bin"),
+                    dtype=np.dtype(dtype),
+                    mode="r",
+                    shape=shape,
+                )
+                if shape[0] * shape[1] > 0
+                else np.zeros(shape, dtype=np.dtype(dtype))
+            )
+            for name, dtype in meta["columns"].items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["position"])
+
+    def step(self, step: int) -> dict[str, np.ndarray]:
+        """
+        Returns the value of each variable for every agent at a step, as views of the files
+        """
+        return {name: values[step] for name, values in self.columns.items()}
+
+    def steps(self, start: int, stop: int) -> dict[str, np.ndarray]:
+        """
+        Returns each variable for the steps from start up to stop, as views of the files of shape (steps, agents)
+        """
+        return {name: values[start:stop] for name, values in self.columns.items()}
+
+    def iter_steps(
+        self, start: int = 0, stop: int | None = None, chunk: int = 1
+    ) -> Iterator[tuple[int, dict[str, np.ndarray]]]:
+        """
+        Yields the first step and the variables of each chunk of steps in turn, as for ``steps``
+
+        Args:
+            start (int): first step
+            stop (int): step to stop before.  Defaults to the end of the run
+            chunk (int): number of steps in each chunk
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for first in range(start, stop, chunk):
+            yield first, self.steps(first, min(first + chunk, stop))
+
+    def __iter__(self) -> Iterator[dict[str, np.ndarray]]:
+        for step in range(len(self)):
+            yield self.step(step)
+
+    def frame(self, step: int) -> pd.DataFrame:
+        """
+        Returns a table of the agents at a step, with the columns of the agent output file
+        """
+        values = self.step(step)
+        highway = values["highway"]
+        return pd.DataFrame(
+            {
+                "AgentID": self.ids,
+                "position": self.node_ids[values["position"]],
+                "lat": values["lat"],
+                "lon": values["lon"],
+                "highway": pd.arrays.IntegerArray(np.array(highway), highway < 0),
+                "reroute_count": values["reroute_count"],
+                "status": values["status"].astype(np.int8),
+                "in_car": values["in_car"],
+            },
+            index=pd.Index(np.full(len(self.ids), step), name="Step"),
+        )
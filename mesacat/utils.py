@@ -1,31 +1,130 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import osmnx
-from matplotlib import animation, lines
+from matplotlib import lines
+from matplotlib.colors import to_rgba_array
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Patch
 import networkx as nx
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
+from mesacat import bundle
+from mesacat.trajectory import Trajectory
 
 
-def create_movie(in_path: str, out_path: str, fps: int = 5):
-    """Generates an MP4 video of all model steps using FFmpeg (https://www.ffmpeg.org/)
+def step_times(model_df: pd.DataFrame) -> pd.Series:
+    """
+    Returns the time in seconds at each step of a model output, which used 10 s steps if it does not record the time
+    """
+    if "time" in model_df:
+        return model_df["time"]
+    return pd.Series(model_df.index * 10, index=model_df.index)
+
+
+class MovieFrames:
+    """The agent positions and colours, target sizes and title of every frame of a movie, computed before any frame is drawn
+
+    The positions and colours are read from the agent output as arrays of
+    shape (steps, agents), which are views of the files of a trajectory, so
+    each frame only picks a row of them.
 
     Args:
-        in_path: path to model output files without extension
-        out_path: path to movie file
-        fps: frames per second of the video
+        in_path: path to model output files without extension, or to their bundle or trajectory
+
+    Attributes:
+        model_df (DataFrame): model output
+        graph (nx.MultiGraph): road network
+        hazard (GeoDataFrame): evacuation zone
+        target_nodes (GeoDataFrame): targets
+        steps (pd.Index): step of each frame
+        lon (np.ndarray): longitude of each agent at each step
+        lat (np.ndarray): latitude of each agent at each step
+        in_car (np.ndarray): whether each agent is in a vehicle at each step, which picks its colour
+        occupants (np.ndarray): number of agents evacuated to each target at each step, of shape (steps, targets)
+        titles (list): title of each frame
     """
-    agent_df, model_df, graph, nodes, edges, hazard, target_nodes = read_model(in_path)
 
-    writer = animation.writers["ffmpeg"]
-    metadata = dict(title="Movie Test", artist="Matplotlib", comment="Movie support!")
-    writer = writer(fps=fps, metadata=metadata)
+    def __init__(self, in_path: str):
+        path = output_prefix(in_path)
+        trajectory = os.path.exists(os.path.join(path + ".trajectory", "meta.json"))
+        agent_df, model_df, graph, _, _, hazard, target_nodes = read_model(
+            path, agent_output=not trajectory
+        )
+        if trajectory:
+            trajectory = Trajectory(path)
+            node_ids, columns = trajectory.node_ids, trajectory.columns
+        else:
+            # output written before trajectories, with the same agents in the same order at each step
+            shape = (len(model_df), len(agent_df.loc[[0]]))
+            codes, node_ids = pd.factorize(agent_df.position)
+            columns = {
+                "position": codes.reshape(shape),
+                "lon": agent_df.lon.values.reshape(shape),
+                "lat": agent_df.lat.values.reshape(shape),
+                "status": agent_df.status.values.reshape(shape),
+                "in_car": agent_df.in_car.values.astype(bool).reshape(shape),
+            }
+
+        self.model_df = model_df
+        self.graph = graph
+        self.hazard = hazard
+        self.target_nodes = target_nodes
+        self.steps = model_df.index
+        self.lon = columns["lon"]
+        self.lat = columns["lat"]
+        self.in_car = columns["in_car"]
+
+        # index of the target at each node, or -1
+        target_of_node = pd.Index(target_nodes.index.astype(str)).get_indexer(
+            np.asarray(node_ids).astype(str)
+        )
+        n_targets = len(target_nodes)
+        self.occupants = np.zeros((len(self.steps), n_targets), dtype=np.int64)
+        for first in range(0, len(self.steps), 64):
+            position = columns["position"][first : first + 64]
+            targets = target_of_node[position]
+            evacuated = (columns["status"][first : first + 64] == 1) & (targets >= 0)
+            rows = np.nonzero(evacuated)[0]
+            self.occupants[first : first + len(position)] = np.bincount(
+                rows * n_targets + targets[evacuated],
+                minlength=len(position) * n_targets,
+            ).reshape(len(position), n_targets)
+
+        n_agents = self.lon.shape[1]
+        times = step_times(model_df)
+        self.titles = [
+            "T={}min\n{}/{} Agents Evacuated ({:.0f}%)".format(
+                int(time // 60),
+                evacuated_total,
+                n_agents,
+                evacuated_total / n_agents * 100,
+            )
+            for time, evacuated_total in zip(times, model_df.evacuated)
+        ]
+
+
+class MovieRenderer:
+    """Draws the frames of a movie onto a background of the road network and evacuation zone, which is drawn once
+
+    Only the agents, targets and title are drawn for each frame, over a
+    copy of the rendered background.
+
+    Args:
+        frames (MovieFrames): content of the frames
+
+    Attributes:
+        size (tuple): width and height of a frame in pixels
+    """
 
     hazard_color = "blue"
     hazard_alpha = 0.2
     targets_color = "green"
-    targets_at_capacity_color = "grey"
     targets_marker = "o"
     targets_size = 10
     agents_color = "C1"
@@ -35,117 +134,223 @@ def create_movie(in_path: str, out_path: str, fps: int = 5):
     agents_alpha = 1
     edge_color = "#999999"
 
-    # Road network
-    f, ax = osmnx.plot_graph(
-        graph,
-        show=False,
-        dpi=200,
-        node_size=0,
-        edge_color=edge_color,
-        edge_linewidth=0.5,
-    )
-
-    # Flood hazard zone
-    hazard.plot(ax=ax, alpha=hazard_alpha, color=hazard_color)
-
-    # Targets
-
-    ax.legend(
-        handles=[
-            Patch(label="Evacuation zone", facecolor=hazard_color, alpha=hazard_alpha),
-            lines.Line2D(
-                [],
-                [],
-                label="Pedestrian Agents",
-                color=agents_color,
-                marker=agents_marker,
-                markersize=agents_size,
-                alpha=agents_alpha,
-                linestyle="None",
-            ),
-            lines.Line2D(
-                [],
-                [],
-                label="Vehicle Agents",
-                color=vehicle_agents_color,
-                marker=agents_marker,
-                markersize=agents_size,
-                alpha=agents_alpha,
-                linestyle="None",
-            ),
-            lines.Line2D(
-                [],
-                [],
-                label="Exit points",
-                color=targets_color,
-                marker=targets_marker,
-                markersize=targets_size,
-                linestyle="None",
-            ),
-            lines.Line2D([], [], label="Road Network", color=edge_color, linestyle="-"),
-        ]
-    )
+    def __init__(self, frames: MovieFrames):
+        self.frames = frames
+
+        # Road network
+        f, ax = osmnx.plot_graph(
+            frames.graph,
+            show=False,
+            close=True,
+            dpi=200,
+            node_size=0,
+            edge_color=self.edge_color,
+            edge_linewidth=0.5,
+        )
 
-    with writer.saving(f, out_path, f.dpi):
-        start = nodes.loc[agent_df.loc[[0]].position]
-        agents = ax.scatter(
-            start.geometry.x,
-            start.geometry.y,
-            marker=agents_marker,
-            s=agents_size,
-            alpha=agents_alpha,
-            color=agents_color,
+        # Flood hazard zone
+        frames.hazard.plot(ax=ax, alpha=self.hazard_alpha, color=self.hazard_color)
+
+        ax.legend(
+            handles=[
+                Patch(
+                    label="Evacuation zone",
+                    facecolor=self.hazard_color,
+                    alpha=self.hazard_alpha,
+                ),
+                lines.Line2D(
+                    [],
+                    [],
+                    label="Pedestrian Agents",
+                    color=self.agents_color,
+                    marker=self.agents_marker,
+                    markersize=self.agents_size,
+                    alpha=self.agents_alpha,
+                    linestyle="None",
+                ),
+                lines.Line2D(
+                    [],
+                    [],
+                    label="Vehicle Agents",
+                    color=self.vehicle_agents_color,
+                    marker=self.agents_marker,
+                    markersize=self.agents_size,
+                    alpha=self.agents_alpha,
+                    linestyle="None",
+                ),
+                lines.Line2D(
+                    [],
+                    [],
+                    label="Exit points",
+                    color=self.targets_color,
+                    marker=self.targets_marker,
+                    markersize=self.targets_size,
+                    linestyle="None",
+                ),
+                lines.Line2D(
+                    [], [], label="Road Network", color=self.edge_color, linestyle="-"
+                ),
+            ]
         )
 
-        targets = ax.scatter(
-            target_nodes.geometry.x,
-            target_nodes.geometry.y,
-            color=targets_color,
-            s=targets_size,
-            marker=targets_marker,
+        # the artists that change are left out of the background
+        self.agents = ax.scatter(
+            frames.lon[0],
+            frames.lat[0],
+            marker=self.agents_marker,
+            s=self.agents_size,
+            alpha=self.agents_alpha,
+            color=self.agents_color,
+            animated=True,
+        )
+        self.targets = ax.scatter(
+            frames.target_nodes.geometry.x,
+            frames.target_nodes.geometry.y,
+            color=self.targets_color,
+            s=self.targets_size,
+            marker=self.targets_marker,
             zorder=4,
+            animated=True,
         )
+        self.title = ax.set_title(frames.titles[0])
+        self.title.set_animated(True)
+        self.palette = to_rgba_array([self.agents_color, self.vehicle_agents_color])
+
+        self.figure, self.ax = f, ax
+        self.canvas = FigureCanvasAgg(f)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(f.bbox)
+        self.size = self.canvas.get_width_height(physical=True)
+
+    def render(self, index: int) -> memoryview:
+        """
+        Returns the RGBA pixels of a frame, given its position among the steps of the movie
+        """
+        frames = self.frames
+        self.canvas.restore_region(self.background)
+        self.agents.set_offsets(np.column_stack([frames.lon[index], frames.lat[index]]))
+        self.agents.set_color(self.palette[frames.in_car[index].astype(np.intp)])
+        self.targets.set_sizes(frames.occupants[index])
+        self.title.set_text(frames.titles[index])
+        for artist in (self.agents, self.targets, self.title):
+            self.ax.draw_artist(artist)
+        return self.canvas.buffer_rgba()
+
+    def write(self, indices: range, out_path: str, fps: int) -> None:
+        """
+        Encode frames to an MP4 video with FFmpeg, which is sent the pixels of each frame
+
+        Args:
+            indices (range): positions of the frames among the steps of the movie
+            out_path (str): path to movie file
+            fps (int): frames per second of the video
+        """
+        width, height = self.size
+        command = [
+            plt.rcParams["animation.ffmpeg_path"],
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgba",
+            "-s",
+            "{0}x{1}".format(width, height),
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+            # H.264 needs an even width and height
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            out_path,
+        ]
+        with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+            for index in indices:
+                process.stdin.write(self.render(index))
+            process.stdin.close()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
 
-        for step in model_df.index:
-            agents_at_step = agent_df.loc[[step]]
-            evacuated_agents = agents_at_step[agents_at_step.status == 1]
-            agent_locations = nodes.loc[agents_at_step.position]
-            agents.set_offsets(agents_at_step[["lon", "lat"]].values)
-            agents.set_color(
-                [
-                    (vehicle_agents_color if agent_in_car else agents_color)
-                    for agent_in_car in agents_at_step.in_car
-                ]
-            )
 
-            occupants = (
-                target_nodes.join(
-                    evacuated_agents.position.value_counts().rename("occupants")
-                )
-                .occupants.replace(float("NaN"), 0)
-                .values
-            )
-            targets.set_sizes(occupants)
-            """
-            targets.set_color(
-                [
-                    targets_color if o < 100 else targets_at_capacity_color
-                    for o in occupants
-                ]
-            )
-            """
+# the renderer and frame rate of a movie, inherited by the forked workers
+_movie: tuple[MovieRenderer, int] | None = None
 
-            evacuated_total = model_df.evacuated.loc[step]
 
-            ax.set_title(
-                "T={}min\n{}/{} Agents Evacuated ({:.0f}%)".format(
-                    (step * 10) // 60,
-                    evacuated_total,
-                    len(agent_locations),
-                    evacuated_total / len(agent_locations) * 100,
-                )
-            )
-            writer.grab_frame()
+def render_segment(task: tuple[range, str]) -> str:
+    """
+    Encode a segment of the current movie and return the path of its file
+    """
+    indices, out_path = task
+    renderer, fps = _movie
+    renderer.write(indices, out_path, fps)
+    return out_path
+
+
+def create_movie(
+    in_path: str, out_path: str, fps: int = 5, processes: int | None = None
+):
+    """Generates an MP4 video of all model steps using FFmpeg (https://www.ffmpeg.org/)
+
+    The content of every frame is computed first, and the road network is
+    drawn once.  Consecutive segments of frames are encoded by worker
+    processes and joined by FFmpeg without encoding them again.
+
+    Args:
+        in_path: path to model output files without extension, or to their bundle or trajectory
+        out_path: path to movie file
+        fps: frames per second of the video
+        processes: number of worker processes.  Defaults to the number of
+            CPUs.  If 1, the movie is encoded in this process
+    """
+    global _movie
+    renderer = MovieRenderer(MovieFrames(in_path))
+    n_frames = len(renderer.frames.steps)
+    processes = min(processes or os.cpu_count(), n_frames)
+    if processes <= 1:
+        renderer.write(range(n_frames), out_path, fps)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        bounds = np.linspace(0, n_frames, processes + 1).astype(int)
+        tasks = [
+            (range(start, stop), os.path.join(directory, "{0}.mp4".format(i)))
+            for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))
+        ]
+        _movie = (renderer, fps)
+        try:
+            context = multiprocessing.get_context("fork")
+            with context.Pool(processes) as pool:
+                segments = pool.map(render_segment, tasks, chunksize=1)
+        finally:
+            _movie = None
+
+        segment_list = os.path.join(directory, "segments.txt")
+        with open(segment_list, "w") as f:
+            f.writelines("file '{0}'\n".format(segment) for segment in segments)
+        subprocess.run(
+            [
+                plt.rcParams["animation.ffmpeg_path"],
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                segment_list,
+                "-c",
+                "copy",
+                out_path,
+            ],
+            check=True,
+        )
 
 
 def create_plot(in_path, out_path):
@@ -169,9 +374,10 @@ def create_plot(in_path, out_path):
         .AgentID.rename("occupancy")
         .reset_index()
         .pivot(values="occupancy", columns="position", index="Step")
-        .rename(columns=target_nodes.name.to_dict())
+        .rename(columns=target_nodes.get("name", target_nodes.index.to_series()))
     )
-    occupancy.join(stranded).set_index(occupancy.index.values * 10 / 60).plot(
+    times = step_times(model_df)
+    occupancy.join(stranded).set_index(times.loc[occupancy.index].values / 60).plot(
         ax=top_ax, legend=True, secondary_y=[stranded.name]
     )
     top_ax.set_xlabel("Time (minutes)")
@@ -201,9 +407,10 @@ def create_plot(in_path, out_path):
         legend_kwds={"label": "Traffic", "cax": cax},
     )
 
+    colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
     target_nodes.plot(
         ax=bottom_ax,
-        color=plt.rcParams["axes.prop_cycle"].by_key()["color"][: len(target_nodes)],
+        color=[colors[i % len(colors)] for i in range(len(target_nodes))],
     )
 
     bottom_ax.set_xlabel("Latitude")
@@ -212,12 +419,49 @@ def create_plot(in_path, out_path):
     f.savefig(out_path, bbox_inches="tight")
 
 
-def read_model(path):
-    agent_df = pd.read_csv(
-        path + ".agent.csv", index_col="Step", dtype={"highway": pd.Int64Dtype()}
-    )
+def output_prefix(path: str) -> str:
+    """
+    Returns the path of a run's output files without extension, given it or the path of its bundle or trajectory
+    """
+    for extension in (".bundle", ".trajectory"):
+        if path.endswith(extension):
+            return path[: -len(extension)]
+    return path
+
+
+def read_model(path, agent_output: bool = True):
+    """
+    Returns the agent and model output of a run, the road network and the evacuation zone and targets
+
+    Args:
+        path: path to model output files without extension, or to their bundle file
+        agent_output: whether to read the agent output, which is None if not
+    """
+    path = output_prefix(path)
+    agent_df = None
+    if agent_output:
+        agent_df = pd.read_csv(
+            path + ".agent.csv",
+            index_col="Step",
+            dtype={"highway": pd.Int64Dtype(), "position": str},
+        )
     model_df = pd.read_csv(path + ".model.csv")
 
+    if os.path.exists(path + ".bundle"):
+        layers = bundle.read_layers(path + ".bundle")
+        nodes, edges = layers["nodes"], layers["edges"]
+        graph = bundle.road_graph(nodes, edges)
+        return (
+            agent_df,
+            model_df,
+            graph,
+            nodes,
+            edges,
+            layers["hazard"],
+            layers["targets"],
+        )
+
+    # output written before bundles
     graph = nx.read_gml(path + ".gml")
     nodes, edges = osmnx.convert.graph_to_gdfs(graph)
 